@@ -0,0 +1,44 @@
+"""
+Compares the pure Python and the NumPy bloom filter builders used by
+splitgraph.core.indexing.bloom.generate_bloom_index and checks they produce the same filters.
+
+Doesn't require an engine: the column values are generated in Python and hashed the same way
+Postgres hashes them when indexing a fragment.
+
+Usage: python bloom_filter.py [number of distinct values...]
+"""
+import sys
+import timeit
+from math import ceil, log
+
+from splitgraph.core.indexing.bloom import _build_filter, _build_filter_numpy, _hash_value
+
+PROBABILITY = 0.01
+
+
+def benchmark(items: int) -> None:
+    digests = list({_hash_value(str(i)) for i in range(items)})
+    size = int(ceil(-len(digests) * log(PROBABILITY) / log(2) ** 2 / 8))
+    no_funcs = int(ceil(log(2) * size * 8 / len(digests)))
+
+    if _build_filter(digests, size, no_funcs) != _build_filter_numpy(digests, size, no_funcs):
+        raise AssertionError("Bloom filters built for %d items are different!" % items)
+
+    repeats = 3
+    python_time = min(
+        timeit.repeat(lambda: _build_filter(digests, size, no_funcs), number=1, repeat=repeats)
+    )
+    numpy_time = min(
+        timeit.repeat(
+            lambda: _build_filter_numpy(digests, size, no_funcs), number=1, repeat=repeats
+        )
+    )
+    print(
+        "%10d items, k=%d, %10d bytes: Python %8.3fs, NumPy %8.3fs (%.1fx)"
+        % (items, no_funcs, size, python_time, numpy_time, python_time / numpy_time)
+    )
+
+
+if __name__ == "__main__":
+    for items in [int(a) for a in sys.argv[1:]] or [1000, 10000, 100000, 1000000]:
+        benchmark(items)
@@ -101,6 +101,13 @@ def checkout_c(image_spec, force, uncheckout, layered):
 @click.option(
     "-o", "--overwrite", is_flag=True, help="Overwrite physical objects that already exist"
 )
+@click.option(
+    "-w",
+    "--workers",
+    default=1,
+    type=int,
+    help="Number of parallel engine connections to use to store and index chunks of new tables.",
+)
 def commit_c(
     repository,
     snap,
@@ -110,6 +117,7 @@ def commit_c(
     index_options,
     message,
     overwrite,
+    workers,
 ):
     """
     Commit changes to a checked-out Splitgraph repository.
@@ -127,6 +135,9 @@ def commit_c(
     originally committed with `--chunk-size=10000`, this will create 2 fragments: one based on the first chunk
     and one on the second chunk of the table.
 
+    If `--workers` is passed, chunks of tables that are stored as full snapshots are hashed, stored
+    and indexed in parallel using this many engine connections (capped by SG_ENGINE_POOL).
+
     If `--chunk-sort-keys` is passed, data inside the chunk is sorted by this key (or multiple keys).
     This helps speed up queries on those keys for storage layers than can leverage that (e.g. CStore). The expected format is JSON, e.g. `{table_1: [col_1, col_2]}`
 
@@ -138,6 +149,25 @@ def commit_c(
     Bloom filtering allows to trade off between the space overhead of the index and the probability of a false
     positive (claiming that an object contains a record when it actually doesn't, leading to extra scans).
 
+    Xor filters can be used instead of bloom filters on the same queries. They take up less space for the same false
+    positive probability and are faster to check. Their false positive probability is fixed by the size of the
+    fingerprint (`fingerprint_bits`): 8 bits (default) give 0.4% and 16 bits give 0.0015%. Alternatively, the maximum
+    `probability` can be specified.
+
+    Value set indexes store the exact distinct values of a column in each object, so equality and IN queries
+    on low-cardinality columns never scan objects that don't contain the sought values. If an object has more
+    than `max_values` (default 100) distinct values in the column, a bloom filter with the false positive
+    probability `probability` (default 0.01) is stored for it instead.
+
+    LIKE queries on text columns with a literal prefix (e.g. `LIKE 'ABC%'`) use the range index. N-gram indexes
+    speed up LIKE queries with other patterns (e.g. `LIKE '%ABC%'`): they store a bloom filter of all substrings
+    of length `n` (default 3) of a column's values and take the same `probability` or `size` parameters
+    as the bloom index.
+
+    Bounding box indexes store the envelope of all shapes in a PostGIS geometry or geography column, so that
+    queries with a bounding box overlap (e.g. `WHERE geom && ST_MakeEnvelope(...)`) don't scan objects that are
+    outside of the query window. They don't take any parameters.
+
     An example `index-options` dictionary:
 
     \b
@@ -150,6 +180,26 @@ def commit_c(
                     "size": 10000          # or size can be specified.
                 }
             },
+            "xor": {
+                "column_6": {
+                    "fingerprint_bits": 8
+                }
+            },
+            "valueset": {
+                "column_4": {
+                    "max_values": 50,
+                    "probability": 0.01
+                }
+            },
+            "ngram": {
+                "column_5": {
+                    "n": 3,
+                    "probability": 0.01
+                }
+            },
+            "bbox": {
+                "column_7": {}
+            },
             # Only compute the range index on these columns. By default,
             # it's computed on all columns and is always computed on the
             # primary key no matter what.
@@ -166,6 +216,7 @@ def commit_c(
         extra_indexes=index_options,
         in_fragment_order=chunk_sort_keys,
         overwrite=overwrite,
+        workers=workers,
     ).image_hash
     click.echo("Committed %s as %s." % (str(repository), new_hash[:12]))
 
@@ -333,7 +384,7 @@ def import_c(image_spec, table_or_query, target_repository, target_table):
     type=JsonType(),
     required=True,
     help="JSON dictionary of extra indexes to calculate, e.g. "
-    '\'{"bloom": {"column_1": {"probability": 0.01}}}\'',
+    '\'{"bloom": {"column_1": {"probability": 0.01}}, "valueset": {"column_2": {}}}\'',
 )
 @click.option(
     "-o",
@@ -271,6 +271,9 @@ def object_c(object_id):
     from ..core.output import pretty_size
     from ..core.sql import select
     from splitgraph.core.indexing.bloom import describe
+    from splitgraph.core.indexing.valueset import describe as describe_valueset
+    from splitgraph.core.indexing.xor import describe as describe_xor
+    from splitgraph.core.indexing.bbox import describe as describe_bbox
 
     object_manager = ObjectManager(get_engine())
     object_meta = object_manager.get_object_meta([object_id])
@@ -295,6 +298,22 @@ def object_c(object_id):
         click.echo("Bloom index: ")
         for col_name, col_bloom in sg_object.object_index["bloom"].items():
             click.echo("  %s: %s" % (col_name, describe(col_bloom)))
+    if "xor" in sg_object.object_index:
+        click.echo("Xor index: ")
+        for col_name, col_xor in sg_object.object_index["xor"].items():
+            click.echo("  %s: %s" % (col_name, describe_xor(col_xor)))
+    if "valueset" in sg_object.object_index:
+        click.echo("Value set index: ")
+        for col_name, col_values in sg_object.object_index["valueset"].items():
+            click.echo("  %s: %s" % (col_name, describe_valueset(col_values)))
+    if "ngram" in sg_object.object_index:
+        click.echo("N-gram index: ")
+        for col_name, (col_n, *col_bloom) in sg_object.object_index["ngram"].items():
+            click.echo("  %s: n=%d, %s" % (col_name, col_n, describe(col_bloom)))
+    if "bbox" in sg_object.object_index:
+        click.echo("Bounding box index: ")
+        for col_name, col_bbox in sg_object.object_index["bbox"].items():
+            click.echo("  %s: %s" % (col_name, describe_bbox(col_bbox)))
 
     if object_manager.object_engine.registry:
         # Don't try to figure out the object's location if we're talking
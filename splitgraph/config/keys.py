@@ -30,6 +30,7 @@ DEFAULTS: ConfigDict = {
     # by about 50% (101s -> 53s) for the version that runs a single big join against multiple images.
     "SG_LQ_TUNING": "SET enable_sort=off; SET enable_hashagg=on;",
     "SG_COMMIT_CHUNK_SIZE": "10000",
+    "SG_COMMIT_CHUNKING": "partition",
     "SG_ENGINE_POOL": "16",
     "SG_CONFIG_FILE": "",
     "SG_META_SCHEMA": "splitgraph_meta",
@@ -48,6 +49,11 @@ DEFAULTS: ConfigDict = {
     "SG_EVICTION_FLOOR": "1",
     "SG_EVICTION_MIN_FRACTION": "0.05",
     "SG_FDW_CLASS": "splitgraph.core.fdw_checkout.QueryingForeignDataWrapper",
+    "SG_LQ_PLAN_CACHE_SIZE": "1000",
+    "SG_LQ_IDLE_TIMEOUT": "300",
+    "SG_LQ_MAX_IDLE_CONNECTIONS": "4",
+    "SG_LQ_IN_MEMORY_INDEX": "false",
+    "SG_OBJECT_META_CACHE_SIZE": "10000",
     "SG_CMD_ASCII": "false",
     # Some default sections: these can't be overridden via envvars.
     "external_handlers": {"S3": "splitgraph.hooks.s3.S3ExternalObjectHandler"},
@@ -99,6 +105,11 @@ ARGUMENT_KEY_MAP = {
     "--eviction-floor": "SG_EVICTION_FLOOR",
     "--eviction-fraction": "SG_EVICTION_MIN_FRACTION",
     "--fdw-class": "SG_FDW_CLASS",
+    "--lq-plan-cache-size": "SG_LQ_PLAN_CACHE_SIZE",
+    "--lq-idle-timeout": "SG_LQ_IDLE_TIMEOUT",
+    "--lq-max-idle-connections": "SG_LQ_MAX_IDLE_CONNECTIONS",
+    "--lq-in-memory-index": "SG_LQ_IN_MEMORY_INDEX",
+    "--object-meta-cache-size": "SG_OBJECT_META_CACHE_SIZE",
 }
 
 ARG_KEYS = list(ARGUMENT_KEY_MAP.keys())
@@ -135,6 +146,7 @@ This can also be changed by passing `--verbosity` to `sgr`, e.g. `sgr --verbosit
     "SG_ENGINE_OBJECT_PATH": "Path on the engine's filesystem where Splitgraph physical object files are stored.",
     "SG_LQ_TUNING": "Postgres query planner configuration for Splitfile execution and table imports. This is run before a layered query is executed and allows to tune query planning in case of LQ performance issues. For possible values, see the [PostgreSQL documentation](https://www.postgresql.org/docs/12/runtime-config-query.html).",
     "SG_COMMIT_CHUNK_SIZE": "Default chunk size when `sgr commit` is run. Can be overriden in the command line client by passing `--chunk-size`",
+    "SG_COMMIT_CHUNKING": "Strategy used to split tables into chunks when they're committed as snapshots. With `partition`, the table is first copied into a temporary table with an indexed chunk ID column, which needs as much temporary space as the table itself. With `keyset`, chunk boundaries are found by walking the table's primary key index and every chunk is read from the table directly. This needs no extra space, but can be slower for tables that aren't physically ordered by their primary key. Tables without a primary key always use `partition`.",
     "SG_ENGINE_POOL": "Size of the connection pool used to download/upload objects. Note that in the case of layered querying with joins on multiple tables, each table will use this many parallel threads to download objects, which can overwhelm the engine. Decrease this value in that case.",
     "SG_CONFIG_FILE": "Location of the Splitgraph configuration file. By default, Splitgraph looks for the configuration in `~/.splitgraph/.sgconfig` and then the current directory.",
     "SG_META_SCHEMA": "Name of the metadata schema. Note that whilst this can be changed, it hasn't been tested and won't be taken into account by engines connecting to this one.",
@@ -153,5 +165,10 @@ This can also be changed by passing `--verbosity` to `sgr`, e.g. `sgr --verbosit
     "SG_EVICTION_FLOOR": "Significance of recent usage time and object size in cache eviction. See documentation for splitgraph.core.object_manager for an explanation.",
     "SG_EVICTION_MIN_FRACTION": "Minimum fraction of the total cache size that has to get freed when an eviction is run. This is to avoid frequent evictions.",
     "SG_FDW_CLASS": "Name of the class used by the layered querying foreign data wrapper on the engine. Internal.",
+    "SG_LQ_PLAN_CACHE_SIZE": "Maximum number of layered query plans (lists of objects that a query with given qualifiers has to scan) cached on the engine. The cache is shared between all sessions, so that repeated queries to a layered querying table don't have to filter and group objects again. Plans are only written to the engine when they are first computed, and the plans that were computed the longest time ago are evicted first. Set to 0 to disable the cache.",
+    "SG_LQ_IDLE_TIMEOUT": "Time, in seconds, for which the layered querying foreign data wrapper keeps a connection to an engine open after a scan finishes, so that further scans in the same session (for example, rescans on the inner side of a nested loop join) don't have to reconnect. Idle connections are closed the next time the session uses layered querying after this timeout or when the session ends.",
+    "SG_LQ_MAX_IDLE_CONNECTIONS": "Maximum number of engine connections kept open between scans by the layered querying foreign data wrapper in every session. Least recently used connections are closed first. Set to 0 to close connections after every scan.",
+    "SG_LQ_IN_MEMORY_INDEX": "If set to `true`, layered querying loads the indexes of all fragments in a table into memory and evaluates query qualifiers against them before falling back to filtering fragments on the engine. This requires NumPy and loads the metadata of every fragment in the table the first time it's queried, so it only pays off for repeated queries against the same table in a long-running process. By default, fragments are filtered using the typed range index on the engine.",
+    "SG_OBJECT_META_CACHE_SIZE": "Maximum number of object metadata records (sizes, hashes, indexes) that are cached in memory by every metadata manager to avoid querying the metadata engine for the same objects repeatedly. Least recently used records are evicted first. Set to 0 to disable the cache.",
     "SG_CMD_ASCII": "Set to `true` to disable Unicode output in sgr. Note that `sgr sql` will still output Unicode data.",
 }
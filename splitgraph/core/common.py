@@ -31,15 +31,18 @@ META_TABLES = [
     "images",
     "tags",
     "objects",
+    "object_ranges",
     "tables",
+    "table_chunk_groups",
     "upstream",
     "object_locations",
     "object_cache_status",
     "object_cache_occupancy",
+    "query_plans",
     "info",
     "version",
 ]
-OBJECT_MANAGER_TABLES = ["object_cache_status", "object_cache_occupancy"]
+OBJECT_MANAGER_TABLES = ["object_cache_status", "object_cache_occupancy", "query_plans"]
 _SPLITGRAPH_META_DIR = "resources/splitgraph_meta"
 
 
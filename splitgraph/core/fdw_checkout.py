@@ -1,21 +1,86 @@
 """Module imported by Multicorn on the Splitgraph engine server: a foreign data wrapper that implements
 layered querying (read-only queries to Splitgraph tables without materialization)."""
 import logging
+import time
+from collections import OrderedDict
+from contextlib import ExitStack
+from typing import Any, Dict, List, Tuple, cast, TYPE_CHECKING
 
 import splitgraph.config
+from splitgraph.config import CONFIG, get_singleton
+from splitgraph.core.common import coerce_val_to_json
+from splitgraph.core.indexing.aggregate import parse_aggregate
 from splitgraph.core.output import pretty_size
 from splitgraph.core.object_manager import ObjectManager
 from splitgraph.core.repository import Repository, get_engine
+from splitgraph.engine.postgres.spi import SPIEngine
 
 try:
     from multicorn import ForeignDataWrapper, ANY
     from multicorn.utils import log_to_postgres
 except ImportError:
-    # Multicorn not installed (OK if we're not on the engine machine).
-    pass
+    # Multicorn not installed (OK if we're not on the engine machine -- tests).
+    ForeignDataWrapper = object
+    ANY = object()
+
+if TYPE_CHECKING:
+    from splitgraph.engine.postgres.engine import PostgresEngine
 
 _PG_LOGLEVEL = logging.INFO
 
+# Types whose values Python orders the same way as PostgreSQL does, so that we can merge
+# sorted fragments ourselves (no collations, NaNs or values that don't compare).
+_MERGEABLE_TYPES = {
+    "smallint",
+    "integer",
+    "bigint",
+    "boolean",
+    "date",
+    "timestamp",
+    "timestamp without time zone",
+}
+
+# Engines whose connections are kept open after a scan in this backend, so that the next
+# scans (e.g. rescans of the inner side of a nested loop join) don't have to reconnect
+# and check the engine version again: engine name -> (engine, time it was released).
+# Ordered from the least recently released one.
+_IDLE_ENGINES: "OrderedDict[str, Tuple[PostgresEngine, float]]" = OrderedDict()
+
+# Number of times a scan in this backend reused an open engine connection.
+RECONNECTIONS_AVOIDED = 0
+
+
+def _close_idle_engines() -> None:
+    # There's nothing that runs in the backend in between queries, so idle connections
+    # only get closed here (when the FDW is used again) or when the backend exits.
+    timeout = float(get_singleton(CONFIG, "SG_LQ_IDLE_TIMEOUT"))
+    max_idle = int(get_singleton(CONFIG, "SG_LQ_MAX_IDLE_CONNECTIONS"))
+    now = time.time()
+    for name, (engine, released) in list(_IDLE_ENGINES.items()):
+        if len(_IDLE_ENGINES) > max_idle or now - released > timeout:
+            engine.close()
+            del _IDLE_ENGINES[name]
+
+
+def _acquire_engine(engine: "PostgresEngine") -> None:
+    global RECONNECTIONS_AVOIDED
+    _close_idle_engines()
+    if _IDLE_ENGINES.pop(cast(str, engine.name), None) is not None:
+        RECONNECTIONS_AVOIDED += 1
+        logging.debug(
+            "Reusing connection to %s (%d reconnections avoided)", engine, RECONNECTIONS_AVOIDED
+        )
+
+
+def _release_engine(engine: "PostgresEngine") -> None:
+    # Discard anything the scan hasn't committed (like closing the connection
+    # would) but keep the connection open for the next scan.
+    engine.rollback()
+    name = cast(str, engine.name)
+    _IDLE_ENGINES.pop(name, None)
+    _IDLE_ENGINES[name] = (engine, time.time())
+    _close_idle_engines()
+
 
 class QueryingForeignDataWrapper(ForeignDataWrapper):
     """The actual Multicorn LQ FDW class"""
@@ -27,19 +92,26 @@ class QueryingForeignDataWrapper(ForeignDataWrapper):
     def _quals_to_cnf(quals):
         def _qual_to_cnf(qual):
             if qual.is_list_operator:
-                if any(v is None for v in qual.value):
-                    # We don't keep track of NULLs so if we get a clause of type
-                    # col IN (1,2,3,NULL) we have to look at all objects to see if they contain a NULL.
+                # Comparisons with NULL are never true, so col IN (1,2,3,NULL) only matches
+                # rows where col is 1, 2 or 3 and col op ALL(ARRAY[1,NULL]) doesn't match anything
+                # (which we don't take advantage of and just use the rest of the clauses).
+                values = [v for v in qual.value if v is not None]
+                if not values:
                     return [[]]
                 if qual.list_any_or_all == ANY:
                     # Convert col op ANY(ARRAY[a,b,c...]) into (col op a) OR (col op b)...
                     # which is one single AND clause of multiple ORs
-                    return [[(qual.field_name, qual.operator[0], v) for v in qual.value]]
+                    return [[(qual.field_name, qual.operator[0], v) for v in values]]
                 # Convert col op ALL(ARRAY[a,b,c...]) into (cop op a) AND (col op b)...
                 # which is multiple AND clauses of one OR each
-                return [[(qual.field_name, qual.operator[0], v)] for v in qual.value]
+                return [[(qual.field_name, qual.operator[0], v)] for v in values]
 
             if qual.value is None:
+                # Multicorn passes col IS NULL as col = None and col IS NOT NULL as col <> None.
+                if qual.operator == "=":
+                    return [[(qual.field_name, "IS NULL", None)]]
+                if qual.operator == "<>":
+                    return [[(qual.field_name, "IS NOT NULL", None)]]
                 return [[]]
             return [[(qual.field_name, qual.operator, qual.value)]]
 
@@ -58,6 +130,7 @@ class QueryingForeignDataWrapper(ForeignDataWrapper):
         Returns:
             A tuple of the form (expected_number_of_rows, avg_row_width (in bytes))
         """
+        self._acquire_engines()
         cnf_quals = self._quals_to_cnf(quals)
         plan = self.table.get_query_plan(cnf_quals, columns)
 
@@ -71,6 +144,7 @@ class QueryingForeignDataWrapper(ForeignDataWrapper):
         return plan.estimated_rows, len(columns) * 10
 
     def explain(self, quals, columns, sortkeys=None, verbose=False):
+        self._acquire_engines()
         cnf_quals = self._quals_to_cnf(quals)
         plan = self.table.get_query_plan(cnf_quals, columns)
         all_objects = plan.required_objects
@@ -80,10 +154,39 @@ class QueryingForeignDataWrapper(ForeignDataWrapper):
             o.size for o in self.table.repository.objects.get_object_meta(filtered_objects).values()
         )
 
-        return [
+        result = [
             "Objects removed by filter: %d" % (len(all_objects) - len(filtered_objects)),
             "Scan through %d object(s) (%s)" % (len(filtered_objects), pretty_size(total_size)),
         ]
+        if sortkeys:
+            result.append(
+                "Merge fragments sorted by: %s"
+                % ", ".join(k.attname + (" DESC" if k.is_reversed else "") for k in sortkeys)
+            )
+        if verbose:
+            result.append("Engine reconnections avoided: %d" % RECONNECTIONS_AVOIDED)
+        return result
+
+    def can_sort(self, sortkeys):
+        """
+        :param sortkeys: List of SortKey
+        :return: List of SortKey the FDW can sort on
+        """
+        # We can return sorted output by sorting every fragment and merging them, as long
+        # as the sort keys all go in the same direction and use PostgreSQL's default
+        # NULLS ordering (NULLs are considered larger than everything else).
+        column_types = {c.name: c.pg_type for c in self.table.table_schema}
+
+        supported = []
+        for key in sortkeys:
+            if (
+                column_types.get(key.attname) not in _MERGEABLE_TYPES
+                or key.nulls_first != key.is_reversed
+                or (supported and key.is_reversed != supported[0].is_reversed)
+            ):
+                break
+            supported.append(key)
+        return supported
 
     def get_path_keys(self):
         # Return the PK of the table (unique path something)
@@ -97,6 +200,7 @@ class QueryingForeignDataWrapper(ForeignDataWrapper):
         # We assume that columns here is a list of columns (rather than a set)
         # For quals, the more elaborate ones (like table.id = table.name or similar) actually aren't passed here
         # at all and PG filters them out later on.
+        self._acquire_engines()
         cnf_quals = self._quals_to_cnf(quals)
 
         # Sometimes (e.g. with running a join) Postgres can ask us to "restart" the scan, which means
@@ -108,6 +212,25 @@ class QueryingForeignDataWrapper(ForeignDataWrapper):
 
         log_to_postgres("CNF quals: %r" % (cnf_quals,), _PG_LOGLEVEL)
 
+        if sortkeys:
+            # Return the rows ourselves instead of the tables for Multicorn to scan:
+            # the fragments are sorted and merged in Table.query_lazy, so the first
+            # rows can be returned before the rest of the table is sorted.
+            columns = list(columns)
+            scan = ExitStack()
+            rows = scan.enter_context(
+                self.table.query_lazy(
+                    columns,
+                    cnf_quals,
+                    order_by=[k.attname for k in sortkeys],
+                    descending=sortkeys[0].is_reversed,
+                )
+            )
+            self.end_scan_callback = lambda from_fdw=False: scan.close()
+            self.plan = self.table.get_query_plan(cnf_quals, columns)
+            yield from rows
+            return
+
         queries, self.end_scan_callback, self.plan = self.table.query_indirect(columns, cnf_quals)
         yield from queries
 
@@ -118,26 +241,36 @@ class QueryingForeignDataWrapper(ForeignDataWrapper):
             self.end_scan_callback(from_fdw=True)
             self.end_scan_callback = None
 
-        self.engine.close()
-        self.object_engine.close()
+        self._release_engines()
+
+    def _acquire_engines(self):
+        for engine in self._engines:
+            _acquire_engine(engine)
 
-    def _initialize_engines(self):
+    def _release_engines(self):
+        for engine in self._engines:
+            _release_engine(engine)
+
+    def _initialize_engines(self, metadata_engine=None):
         # Try using a UNIX socket if the engine is local to us
-        self.engine = get_engine(
-            self.fdw_options["engine"],
-            bool(self.fdw_options.get("use_socket", False)),
+        use_socket = bool(self.fdw_options.get("use_socket", False))
+        self.engine = metadata_engine or get_engine(
+            self.fdw_options["engine"], use_socket, use_fdw_params=True
+        )
+        # Objects are always managed through a connection to the engine (and not e.g. through
+        # an SPIEngine): claiming objects in the cache relies on committing to release locks.
+        self.object_engine = get_engine(
+            self.fdw_options.get("object_engine", self.fdw_options["engine"]),
+            use_socket,
             use_fdw_params=True,
         )
-        if "object_engine" in self.fdw_options:
-            self.object_engine = get_engine(
-                self.fdw_options["object_engine"],
-                bool(self.fdw_options.get("use_socket", False)),
-                use_fdw_params=True,
-            )
-        else:
-            self.object_engine = self.engine
+        # Engines with connections to keep open between scans (SPIEngines don't have any)
+        self._engines = [] if isinstance(self.engine, SPIEngine) else [self.engine]
+        if self.object_engine is not self.engine:
+            self._engines.append(self.object_engine)
+        self._acquire_engines()
 
-    def __init__(self, fdw_options, fdw_columns):
+    def __init__(self, fdw_options, fdw_columns, metadata_engine=None):
         """The foreign data wrapper is initialized on the first query.
         Args:
             fdw_options (dict): The foreign data wrapper options. It is a dictionary
@@ -145,6 +278,8 @@ class QueryingForeignDataWrapper(ForeignDataWrapper):
                 statement options. It is left to the implementor
                 to decide what should be put in those options, and what
                 to do with them.
+            metadata_engine (PostgresEngine): Optional, engine to query the metadata
+                through instead of the engine in fdw_options (e.g. an SPIEngine).
 
         """
         # Flip the global flag for engine constructors to use (see comment in splitgraph.config).
@@ -162,7 +297,7 @@ class QueryingForeignDataWrapper(ForeignDataWrapper):
         # The foreign datawrapper columns (name -> ColumnDefinition).
         self.fdw_columns = fdw_columns
 
-        self._initialize_engines()
+        self._initialize_engines(metadata_engine)
 
         repository = Repository(
             fdw_options["namespace"],
@@ -182,3 +317,29 @@ class QueryingForeignDataWrapper(ForeignDataWrapper):
 
         # A QueryPlan object for the last query with stats
         self.plan = None
+
+
+def lq_aggregate(fdw_options: Dict[str, str], aggregates: List[str]) -> List[Any]:
+    """
+    Calculate aggregates over a table checked out with layered querying (see
+    Table.aggregate). Called from splitgraph_api.lq_aggregate on the engine.
+
+    If the `use_spi` option is set and the table's metadata is on this engine, the metadata is
+    queried through SPI in this backend (see splitgraph.engine.postgres.spi) rather than over
+    a new connection to the engine.
+
+    :param fdw_options: Options of the foreign table and its server
+    :param aggregates: List of aggregate expressions, e.g. `count(*)` or `max(ts)`
+    :return: List of aggregate values that can be serialized to JSON
+    """
+    metadata_engine = None
+    if fdw_options.get("use_spi") and fdw_options["engine"] == "LOCAL":
+        metadata_engine = SPIEngine(fdw_options["engine"])
+    fdw = QueryingForeignDataWrapper(fdw_options, {}, metadata_engine=metadata_engine)
+    try:
+        return cast(
+            List[Any],
+            coerce_val_to_json(fdw.table.aggregate([parse_aggregate(a) for a in aggregates])),
+        )
+    finally:
+        fdw._release_engines()
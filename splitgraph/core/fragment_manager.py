@@ -4,26 +4,60 @@ Routines related to storing tables as fragments.
 
 import bisect
 import itertools
+from collections import OrderedDict
 import json
 import logging
 import math
-import operator
 import struct
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from functools import reduce
 from hashlib import sha256
 from random import getrandbits
-from typing import Any, Dict, List, Optional, Set, Tuple, Union, TYPE_CHECKING, cast
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+    TYPE_CHECKING,
+    cast,
+)
 
 from psycopg2.errors import UniqueViolation
-from psycopg2.sql import SQL, Identifier
+from psycopg2.extras import Json
+from psycopg2.sql import SQL, Identifier, Composable
 from tqdm import tqdm
 
-from splitgraph.config import SPLITGRAPH_API_SCHEMA, SG_CMD_ASCII
+from splitgraph.config import SPLITGRAPH_API_SCHEMA, SG_CMD_ASCII, CONFIG, get_singleton
+from splitgraph.core.indexing.aggregate import (
+    generate_sum_index,
+    get_sum_columns,
+    get_sum_expressions,
+)
+from splitgraph.core.indexing.bbox import filter_bbox_index, generate_bbox_index, get_query_bboxes
 from splitgraph.core.indexing.bloom import generate_bloom_index, filter_bloom_index
+from splitgraph.core.indexing.ngram import filter_ngram_index, generate_ngram_index
+from splitgraph.core.indexing.valueset import (
+    DEFAULT_FALLBACK_PROBABILITY,
+    DEFAULT_MAX_VALUES,
+    filter_valueset_index,
+    generate_valueset_index,
+)
+from splitgraph.core.indexing.xor import generate_xor_index
 from splitgraph.core.indexing.range import (
     generate_range_index,
     filter_range_index,
+    get_range_index_columns,
+    get_range_index_expressions,
+    generate_null_count_index,
+    get_null_count_expressions,
+    _strip_type_mod,
 )
 from splitgraph.core.metadata_manager import MetadataManager, Object
 from splitgraph.core.types import Changeset, TableSchema
@@ -33,11 +67,28 @@ from splitgraph.exceptions import SplitGraphError
 from .common import adapt, SPLITGRAPH_META_SCHEMA
 from .sql import select
 
+try:
+    import numpy as np
+    from splitgraph.core.indexing.fragment_index import FragmentIndex
+
+    _NUMPY_SUPPORTED = True
+except ImportError:
+    _NUMPY_SUPPORTED = False
+
 if TYPE_CHECKING:
     from splitgraph.core.repository import Repository
     from splitgraph.core.table import Table
     from splitgraph.engine.postgres.engine import PostgresEngine
 
+# Column that the table is partitioned on when it's being split up into chunks
+_CHUNK_ID_COL = "sg_tmp_partition_id"
+
+# Number of row digests that Digest.sum adds up at a time
+_DIGEST_BATCH_SIZE = 65536
+
+# Number of sets of fragments whose indexes are kept in memory for filtering
+_FRAGMENT_INDEX_CACHE_SIZE = 16
+
 
 def _split_changeset(
     changeset: Changeset, min_max: List[Tuple[Any, Any]], table_pks: List[Tuple[str, str]]
@@ -65,7 +116,10 @@ def _log_commit_progress(table_size, no_chunks):
     return table_size > 500000 or no_chunks > 100
 
 
-def get_chunk_groups(chunks: List[Tuple[str, Any, Any]],) -> List[List[Tuple[str, Any, Any]]]:
+ChunkGroups = List[List[Tuple[str, Any, Any]]]
+
+
+def get_chunk_groups(chunks: List[Tuple[str, Any, Any]],) -> ChunkGroups:
     """
     Takes a list of chunks and their boundaries and combines them
     into independent groups such that chunks from no two groups
@@ -167,6 +221,34 @@ class Digest:
         assert len(hex_string) == 64
         return cls(tuple(int(hex_string[i : i + 4], base=16) for i in range(0, 64, 4)))
 
+    @classmethod
+    def sum(cls, digests: Iterable[Union[bytes, memoryview]]) -> "Digest":
+        """
+        Add up multiple 256-bit digests (e.g. row hashes returned by Postgres). This is equivalent
+        to reducing them with `Digest.from_memoryview` and `+`, but sums them in batches
+        (using NumPy if it's installed) instead of creating a Digest for every row.
+
+        :param digests: Iterable of 32-byte buffers
+        :return: Digest with the sum of all digests (`Digest.empty()` if there are none)
+        """
+        result = [0] * 16
+        digests = iter(digests)
+        while True:
+            batch = b"".join(itertools.islice(digests, _DIGEST_BATCH_SIZE))
+            if not batch:
+                break
+            if len(batch) % 32:
+                raise ValueError("Digests must be 32 bytes long!")
+            if _NUMPY_SUPPORTED:
+                # Sum into uint64 so that the shorts don't wrap around before we mask them.
+                sums = np.frombuffer(batch, dtype=">u2").reshape(-1, 16).sum(axis=0, dtype="u8")
+                batch_sums = [int(v) for v in sums]
+            else:
+                shorts = struct.unpack(">%dH" % (len(batch) // 2), batch)
+                batch_sums = [sum(shorts[i::16]) for i in range(16)]
+            result = [(r + b) & 0xFFFF for r, b in zip(result, batch_sums)]
+        return cls(tuple(result))
+
     # In these routines, we treat each hash as a vector of 16 2-byte integers and do component-wise addition.
     # To simulate the wraparound behaviour of C shorts, throw away all remaining bits after the action.
     def __add__(self, other: "Digest") -> "Digest":
@@ -187,6 +269,59 @@ class Digest:
 ExtraIndexInfo = Dict[str, Union[List[str], Dict[str, Dict[str, Any]]]]
 
 
+def _validate_extra_indexes(extra_indexes: ExtraIndexInfo) -> None:
+    for index_name, index_cols in extra_indexes.items():
+        if index_name == "range":
+            continue
+        if index_name not in ("bloom", "valueset", "ngram", "xor", "bbox"):
+            raise ValueError("Unsupported index type %s!" % index_name)
+        if isinstance(index_cols, list):
+            raise ValueError(
+                "Unexpected options for index '%s': "
+                "got list, expected dictionary {column: {option: ...}}!" % index_name
+            )
+
+
+def _get_row_digest_sql(table_schema: TableSchema) -> Composable:
+    # Hash of the text representation of the whole row
+    return (
+        SQL("digest((")
+        + SQL(",").join(Identifier(c.name) for c in table_schema)
+        + SQL(")::text, 'sha256'::text)")
+    )
+
+
+# WHERE clause selecting rows of the source table that go into a fragment and its arguments
+SourceFilter = Tuple[Composable, List[Any]]
+
+
+def _get_chunk_filter(chunk_id_col: str, chunk_id: Optional[int]) -> SourceFilter:
+    return SQL("{} = %s").format(Identifier(chunk_id_col)), [chunk_id]
+
+
+def _get_key_range_filter(
+    table_pk: TableSchema, start: Tuple[Any, ...], end: Optional[Tuple[Any, ...]]
+) -> SourceFilter:
+    # Row comparisons like (pk_1, pk_2) >= (v_1, v_2) can use the PK's btree index. Cast the
+    # arguments explicitly since psycopg2 doesn't always know what type a value should be.
+    pk_sql = SQL("(") + SQL(",").join(Identifier(c.name) for c in table_pk) + SQL(")")
+    args_sql = SQL("(") + SQL(",").join(SQL("%s::" + c.pg_type) for c in table_pk) + SQL(")")
+    query = pk_sql + SQL(" >= ") + args_sql
+    args = list(start)
+    if end is not None:
+        query += SQL(" AND ") + pk_sql + SQL(" < ") + args_sql
+        args.extend(end)
+    return query, args
+
+
+def _get_range_index_columns(extra_indexes: ExtraIndexInfo) -> Optional[List[str]]:
+    # Default None, meaning run range index on all columns.
+    try:
+        return list(extra_indexes["range"])
+    except KeyError:
+        return None
+
+
 class FragmentManager(MetadataManager):
     """
     A storage engine for Splitgraph tables. Each table can be stored as one or more immutable fragments that can
@@ -206,6 +341,77 @@ class FragmentManager(MetadataManager):
         metadata_engine = metadata_engine or object_engine
         super().__init__(metadata_engine)
         self.object_engine = object_engine
+        self._lthash_installed: Optional[bool] = None
+        self._fragment_indexes: "OrderedDict[Tuple, FragmentIndex]" = OrderedDict()
+        self.in_memory_index = get_singleton(CONFIG, "SG_LQ_IN_MEMORY_INDEX") == "true"
+
+    def _has_lthash(self) -> bool:
+        """
+        Check if the object engine has the `lthash` aggregate installed (engines initialized
+        by older versions of Splitgraph don't).
+        """
+        if self._lthash_installed is None:
+            self._lthash_installed = self.object_engine.run_sql(
+                "SELECT EXISTS (SELECT 1 FROM pg_proc p JOIN pg_namespace n "
+                "ON p.pronamespace = n.oid WHERE n.nspname = %s AND p.proname = 'lthash')",
+                (SPLITGRAPH_API_SCHEMA,),
+                return_shape=ResultShape.ONE_ONE,
+            )
+        return cast(bool, self._lthash_installed)
+
+    @staticmethod
+    def _digest_sum_sql(digest: Composable) -> Composable:
+        """
+        Get the SQL aggregates that return the sum of row digests and the number of rows.
+        Requires the `lthash` aggregate on the object engine (see `_has_lthash`).
+
+        :param digest: SQL expression that calculates the digest of a row
+        :return: SQL Composable with the two aggregates.
+        """
+        return (
+            SQL("{}.lthash(").format(Identifier(SPLITGRAPH_API_SCHEMA))
+            + digest
+            + SQL("), COUNT(1)")
+        )
+
+    @staticmethod
+    def _parse_digest_sum(result: Optional[str]) -> Digest:
+        """Parse the result of the `lthash` aggregate from `_digest_sum_sql`."""
+        return Digest.from_hex(result) if result else Digest.empty()
+
+    def _sum_digests(
+        self, digest: Composable, source: Composable, args: Optional[Sequence[Any]] = None
+    ) -> Tuple[Digest, int]:
+        """
+        Add up the digests of all rows that a query returns. If the object engine has the
+        `lthash` aggregate installed, the digests are summed by Postgres. Otherwise, they are
+        fetched in batches and summed with `Digest.sum`.
+
+        :param digest: SQL expression that calculates the digest of a row
+        :param source: FROM clause (and optionally a WHERE clause) of the query
+        :param args: Query arguments
+        :return: `Digest` object and the number of rows.
+        """
+        if self._has_lthash():
+            digest_sum, row_count = self.object_engine.run_sql(
+                SQL("SELECT ") + self._digest_sum_sql(digest) + source,
+                args,
+                return_shape=ResultShape.ONE_MANY,
+            )
+            return self._parse_digest_sum(digest_sum), row_count
+
+        row_count = 0
+
+        def _get_digests() -> Iterator[memoryview]:
+            nonlocal row_count
+            for batch in self.object_engine.run_sql_streaming(
+                SQL("SELECT ") + digest + source, args
+            ):
+                row_count += len(batch)
+                yield from (r[0] for r in batch)
+
+        digest_sum = Digest.sum(_get_digests())
+        return digest_sum, row_count
 
     def generate_object_index(
         self,
@@ -213,6 +419,10 @@ class FragmentManager(MetadataManager):
         table_schema: TableSchema,
         changeset: Optional[Changeset] = None,
         extra_indexes: Optional[ExtraIndexInfo] = None,
+        range_min_max: Optional[Sequence[Any]] = None,
+        bloom_values: Optional[Dict[str, List[str]]] = None,
+        null_counts: Optional[Sequence[int]] = None,
+        sums: Optional[Sequence[Any]] = None,
     ) -> Dict[str, Any]:
         """
         Queries the max/min values of a given fragment for each column, used to speed up querying.
@@ -221,48 +431,135 @@ class FragmentManager(MetadataManager):
         :param table_schema: Schema of the table the object belongs to.
         :param changeset: Optional, if specified, the old row values are included in the index.
         :param extra_indexes: Dictionary of {index_type: column: index_specific_kwargs}.
+        :param range_min_max: Optional, precalculated column ranges (see `generate_range_index`).
+        :param bloom_values: Optional, dictionary of column -> precalculated distinct
+            values for bloom-, xor-, valueset- and ngram-indexed columns
+            (see `generate_bloom_index`).
+        :param null_counts: Optional, precalculated numbers of NULLs in every column
+            (see `generate_null_count_index`).
+        :param sums: Optional, precalculated sums of numeric columns (see `generate_sum_index`).
         :return: Dict containing the object index.
         """
-        extra_indexes: ExtraIndexInfo = extra_indexes or {}
+        extra_indexes = extra_indexes or {}
+        bloom_values = bloom_values or {}
+        _validate_extra_indexes(extra_indexes)
 
-        # Default None, meaning run range index on all columns.
-        range_index_columns: Optional[List[str]]
-        try:
-            range_index_columns = list(extra_indexes["range"])
-        except KeyError:
-            range_index_columns = None
         range_index: Dict[str, Any] = generate_range_index(
-            self.object_engine, object_id, table_schema, changeset, columns=range_index_columns
+            self.object_engine,
+            object_id,
+            table_schema,
+            changeset,
+            columns=_get_range_index_columns(extra_indexes),
+            min_max=range_min_max,
         )
-        indexes = {"range": range_index}
+        indexes = {
+            "range": range_index,
+            "null_count": generate_null_count_index(
+                self.object_engine, object_id, table_schema, changeset, null_counts=null_counts
+            ),
+            "sum": generate_sum_index(self.object_engine, object_id, table_schema, sums=sums),
+        }
 
         # Process extra indexes
+        column_types = {c.name: _strip_type_mod(c.pg_type) for c in table_schema}
         for index_name, index_cols in extra_indexes.items():
             if index_name == "range":
                 continue
-            if index_name != "bloom":
-                raise ValueError("Unsupported index type %s!" % index_name)
-            if isinstance(index_cols, list):
-                raise ValueError(
-                    "Unexpected options for index 'bloom': "
-                    "got list, expected dictionary {column: {probability/size: ...}}!"
-                )
 
-            index_dict = {}
-            for index_col, index_kwargs in index_cols.items():
+            for index_col, index_kwargs in cast(Dict[str, Dict[str, Any]], index_cols).items():
                 logging.debug(
                     "Running index %s on column %s with parameters %r",
                     index_name,
                     index_col,
                     index_kwargs,
                 )
-                index_dict[index_col] = generate_bloom_index(
-                    self.object_engine, object_id, changeset, index_col, **index_kwargs
+                if index_name == "valueset":
+                    self._generate_valueset_index(
+                        indexes,
+                        object_id,
+                        changeset,
+                        index_col,
+                        bloom_values.get(index_col),
+                        **index_kwargs
+                    )
+                    continue
+                if index_name == "ngram":
+                    ngram_index = generate_ngram_index(
+                        self.object_engine,
+                        object_id,
+                        changeset,
+                        index_col,
+                        values=bloom_values.get(index_col),
+                        **index_kwargs
+                    )
+                    if ngram_index:
+                        indexes.setdefault(index_name, {})[index_col] = ngram_index
+                    continue
+                if index_name == "bbox":
+                    indexes.setdefault(index_name, {})[index_col] = generate_bbox_index(
+                        self.object_engine,
+                        object_id,
+                        changeset,
+                        index_col,
+                        column_types.get(index_col, ""),
+                        **index_kwargs
+                    )
+                    continue
+                if index_name == "xor":
+                    indexes.setdefault(index_name, {})[index_col] = generate_xor_index(
+                        self.object_engine,
+                        object_id,
+                        changeset,
+                        index_col,
+                        values=bloom_values.get(index_col),
+                        **index_kwargs
+                    )
+                    continue
+
+                indexes.setdefault(index_name, {})[index_col] = generate_bloom_index(
+                    self.object_engine,
+                    object_id,
+                    changeset,
+                    index_col,
+                    values=bloom_values.get(index_col),
+                    **index_kwargs
                 )
-            indexes[index_name] = index_dict
 
         return indexes
 
+    def _generate_valueset_index(
+        self,
+        indexes: Dict[str, Any],
+        object_id: str,
+        changeset: Optional[Changeset],
+        column: str,
+        values: Optional[List[str]],
+        max_values: int = DEFAULT_MAX_VALUES,
+        probability: float = DEFAULT_FALLBACK_PROBABILITY,
+    ) -> None:
+        valueset = generate_valueset_index(
+            self.object_engine, object_id, changeset, column, max_values=max_values, values=values
+        )
+        if valueset is not None:
+            indexes.setdefault("valueset", {})[column] = valueset
+            return
+
+        # Too many distinct values to store: use a bloom filter instead,
+        # unless we've been asked to build one on this column anyway.
+        logging.debug(
+            "Column %s has more than %d distinct values, using a bloom filter", column, max_values
+        )
+        bloom_index = indexes.setdefault("bloom", {})
+        if column not in bloom_index:
+            bloom_index[column] = generate_bloom_index(
+                self.object_engine,
+                object_id,
+                changeset,
+                column,
+                probability=probability,
+                values=values,
+            )
+
     def _register_object(
         self,
         object_id: str,
@@ -274,9 +571,44 @@ class FragmentManager(MetadataManager):
         rows_deleted: int,
         changeset: Optional[Changeset] = None,
         extra_indexes: Optional[ExtraIndexInfo] = None,
+        object_index: Optional[Dict[str, Any]] = None,
     ) -> None:
         """
-        Registers a Splitgraph object in the object tree and indexes it
+        Registers a Splitgraph object in the object tree and indexes it. See `_generate_object_meta`
+        for the parameters.
+        """
+        self.register_objects(
+            [
+                self._generate_object_meta(
+                    object_id,
+                    namespace,
+                    insertion_hash,
+                    deletion_hash,
+                    table_schema,
+                    rows_inserted,
+                    rows_deleted,
+                    changeset,
+                    extra_indexes,
+                    object_index,
+                )
+            ]
+        )
+
+    def _generate_object_meta(
+        self,
+        object_id: str,
+        namespace: str,
+        insertion_hash: str,
+        deletion_hash: str,
+        table_schema: TableSchema,
+        rows_inserted: int,
+        rows_deleted: int,
+        changeset: Optional[Changeset] = None,
+        extra_indexes: Optional[ExtraIndexInfo] = None,
+        object_index: Optional[Dict[str, Any]] = None,
+    ) -> Object:
+        """
+        Indexes a Splitgraph object and generates its metadata entry without registering it
 
         :param object_id: Object ID
         :param namespace: Namespace that owns the object. In registry mode, only namespace owners can alter or delete
@@ -290,24 +622,25 @@ class FragmentManager(MetadataManager):
             are used to generate the min/max index for an object to know if it removes/updates some rows
             that might be pertinent to a query.
         :param extra_indexes: Dictionary of {index_type: column: index_specific_kwargs}.
+        :param object_index: Optional, index of the object if it has already been generated.
+        :return: `Object` to be passed to `register_objects`.
         """
         object_size = self.object_engine.get_object_size(object_id)
-        object_index = self.generate_object_index(object_id, table_schema, changeset, extra_indexes)
-        self.register_objects(
-            [
-                Object(
-                    object_id=object_id,
-                    format="FRAG",
-                    namespace=namespace,
-                    size=object_size,
-                    created=datetime.utcnow(),
-                    insertion_hash=insertion_hash,
-                    deletion_hash=deletion_hash,
-                    object_index=object_index,
-                    rows_inserted=rows_inserted,
-                    rows_deleted=rows_deleted,
-                )
-            ]
+        if object_index is None:
+            object_index = self.generate_object_index(
+                object_id, table_schema, changeset, extra_indexes
+            )
+        return Object(
+            object_id=object_id,
+            format="FRAG",
+            namespace=namespace,
+            size=object_size,
+            created=datetime.utcnow(),
+            insertion_hash=insertion_hash,
+            deletion_hash=deletion_hash,
+            object_index=object_index,
+            rows_inserted=rows_inserted,
+            rows_deleted=rows_deleted,
         )
 
     @staticmethod
@@ -351,20 +684,10 @@ class FragmentManager(MetadataManager):
         # we don't really know how it turns some types to strings. So instead we give Postgres all of its deleted
         # rows back and ask it to hash them for us in the same way.
         inner_tuple = "(" + ",".join("%s::" + c.pg_type for c in table_schema) + ")"
-        query = (
-            "SELECT digest(o::text, 'sha256') FROM (VALUES "
-            + ",".join(itertools.repeat(inner_tuple, len(rows)))
-            + ") o"
-        )
-
-        # By default (e.g. for changesets where nothing was deleted) we use a 0 hash (since adding it to any other
-        # hash has no effect).
-        digests = self.object_engine.run_sql(
-            query, [o for row in rows for o in row], return_shape=ResultShape.MANY_ONE
-        )
-        return (
-            reduce(operator.add, map(Digest.from_memoryview, digests), Digest.empty()),
-            len(digests),
+        return self._sum_digests(
+            SQL("digest(o::text, 'sha256')"),
+            SQL(" FROM (VALUES " + ",".join(itertools.repeat(inner_tuple, len(rows))) + ") o"),
+            [o for row in rows for o in row],
         )
 
     def _store_changesets(
@@ -495,19 +818,11 @@ class FragmentManager(MetadataManager):
         columns_sql = SQL(",").join(
             SQL("o.") + Identifier(c.name) for c in table_schema if c.name != SG_UD_FLAG
         )
-        digest_query = (
-            SQL("SELECT digest((")
-            + columns_sql
-            + SQL(")::text, 'sha256'::text) FROM {}.{} o").format(
-                Identifier(schema), Identifier(table)
-            )
-            + SQL(" WHERE o.{} = true").format(Identifier(SG_UD_FLAG))
-        )
-        row_digests = self.object_engine.run_sql(digest_query, return_shape=ResultShape.MANY_ONE)
-        insertion_hash = reduce(
-            operator.add, (Digest.from_memoryview(r) for r in row_digests), Digest.empty()
+        return self._sum_digests(
+            SQL("digest((") + columns_sql + SQL(")::text, 'sha256'::text)"),
+            SQL(" FROM {}.{} o").format(Identifier(schema), Identifier(table))
+            + SQL(" WHERE o.{} = true").format(Identifier(SG_UD_FLAG)),
         )
-        return insertion_hash, len(row_digests)
 
     def record_table_as_patch(
         self,
@@ -557,11 +872,10 @@ class FragmentManager(MetadataManager):
                 # Reorganize the current table's fragments into non-overlapping groups
                 # and split the changeset to make sure it doesn't span (and hence merge) them.
                 table_pks = self.object_engine.get_change_key(schema, old_table.table_name)
-                min_max = self.get_min_max_pks(current_objects, table_pks)
-
-                groups = get_chunk_groups(
-                    [(o, mm[0], mm[1]) for o, mm in zip(current_objects, min_max)]
-                )
+                if table_pks == get_change_key(old_table.table_schema):
+                    groups = self.get_table_chunk_groups(old_table)
+                else:
+                    groups = self._calculate_chunk_groups(current_objects, table_pks)
                 group_boundaries = [
                     (min(min_pk for _, min_pk, _ in group), max(max_pk for _, _, max_pk in group))
                     for group in groups
@@ -615,19 +929,17 @@ class FragmentManager(MetadataManager):
         # If the PK isn't composite, we can read the range for the corresponding column
         # from the index, otherwise, the indexer stored the min/max tuple under $pk.
         pk = table_pks[0][0] if len(table_pks) == 1 else "$pk"
-        fields = SQL("object_id, index #>> '{{range,{0},0}}', index #>> '{{range,{0},1}}'").format(
-            Identifier(pk)
-        )
+        # Compose the query instead of rendering the fields with as_string(), which
+        # needs a Psycopg connection (the metadata engine can be an SPIEngine).
+        query = SQL(
+            "SELECT object_id, index #>> '{{range,{0},0}}', index #>> '{{range,{0},1}}' "
+            "FROM {1}.{2}(%s)"
+        ).format(Identifier(pk), Identifier(SPLITGRAPH_API_SCHEMA), Identifier("get_object_meta"))
 
         result = {
             r[0]: (r[1], r[2])
             for r in self.metadata_engine.run_chunked_sql(
-                select(
-                    "get_object_meta",
-                    fields.as_string(self.metadata_engine.connection),
-                    table_args="(%s)",
-                    schema=SPLITGRAPH_API_SCHEMA,
-                ),
+                query,
                 (fragments,),
                 chunk_position=0,
             )
@@ -659,6 +971,108 @@ class FragmentManager(MetadataManager):
 
         return min_max
 
+    def register_tables(
+        self, repository: "Repository", table_meta: List[Tuple[str, str, TableSchema, List[str]]]
+    ) -> None:
+        """
+        Links tables in an image to physical objects that they are stored as and
+        precomputes the tables' fragment groups (see `get_table_chunk_groups`).
+        Objects must already be registered in the object tree.
+
+        :param repository: Repository that the tables belong to.
+        :param table_meta: A list of (image_hash, table_name, table_schema, object_ids).
+        """
+        super().register_tables(repository, table_meta)
+
+        # Registries don't run layered queries or commits, so there's no point storing
+        # the groups there (and they don't allow writing to splitgraph_meta directly).
+        if self.metadata_engine.registry:
+            return
+
+        chunk_groups = []
+        for image_hash, table_name, table_schema, object_ids in table_meta:
+            try:
+                groups = self._calculate_chunk_groups(object_ids, get_change_key(table_schema))
+            except SplitGraphError:
+                # Some objects don't have PK ranges in their index: readers will
+                # have to deal with that themselves.
+                continue
+            chunk_groups.append(
+                (
+                    repository.namespace,
+                    repository.repository,
+                    image_hash,
+                    table_name,
+                    object_ids,
+                    # Dates and timestamps are stored as strings and parsed back with adapt().
+                    Json(groups, dumps=lambda g: json.dumps(g, default=str)),
+                )
+            )
+
+        if chunk_groups:
+            self.metadata_engine.run_sql_batch(
+                SQL(
+                    "INSERT INTO {}.table_chunk_groups (namespace, repository, image_hash, "
+                    "table_name, object_ids, groups) VALUES (%s, %s, %s, %s, %s, %s) "
+                    "ON CONFLICT (namespace, repository, image_hash, table_name) DO UPDATE "
+                    "SET object_ids = EXCLUDED.object_ids, groups = EXCLUDED.groups"
+                ).format(Identifier(SPLITGRAPH_META_SCHEMA)),
+                chunk_groups,
+            )
+
+    def _calculate_chunk_groups(
+        self, object_ids: List[str], table_pks: List[Tuple[str, str]]
+    ) -> ChunkGroups:
+        if not table_pks:
+            # No columns to get the ranges of: assume all fragments overlap.
+            return [[(o, (), ()) for o in object_ids]] if object_ids else []
+        min_max = self.get_min_max_pks(object_ids, table_pks)
+        return get_chunk_groups([(o, mm[0], mm[1]) for o, mm in zip(object_ids, min_max)])
+
+    def get_table_chunk_groups(self, table: "Table") -> ChunkGroups:
+        """
+        Get the fragments of a table grouped into groups that don't overlap each other
+        (see `get_chunk_groups`). The groups are calculated when the table is registered,
+        so this normally doesn't need to look at the fragments' indexes.
+
+        :param table: Table object
+        :return: List of groups, each a list of (object_id, min_pk, max_pk) where the PKs
+            are tuples of the table's change key columns (see `get_change_key`).
+        """
+        table_pks = get_change_key(table.table_schema)
+
+        stored = None
+        if not self.metadata_engine.registry:
+            stored = self.metadata_engine.run_sql(
+                select(
+                    "table_chunk_groups",
+                    "object_ids, groups",
+                    "namespace = %s AND repository = %s AND image_hash = %s AND table_name = %s",
+                ),
+                (
+                    table.repository.namespace,
+                    table.repository.repository,
+                    table.image.image_hash,
+                    table.table_name,
+                ),
+                return_shape=ResultShape.ONE_MANY,
+            )
+
+        # The groups are stale if objects were added to the table after it was registered.
+        if not stored or stored[0] != table.objects:
+            return self._calculate_chunk_groups(table.objects, table_pks)
+
+        def _adapt_pk(pk: List[Any]) -> Tuple:
+            return tuple(adapt(v, c[1]) for v, c in zip(pk, table_pks))
+
+        return [
+            [
+                (object_id, _adapt_pk(min_pk), _adapt_pk(max_pk))
+                for object_id, min_pk, max_pk in group
+            ]
+            for group in stored[1]
+        ]
+
     def calculate_content_hash(
         self,
         schema: str,
@@ -679,26 +1093,14 @@ class FragmentManager(MetadataManager):
             and the number of rows in the hash.
         """
         table_schema = table_schema or self.object_engine.get_full_table_schema(schema, table)
-        digest_query = (
-            SQL("SELECT digest((")
-            + SQL(",").join(Identifier(c.name) for c in table_schema)
-            + SQL(")::text, 'sha256'::text) FROM {}.{} o").format(
-                Identifier(schema), Identifier(table)
-            )
-        )
+        source = SQL(" FROM {}.{} o").format(Identifier(schema), Identifier(table))
         args = None
         if chunk_id_col:
-            digest_query += SQL(" WHERE {} = %s").format(Identifier(chunk_id_col))
+            source += SQL(" WHERE {} = %s").format(Identifier(chunk_id_col))
             args = [chunk_id]
 
-        row_digests = self.object_engine.run_sql(
-            digest_query, args, return_shape=ResultShape.MANY_ONE
-        )
-
-        return (
-            reduce(operator.add, (Digest.from_memoryview(r) for r in row_digests)).hex(),
-            len(row_digests),
-        )
+        digest_sum, row_count = self._sum_digests(_get_row_digest_sql(table_schema), source, args)
+        return digest_sum.hex(), row_count
 
     def create_base_fragment(
         self,
@@ -711,7 +1113,24 @@ class FragmentManager(MetadataManager):
         in_fragment_order: Optional[List[str]] = None,
         overwrite: bool = False,
         table_schema: Optional[TableSchema] = None,
+        source_filter: Optional[SourceFilter] = None,
     ) -> str:
+        """
+        Stores a table (or a part of it) as a base fragment and registers it.
+
+        :param source_schema: Schema the source table is stored in
+        :param source_table: Name of the source table
+        :param namespace: Namespace the object belongs to
+        :param chunk_id_col: Column the table is partitioned on (excluded from the object)
+        :param chunk_id: Value of the partition column to get rows from
+        :param extra_indexes: Dictionary of {index_type: column: index_specific_kwargs}.
+        :param in_fragment_order: Key to sort data inside the fragment by.
+        :param overwrite: Overwrite the physical object if it already exists.
+        :param table_schema: Schema of the table (required if the table is temporary)
+        :param source_filter: Alternative to `chunk_id_col`/`chunk_id`: a WHERE clause
+            and a list of its arguments selecting rows in the fragment.
+        :return: ID of the new object.
+        """
         if source_schema == "pg_temp" and not table_schema:
             raise ValueError(
                 "Cannot infer the schema of temporary tables, " "pass in table_schema!"
@@ -727,44 +1146,17 @@ class FragmentManager(MetadataManager):
             if c.name != chunk_id_col
         ]
 
-        schema_hash = self._calculate_schema_hash(table_schema)
-        # Get content hash for this chunk.
-        content_hash, rows_inserted = self.calculate_content_hash(
-            source_schema, source_table, table_schema, chunk_id_col=chunk_id_col, chunk_id=chunk_id
-        )
-
-        # Object IDs are also used to key tables in Postgres so they can't be more than 63 characters.
-        # In addition, table names can't start with a number (they can but every invocation has to
-        # be quoted) so we have to drop 2 characters from the 64-character hash and append an "o".
-        object_id = "o" + sha256((content_hash + schema_hash).encode("ascii")).hexdigest()[:-2]
-
         with self.object_engine.savepoint("object_rename"):
-            # Store the object adding the extra update/delete column (always True in this case
-            # since we don't overwrite any rows) and filtering on the chunk ID.
-
-            source_query = (
-                SQL("SELECT ")
-                + SQL(",").join(Identifier(c.name) for c in table_schema)
-                + SQL(",TRUE AS ")
-                + Identifier(SG_UD_FLAG)
-                + SQL("FROM {}.{}").format(Identifier(source_schema), Identifier(source_table))
-            )
-            source_query_args = []
-
             if chunk_id_col:
-                source_query += SQL("WHERE {} = %s").format(Identifier(chunk_id_col))
-                source_query_args = [chunk_id]
-
-            if in_fragment_order:
-                source_query += SQL(" ") + self._get_order_by_clause(
-                    in_fragment_order, table_schema
-                )
-            self.object_engine.store_object(
-                object_id=object_id,
-                source_query=source_query,
-                schema_spec=add_ud_flag_column(table_schema),
-                source_query_args=source_query_args,
-                overwrite=overwrite,
+                source_filter = _get_chunk_filter(chunk_id_col, chunk_id)
+            object_id, content_hash, rows_inserted, object_index = self._store_base_fragment(
+                source_schema,
+                source_table,
+                table_schema,
+                source_filter,
+                in_fragment_order,
+                overwrite,
+                extra_indexes,
             )
         with self.metadata_engine.savepoint("object_register"):
             try:
@@ -774,7 +1166,7 @@ class FragmentManager(MetadataManager):
                     insertion_hash=content_hash,
                     deletion_hash="0" * 64,
                     table_schema=table_schema,
-                    extra_indexes=extra_indexes,
+                    object_index=object_index,
                     rows_inserted=rows_inserted,
                     rows_deleted=0,
                 )
@@ -789,6 +1181,154 @@ class FragmentManager(MetadataManager):
 
         return object_id
 
+    def _store_base_fragment(
+        self,
+        source_schema: str,
+        source_table: str,
+        table_schema: TableSchema,
+        source_filter: Optional[SourceFilter] = None,
+        in_fragment_order: Optional[List[str]] = None,
+        overwrite: bool = False,
+        extra_indexes: Optional[ExtraIndexInfo] = None,
+    ) -> Tuple[str, str, int, Dict[str, Any]]:
+        """
+        Hashes and indexes a base fragment (or one chunk of it) and stores it as an object
+        without registering it.
+
+        :return: Object ID, content hash, number of rows in the fragment and the object index.
+        """
+        extra_indexes = extra_indexes or {}
+        _validate_extra_indexes(extra_indexes)
+
+        schema_hash = self._calculate_schema_hash(table_schema)
+        # Get the content hash for this chunk as well as the data for the object index:
+        # this saves us from having to scan through the object again after it's been stored.
+        (
+            content_hash,
+            rows_inserted,
+            range_min_max,
+            bloom_values,
+            null_counts,
+            sums,
+        ) = self._calculate_base_stats(
+            source_schema, source_table, table_schema, source_filter, extra_indexes
+        )
+
+        # Object IDs are also used to key tables in Postgres so they can't be more than 63 characters.
+        # In addition, table names can't start with a number (they can but every invocation has to
+        # be quoted) so we have to drop 2 characters from the 64-character hash and append an "o".
+        object_id = "o" + sha256((content_hash + schema_hash).encode("ascii")).hexdigest()[:-2]
+
+        # Store the object adding the extra update/delete column (always True in this case
+        # since we don't overwrite any rows) and filtering on the chunk ID.
+        source_query = (
+            SQL("SELECT ")
+            + SQL(",").join(Identifier(c.name) for c in table_schema)
+            + SQL(",TRUE AS ")
+            + Identifier(SG_UD_FLAG)
+            + SQL("FROM {}.{}").format(Identifier(source_schema), Identifier(source_table))
+        )
+        source_query_args: List[Any] = []
+
+        if source_filter:
+            source_query += SQL(" WHERE ") + source_filter[0]
+            source_query_args = source_filter[1]
+
+        if in_fragment_order:
+            source_query += SQL(" ") + self._get_order_by_clause(in_fragment_order, table_schema)
+        self.object_engine.store_object(
+            object_id=object_id,
+            source_query=source_query,
+            schema_spec=add_ud_flag_column(table_schema),
+            source_query_args=source_query_args,
+            overwrite=overwrite,
+        )
+
+        object_index = self.generate_object_index(
+            object_id,
+            table_schema,
+            extra_indexes=extra_indexes,
+            range_min_max=range_min_max,
+            bloom_values=bloom_values,
+            null_counts=null_counts,
+            sums=sums,
+        )
+        return object_id, content_hash, rows_inserted, object_index
+
+    def _calculate_base_stats(
+        self,
+        source_schema: str,
+        source_table: str,
+        table_schema: TableSchema,
+        source_filter: Optional[SourceFilter],
+        extra_indexes: ExtraIndexInfo,
+    ) -> Tuple[str, int, Sequence[Any], Dict[str, List[str]], Sequence[int], Sequence[Any]]:
+        """
+        Calculates the content hash of a base fragment and the values required to build its
+        range, null count, sum, bloom and other indexes in a single scan through the source table.
+        The results are the same as running `calculate_content_hash` on the source and then
+        `generate_range_index`, `generate_null_count_index`, `generate_sum_index` and
+        `generate_bloom_index` on the stored object.
+
+        :return: Content hash, number of rows, MIN/MAX values of range-indexed columns,
+            a dictionary of bloom-, xor-, valueset- or ngram-indexed column -> distinct values in it,
+            the numbers of NULLs in every column and the sums of numeric columns.
+        """
+        range_columns = get_range_index_columns(
+            table_schema, _get_range_index_columns(extra_indexes)
+        )
+        bloom_columns = list(extra_indexes.get("bloom", {}))
+        for index_name in ("xor", "valueset", "ngram"):
+            bloom_columns.extend(
+                c for c in extra_indexes.get(index_name, {}) if c not in bloom_columns
+            )
+
+        # Without the lthash aggregate, the row digests can't be summed in the same scan and are
+        # streamed separately (see _sum_digests) instead of being aggregated into one array.
+        has_lthash = self._has_lthash()
+        digest_sql = _get_row_digest_sql(table_schema)
+        query = SQL("SELECT ") + (
+            self._digest_sum_sql(digest_sql) if has_lthash else SQL("NULL, COUNT(1)")
+        )
+        query += SQL(",") + get_null_count_expressions(table_schema)
+        sum_columns = get_sum_columns(table_schema)
+        if sum_columns:
+            query += SQL(",") + get_sum_expressions(table_schema)
+        if range_columns:
+            query += SQL(",") + get_range_index_expressions(table_schema, range_columns)
+        for column in bloom_columns:
+            query += SQL(",array_agg(DISTINCT coalesce({}::text, 'NULL'))").format(
+                Identifier(column)
+            )
+        source = SQL(" FROM {}.{} o").format(Identifier(source_schema), Identifier(source_table))
+        args = None
+        if source_filter:
+            source += SQL(" WHERE ") + source_filter[0]
+            args = source_filter[1]
+
+        result = self.object_engine.run_sql(query + source, args, return_shape=ResultShape.ONE_MANY)
+        if has_lthash:
+            digest_sum = self._parse_digest_sum(result[0])
+        else:
+            digest_sum, _ = self._sum_digests(digest_sql, source, args)
+        null_counts = result[2 : 2 + len(table_schema)]
+        sums = result[2 + len(table_schema) : 2 + len(table_schema) + len(sum_columns)]
+        range_start = 2 + len(table_schema) + len(sum_columns)
+        range_min_max = result[range_start : range_start + len(range_columns) * 2]
+        bloom_values = {
+            column: values or []
+            for column, values in zip(bloom_columns, result[range_start + len(range_columns) * 2 :])
+        }
+
+        return (
+            digest_sum.hex(),
+            result[1],
+            range_min_max,
+            bloom_values,
+            null_counts,
+            sums,
+        )
+
     @staticmethod
     def _get_order_by_clause(in_fragment_order, table_schema):
         column_names = [s.name for s in table_schema]
@@ -816,6 +1356,7 @@ class FragmentManager(MetadataManager):
         extra_indexes: Optional[ExtraIndexInfo] = None,
         in_fragment_order: Optional[List[str]] = None,
         overwrite: bool = False,
+        workers: int = 1,
     ) -> List[str]:
         """
         Copies the full table verbatim into one or more new base fragments and registers them.
@@ -829,6 +1370,8 @@ class FragmentManager(MetadataManager):
         :param extra_indexes: Dictionary of {index_type: column: index_specific_kwargs}.
         :param in_fragment_order: Key to sort data inside each chunk by.
         :param overwrite: Overwrite physical objects that already exist.
+        :param workers: If greater than 1, create chunks in parallel using this many
+            engine connections. See `_chunk_table_parallel` for details.
         """
         source_schema = source_schema or repository.to_schema()
         source_table = source_table or table_name
@@ -851,6 +1394,7 @@ class FragmentManager(MetadataManager):
                 extra_indexes,
                 in_fragment_order=in_fragment_order,
                 overwrite=overwrite,
+                workers=workers,
             )
 
         elif table_size:
@@ -882,12 +1426,143 @@ class FragmentManager(MetadataManager):
         table_schema: Optional[TableSchema] = None,
         in_fragment_order: Optional[List[str]] = None,
         overwrite: bool = False,
+        workers: int = 1,
     ) -> List[str]:
-        table_pk = [p[0] for p in self.object_engine.get_change_key(source_schema, source_table)]
         table_schema = table_schema or self.object_engine.get_full_table_schema(
             source_schema, source_table
         )
+
+        strategy = get_singleton(CONFIG, "SG_COMMIT_CHUNKING")
+        if strategy not in ("partition", "keyset"):
+            raise ValueError("Unknown chunking strategy %s!" % strategy)
+        # Chunk boundaries found by walking the key are only unique (and match
+        # the ones from partitioning) if the key is an actual primary key.
+        table_pk = [c for c in table_schema if c.is_pk]
+        use_keyset = strategy == "keyset" and bool(table_pk)
+
+        if workers > 1:
+            return self._chunk_table_parallel(
+                repository,
+                source_schema,
+                source_table,
+                table_size,
+                chunk_size,
+                table_schema,
+                extra_indexes,
+                in_fragment_order,
+                overwrite,
+                workers,
+                use_keyset,
+            )
+
         object_ids = []
+        temp_table = "sg_tmp_partition_" + source_table
+
+        logging.info("Processing table %s", source_table)
+        no_chunks = int(math.ceil(table_size / chunk_size))
+
+        log_progress = _log_commit_progress(table_size, no_chunks)
+        log_func = logging.info if log_progress else logging.debug
+
+        chunk_filters: Iterable[SourceFilter]
+        if use_keyset:
+            # Read chunks straight from the source table: the boundaries get found as we go.
+            chunk_schema, chunk_table = source_schema, source_table
+            chunk_filters = self._get_keyset_filters(
+                source_schema, source_table, table_pk, chunk_size
+            )
+        else:
+            self._partition_table(
+                source_schema, source_table, "pg_temp", temp_table, chunk_size, log_func
+            )
+            chunk_schema, chunk_table = "pg_temp", temp_table
+            chunk_filters = (_get_chunk_filter(_CHUNK_ID_COL, c) for c in range(0, no_chunks))
+
+        log_func("Storing and indexing the table")
+        pbar = tqdm(
+            chunk_filters,
+            unit="objs",
+            total=no_chunks,
+            ascii=SG_CMD_ASCII,
+            disable=not log_progress,
+        )
+
+        for source_filter in pbar:
+            new_fragment = self.create_base_fragment(
+                chunk_schema,
+                chunk_table,
+                repository.namespace,
+                source_filter=source_filter,
+                extra_indexes=extra_indexes,
+                table_schema=table_schema,
+                in_fragment_order=in_fragment_order,
+                overwrite=overwrite,
+            )
+            object_ids.append(new_fragment)
+
+        if not use_keyset:
+            # Temporary tables get deleted at the end of tx but sometimes we might run
+            # multiple sg operations in the same transaction and clash.
+            self.object_engine.delete_table("pg_temp", temp_table)
+        return object_ids
+
+    def _get_keyset_filters(
+        self, source_schema: str, source_table: str, table_pk: TableSchema, chunk_size: int
+    ) -> Iterator[SourceFilter]:
+        """
+        Splits a table into chunks of `chunk_size` rows in primary key order without
+        copying it. The first key of each chunk is found by skipping `chunk_size` entries
+        of the PK index from the start of the previous chunk, so the whole table is only
+        traversed once and no temporary space is used.
+
+        :param source_schema: Schema of the source table
+        :param source_table: Source table
+        :param table_pk: Primary key columns of the table
+        :param chunk_size: Number of rows in each chunk
+        :return: Generator of filters selecting each chunk from the table
+        """
+        pk_sql = SQL(",").join(Identifier(c.name) for c in table_pk)
+        query = (
+            SQL("SELECT ")
+            + pk_sql
+            + SQL(" FROM {}.{}").format(Identifier(source_schema), Identifier(source_table))
+        )
+        order_by = SQL(" ORDER BY ") + pk_sql
+
+        start = self.object_engine.run_sql(
+            query + order_by + SQL(" LIMIT 1"), return_shape=ResultShape.ONE_MANY
+        )
+        while start is not None:
+            clause, args = _get_key_range_filter(table_pk, start, None)
+            end = self.object_engine.run_sql(
+                query + SQL(" WHERE ") + clause + order_by + SQL(" OFFSET %s LIMIT 1"),
+                args + [chunk_size],
+                return_shape=ResultShape.ONE_MANY,
+            )
+            yield _get_key_range_filter(table_pk, start, end)
+            start = end
+
+    def _partition_table(
+        self,
+        source_schema: str,
+        source_table: str,
+        target_schema: str,
+        target_table: str,
+        chunk_size: int,
+        log_func: Callable = logging.info,
+    ) -> None:
+        """
+        Copies a table into a new table, adding a column with the ID of the chunk that each row
+        belongs to (rows are assigned to chunks in PK order).
+
+        :param source_schema: Schema of the source table
+        :param source_table: Source table
+        :param target_schema: Schema to create the partitioned table in. If `pg_temp`, the
+            table is created as a TEMPORARY table, otherwise, as an UNLOGGED table.
+        :param target_table: Name of the partitioned table
+        :param chunk_size: Number of rows in each chunk
+        """
+        table_pk = [p[0] for p in self.object_engine.get_change_key(source_schema, source_table)]
 
         # We need to do multiple things here in a specific way to not tank the performance:
         #  * Chunk the table up ordering by PK (or potentially another chunk key in the future)
@@ -916,65 +1591,154 @@ class FragmentManager(MetadataManager):
         # into a TEMPORARY table, then create an index on that partition key, then copy data
         # out of it into CStore. The first part takes 50 seconds, the second takes 16 seconds
         # and after that extracting a chunk takes a few seconds.
-
-        temp_table = "sg_tmp_partition_" + source_table
-        chunk_id_col = "sg_tmp_partition_id"
+        if target_schema == "pg_temp":
+            target = SQL("TEMPORARY TABLE {}").format(Identifier(target_table))
+        else:
+            target = SQL("UNLOGGED TABLE {}.{}").format(
+                Identifier(target_schema), Identifier(target_table)
+            )
 
         pk_sql = SQL(",").join(Identifier(p) for p in table_pk)
         # Example query: CREATE TEMPORARY TABLE sg_tmp_partition_table AS SELECT *,
         # RANK () OVER (ORDER BY pk) / chunk_size sg_tmp_partition_id FROM source_schema.table
-        logging.info("Processing table %s", source_table)
-        no_chunks = int(math.ceil(table_size / chunk_size))
-
-        log_progress = _log_commit_progress(table_size, no_chunks)
-        log_func = logging.info if log_progress else logging.debug
-
         log_func("Computing table partitions")
         tmp_table_query = (
-            SQL("CREATE TEMPORARY TABLE {} AS SELECT *, (ROW_NUMBER() OVER (ORDER BY ").format(
-                Identifier(temp_table)
-            )
+            SQL("CREATE ")
+            + target
+            + SQL(" AS SELECT *, (ROW_NUMBER() OVER (ORDER BY ")
             + pk_sql
             + SQL(") - 1) / %s {} FROM {}.{}").format(
-                Identifier(chunk_id_col), Identifier(source_schema), Identifier(source_table)
+                Identifier(_CHUNK_ID_COL), Identifier(source_schema), Identifier(source_table)
             )
         )
         self.object_engine.run_sql(tmp_table_query, (chunk_size,))
 
         log_func("Indexing the partition key")
         self.object_engine.run_sql(
-            SQL("CREATE INDEX {} ON {}({})").format(
-                Identifier("idx_" + temp_table), Identifier(temp_table), Identifier(chunk_id_col)
+            SQL("CREATE INDEX {} ON {}.{}({})").format(
+                Identifier("idx_" + target_table),
+                Identifier(target_schema),
+                Identifier(target_table),
+                Identifier(_CHUNK_ID_COL),
             )
         )
 
-        log_func("Storing and indexing the table")
-        pbar = tqdm(
-            range(0, no_chunks),
-            unit="objs",
-            total=no_chunks,
-            ascii=SG_CMD_ASCII,
-            disable=not log_progress,
-        )
+    def _chunk_table_parallel(
+        self,
+        repository: "Repository",
+        source_schema: str,
+        source_table: str,
+        table_size: int,
+        chunk_size: int,
+        table_schema: TableSchema,
+        extra_indexes: Optional[ExtraIndexInfo] = None,
+        in_fragment_order: Optional[List[str]] = None,
+        overwrite: bool = False,
+        workers: int = 2,
+        use_keyset: bool = False,
+    ) -> List[str]:
+        """
+        Same as `_chunk_table`, but hashes, stores and indexes chunks in a pool of worker
+        threads, each one of which uses its own engine connection. The objects are registered
+        in one batch at the end.
+
+        Since worker connections can't see TEMPORARY tables, the table is partitioned into an
+        UNLOGGED staging table in splitgraph_meta instead. That (and all object writing) is done
+        on worker connections in autocommit mode, so the caller's transaction isn't committed
+        and can still be rolled back. With keyset chunking, the workers read chunks from
+        the source table directly.
+        """
+        # Leave one connection in the pool for the main thread.
+        workers = max(min(workers, int(get_singleton(CONFIG, "SG_ENGINE_POOL")) - 1), 1)
+        temp_table = get_temporary_table_id()
 
-        for chunk_id in pbar:
-            new_fragment = self.create_base_fragment(
-                "pg_temp",
-                temp_table,
-                repository.namespace,
-                chunk_id_col=chunk_id_col,
-                chunk_id=chunk_id,
-                extra_indexes=extra_indexes,
-                table_schema=table_schema,
+        logging.info("Processing table %s using %d workers", source_table, workers)
+        no_chunks = int(math.ceil(table_size / chunk_size))
+
+        log_progress = _log_commit_progress(table_size, no_chunks)
+        log_func = logging.info if log_progress else logging.debug
+
+        chunk_filters: List[SourceFilter]
+        if use_keyset:
+            chunk_schema, chunk_table = source_schema, source_table
+            log_func("Finding chunk boundaries")
+            chunk_filters = list(
+                self._get_keyset_filters(
+                    source_schema, source_table, [c for c in table_schema if c.is_pk], chunk_size
+                )
+            )
+        else:
+            chunk_schema, chunk_table = SPLITGRAPH_META_SCHEMA, temp_table
+            chunk_filters = [_get_chunk_filter(_CHUNK_ID_COL, c) for c in range(0, no_chunks)]
+
+        def _store_chunk(source_filter: SourceFilter) -> Object:
+            object_id, content_hash, rows_inserted, object_index = self._store_base_fragment(
+                chunk_schema,
+                chunk_table,
+                table_schema,
+                source_filter=source_filter,
                 in_fragment_order=in_fragment_order,
                 overwrite=overwrite,
+                extra_indexes=extra_indexes,
+            )
+            return self._generate_object_meta(
+                object_id,
+                namespace=repository.namespace,
+                insertion_hash=content_hash,
+                deletion_hash="0" * 64,
+                table_schema=table_schema,
+                object_index=object_index,
+                rows_inserted=rows_inserted,
+                rows_deleted=0,
             )
-            object_ids.append(new_fragment)
 
-        # Temporary tables get deleted at the end of tx but sometimes we might run
-        # multiple sg operations in the same transaction and clash.
-        self.object_engine.delete_table("pg_temp", temp_table)
-        return object_ids
+        engine = self.object_engine
+        objects: List[Object] = []
+        try:
+            # Same as with S3 uploads/downloads: the main thread doesn't use its
+            # connection whilst the workers are running, so it's safe to flip this.
+            engine.autocommit = True
+            with ThreadPoolExecutor(max_workers=workers) as tpe:
+                try:
+                    if not use_keyset:
+                        tpe.submit(
+                            self._partition_table,
+                            source_schema,
+                            source_table,
+                            SPLITGRAPH_META_SCHEMA,
+                            temp_table,
+                            chunk_size,
+                            log_func,
+                        ).result()
+
+                    log_func("Storing and indexing the table")
+                    pbar = tqdm(
+                        tpe.map(_store_chunk, chunk_filters),
+                        unit="objs",
+                        total=no_chunks,
+                        ascii=SG_CMD_ASCII,
+                        disable=not log_progress,
+                    )
+                    for object_meta in pbar:
+                        objects.append(object_meta)
+                finally:
+                    if not use_keyset:
+                        tpe.submit(engine.delete_table, SPLITGRAPH_META_SCHEMA, temp_table).result()
+        finally:
+            engine.autocommit = False
+            engine.close_others()
+
+        try:
+            with self.metadata_engine.savepoint("object_register"):
+                self.register_objects(objects)
+        except UniqueViolation:
+            # Someone registered some of these objects (perhaps a concurrent pull)
+            # between us checking and inserting them: add_object overwrites existing
+            # objects, so try again.
+            logging.info("Some objects for table %s already exist, retrying", source_table)
+            self.register_objects(objects)
+
+        return [o.object_id for o in objects]
 
     def filter_fragments(self, object_ids: List[str], table: "Table", quals: Any) -> List[str]:
         """
@@ -990,7 +1754,9 @@ class FragmentManager(MetadataManager):
             (qual_1 OR qual_2) AND (qual_3 OR qual_4).
 
             Each qual is a tuple of `(column_name, operator, value)` where
-            `operator` can be one of `>`, `>=`, `<`, `<=`, `=`.
+            `operator` can be one of `>`, `>=`, `<`, `<=`, `=`, `~~` (LIKE), `&&` (bounding box
+            overlap with a geometry or geography value), `IS NULL` or `IS NOT NULL` (the value
+            is ignored for the last two).
 
             For unknown operators, it will be assumed that all fragments might match that clause.
         :return: List of objects that might match the given qualifiers.
@@ -1000,6 +1766,22 @@ class FragmentManager(MetadataManager):
 
         column_types = {c[1]: c[2] for c in table.table_schema}
 
+        # Get the bounding boxes of the shapes in && quals on geometry/geography columns
+        # (requires PostGIS, so we do this on the object engine).
+        quals = get_query_bboxes(self.object_engine, quals, column_types)
+
+        # If enabled, try evaluating the quals against the indexes loaded into memory first.
+        if self.in_memory_index and _NUMPY_SUPPORTED:
+            result = self.get_fragment_index(object_ids, table).filter(object_ids, quals)
+            if result is not None:
+                if len(result) < len(object_ids):
+                    logging.info(
+                        "In-memory index discarded %d/%d fragment(s)",
+                        len(object_ids) - len(result),
+                        len(object_ids),
+                    )
+                return result
+
         # Run the range filter
         range_filter_result = filter_range_index(
             self.metadata_engine, object_ids, quals, column_types
@@ -1012,7 +1794,7 @@ class FragmentManager(MetadataManager):
             )
 
         # Run other filters: currently we can attempt to run the bloom filter
-        # if the fragment metadata has bloom fingerprints.
+        # if the fragment metadata has bloom fingerprints or xor filters.
         bloom_filter_result = filter_bloom_index(self.metadata_engine, range_filter_result, quals)
         if len(bloom_filter_result) < len(range_filter_result):
             logging.info(
@@ -1021,8 +1803,65 @@ class FragmentManager(MetadataManager):
                 len(range_filter_result),
             )
 
+        valueset_filter_result = filter_valueset_index(
+            self.metadata_engine, bloom_filter_result, quals
+        )
+        if len(valueset_filter_result) < len(bloom_filter_result):
+            logging.info(
+                "Value set filter discarded %d/%d fragment(s)",
+                len(bloom_filter_result) - len(valueset_filter_result),
+                len(bloom_filter_result),
+            )
+
+        ngram_filter_result = filter_ngram_index(
+            self.metadata_engine, valueset_filter_result, quals
+        )
+        if len(ngram_filter_result) < len(valueset_filter_result):
+            logging.info(
+                "N-gram filter discarded %d/%d fragment(s)",
+                len(valueset_filter_result) - len(ngram_filter_result),
+                len(valueset_filter_result),
+            )
+
+        bbox_filter_result = filter_bbox_index(self.metadata_engine, ngram_filter_result, quals)
+        if len(bbox_filter_result) < len(ngram_filter_result):
+            logging.info(
+                "Bounding box filter discarded %d/%d fragment(s)",
+                len(ngram_filter_result) - len(bbox_filter_result),
+                len(ngram_filter_result),
+            )
+
         # Preserve original object order.
-        return [r for r in object_ids if r in bloom_filter_result]
+        return [r for r in object_ids if r in bbox_filter_result]
+
+    def get_fragment_index(self, object_ids: List[str], table: "Table") -> "FragmentIndex":
+        """
+        Get the range and bloom indexes of multiple fragments loaded into memory
+        (requires NumPy). The indexes are kept around until the fragments' metadata changes.
+
+        :param object_ids: List of object IDs
+        :param table: Table the objects belong to
+        :return: FragmentIndex object
+        """
+        key = (tuple(object_ids), tuple(table.table_schema))
+        fragment_index = self._fragment_indexes.get(key)
+        if fragment_index:
+            self._fragment_indexes.move_to_end(key)
+            return fragment_index
+
+        fragment_index = FragmentIndex(
+            object_ids, self.get_object_meta(object_ids), table.table_schema
+        )
+        self._fragment_indexes[key] = fragment_index
+        while len(self._fragment_indexes) > _FRAGMENT_INDEX_CACHE_SIZE:
+            self._fragment_indexes.popitem(last=False)
+        return fragment_index
+
+    def _invalidate_object_meta(self, object_ids: Sequence[str]) -> None:
+        super()._invalidate_object_meta(object_ids)
+        invalidated = set(object_ids)
+        for key in [k for k in self._fragment_indexes if invalidated.intersection(k[0])]:
+            del self._fragment_indexes[key]
 
     def delete_objects(self, objects: Union[Set[str], List[str]]) -> None:
         """
@@ -0,0 +1,245 @@
+"""Answering COUNT/MIN/MAX/SUM queries from per-fragment statistics recorded at commit time."""
+import re
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple, TYPE_CHECKING, Iterable
+
+from psycopg2.sql import SQL, Identifier, Composable
+
+from splitgraph.config import SPLITGRAPH_META_SCHEMA
+from splitgraph.core.common import coerce_val_to_json
+from splitgraph.core.indexing.range import _inject_collation, _max, _min, _strip_type_mod
+from splitgraph.core.output import parse_date, parse_dt
+from splitgraph.engine import ResultShape
+from splitgraph.engine.postgres.engine import SG_UD_FLAG
+
+if TYPE_CHECKING:
+    from splitgraph.core.metadata_manager import Object
+    from splitgraph.core.types import TableSchema
+    from splitgraph.engine.postgres.engine import PsycopgEngine
+
+# Aggregate function and the column it's calculated on (None for COUNT(*))
+Aggregate = Tuple[str, Optional[str]]
+
+AGGREGATE_FUNCTIONS = ("count", "min", "max", "sum")
+
+# Types of columns that get their sums recorded in the "sum" index
+_SUM_TYPES = ("smallint", "integer", "bigint", "numeric", "real", "double precision")
+
+# Convert range index bounds and sums (stored as JSON) back into the Python types
+# that psycopg2 returns for MIN/MAX/SUM of a column of a given type. Bounds of
+# columns of other types aren't used and the fragment gets scanned instead.
+_BOUND_PARSERS = {
+    "smallint": int,
+    "integer": int,
+    "bigint": int,
+    "numeric": lambda v: Decimal(str(v)),
+    "real": float,
+    "double precision": float,
+    "date": parse_date,
+    "timestamp": parse_dt,
+    "timestamp without time zone": parse_dt,
+    "text": str,
+    "character varying": str,
+    "varchar": str,
+}
+
+# Postgres returns a bigint for SUM(smallint/integer) and a numeric for SUM(bigint/numeric)
+_SUM_PARSERS = {
+    "smallint": int,
+    "integer": int,
+    "bigint": lambda v: Decimal(str(v)),
+    "numeric": lambda v: Decimal(str(v)),
+    "real": float,
+    "double precision": float,
+}
+
+
+def get_sum_columns(table_schema: "TableSchema") -> List[str]:
+    """
+    Get the columns that the sum index is generated on (those with numeric types).
+
+    :param table_schema: Schema of the table
+    :return: List of column names
+    """
+    return [c.name for c in table_schema if _strip_type_mod(c.pg_type) in _SUM_TYPES]
+
+
+def get_sum_expressions(table_schema: "TableSchema") -> Composable:
+    """
+    Get the list of SUM aggregates that calculate the sum index.
+
+    :param table_schema: Schema of the table
+    :return: SQL Composable with a comma-separated list of SUM(col) aggregates (empty if
+        there are no numeric columns).
+    """
+    return SQL(",").join(
+        SQL("SUM({})").format(Identifier(c)) for c in get_sum_columns(table_schema)
+    )
+
+
+def generate_sum_index(
+    object_engine: "PsycopgEngine",
+    object_id: str,
+    table_schema: "TableSchema",
+    sums: Optional[Sequence[Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Calculate the sums of all numeric columns over the rows that the object inserts.
+    Unlike other indexes, this doesn't include the values that the object deletes: it's
+    only used to answer aggregate queries on objects that don't delete anything.
+
+    :param object_engine: Engine the object is located on
+    :param object_id: ID of the object.
+    :param table_schema: Schema of the table
+    :param sums: Optional, result of the aggregates from `get_sum_expressions` if it
+        has already been calculated. If specified, the object isn't scanned.
+    :return: Dictionary of {column: sum} (None if the column only has NULLs).
+    """
+    columns = get_sum_columns(table_schema)
+    if not columns:
+        return {}
+    if sums is None:
+        query = SQL("SELECT ") + get_sum_expressions(table_schema)
+        query += SQL(" FROM {}.{} WHERE {}").format(
+            Identifier(SPLITGRAPH_META_SCHEMA), Identifier(object_id), Identifier(SG_UD_FLAG)
+        )
+        sums = object_engine.run_sql(query, return_shape=ResultShape.ONE_MANY)
+    return {c: coerce_val_to_json(s) for c, s in zip(columns, sums)}
+
+
+_AGGREGATE_RE = re.compile(r'^\s*(\w+)\s*\(\s*(\*|"(?:[^"]|"")+"|\w+)\s*\)\s*$')
+
+
+def parse_aggregate(aggregate: str) -> Aggregate:
+    """
+    Parse an aggregate expression like `count(*)`, `max(ts)` or `sum("Amount")` into a
+    (function, column) tuple. Like in PostgreSQL, unquoted column names are lowercased.
+
+    :param aggregate: Aggregate expression
+    :return: (function, column) where column is None for COUNT(*).
+    """
+    match = _AGGREGATE_RE.match(aggregate)
+    if not match:
+        raise ValueError("Can't parse aggregate %s!" % aggregate)
+    function, column = match.group(1).lower(), match.group(2)
+    if column == "*":
+        return function, None
+    if column.startswith('"'):
+        return function, column[1:-1].replace('""', '"')
+    return function, column.lower()
+
+
+def validate_aggregates(aggregates: Sequence[Aggregate], table_schema: "TableSchema") -> None:
+    column_types = {c.name: _strip_type_mod(c.pg_type) for c in table_schema}
+    for function, column in aggregates:
+        if function not in AGGREGATE_FUNCTIONS:
+            raise ValueError("Unsupported aggregate function %s!" % function)
+        if column is None:
+            if function != "count":
+                raise ValueError("%s requires a column!" % function.upper())
+            continue
+        if column not in column_types:
+            raise ValueError("Unknown column name %s!" % column)
+        if function == "sum" and column_types[column] not in _SUM_TYPES:
+            raise ValueError("Can't calculate SUM of column %s!" % column)
+
+
+def get_aggregate_expressions(
+    aggregates: Sequence[Aggregate], table_schema: "TableSchema"
+) -> Composable:
+    """
+    Get the list of aggregates that calculate partial results for `combine_aggregates`
+    when run against an object or a staging table. Like in the range index, text columns
+    are compared using the C collation.
+
+    :param aggregates: List of (function, column)
+    :param table_schema: Schema of the table
+    :return: SQL Composable with a comma-separated list of aggregates.
+    """
+    column_types = {c.name: _strip_type_mod(c.pg_type) for c in table_schema}
+    expressions = []
+    for function, column in aggregates:
+        if column is None:
+            expressions.append(SQL("COUNT(*)"))
+        elif function in ("min", "max"):
+            expressions.append(
+                SQL(_inject_collation(function.upper() + "({}", column_types[column]) + ")").format(
+                    Identifier(column)
+                )
+            )
+        else:
+            expressions.append(SQL(function.upper() + "({})").format(Identifier(column)))
+    return SQL(",").join(expressions)
+
+
+def get_fragment_aggregates(
+    object_meta: "Object", aggregates: Sequence[Aggregate], table_schema: "TableSchema"
+) -> Optional[List[Any]]:
+    """
+    Get partial results of aggregates for a fragment from its metadata. This is only valid
+    for fragments that don't overlap with any other fragments (and hence don't have to be
+    applied to anything) and when the query doesn't have any qualifiers.
+
+    :param object_meta: Object metadata
+    :param aggregates: List of (function, column)
+    :param table_schema: Schema of the table
+    :return: List of partial results or None if the object has to be scanned instead
+        (it deletes rows or doesn't have all required statistics).
+    """
+    if object_meta.rows_deleted:
+        return None
+
+    column_types = {c.name: _strip_type_mod(c.pg_type) for c in table_schema}
+    index = object_meta.object_index
+    result: List[Any] = []
+    for function, column in aggregates:
+        if column is None:
+            result.append(object_meta.rows_inserted)
+            continue
+
+        if function == "count":
+            null_count = index.get("null_count", {}).get(column)
+            if null_count is None:
+                return None
+            result.append(object_meta.rows_inserted - null_count)
+        elif function in ("min", "max"):
+            bounds = index.get("range", {}).get(column)
+            parser = _BOUND_PARSERS.get(column_types[column])
+            if bounds is None or parser is None:
+                return None
+            bound = bounds[0 if function == "min" else 1]
+            result.append(parser(bound) if bound is not None else None)
+        else:
+            sums = index.get("sum", {})
+            if column not in sums:
+                return None
+            result.append(
+                _SUM_PARSERS[column_types[column]](sums[column])
+                if sums[column] is not None
+                else None
+            )
+    return result
+
+
+def combine_aggregates(
+    aggregates: Sequence[Aggregate], partials: Iterable[Sequence[Any]]
+) -> List[Any]:
+    """
+    Combine partial results of aggregates over multiple fragments.
+
+    :param aggregates: List of (function, column)
+    :param partials: Iterable of lists of partial results for each aggregate
+    :return: List of final results
+    """
+    result: List[Any] = [0 if function == "count" else None for function, _ in aggregates]
+    for partial in partials:
+        for i, ((function, _), value) in enumerate(zip(aggregates, partial)):
+            if function == "count":
+                result[i] += value
+            elif function == "min":
+                result[i] = _min(result[i], value)
+            elif function == "max":
+                result[i] = _max(result[i], value)
+            elif value is not None:
+                result[i] = value if result[i] is None else result[i] + value
+    return result
@@ -0,0 +1,229 @@
+"""Bounding box filtering on fragments for spatial (`&&`) queries on PostGIS columns."""
+import itertools
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from psycopg2.sql import SQL, Identifier
+
+from splitgraph.config import SPLITGRAPH_META_SCHEMA
+from splitgraph.core.indexing.range import _strip_type_mod
+from splitgraph.core.types import Changeset
+from splitgraph.engine import ResultShape
+
+if TYPE_CHECKING:
+    from splitgraph.engine.postgres.engine import PsycopgEngine
+
+# Column types that the bounding box index can be built on
+BBOX_TYPES = ("geometry", "geography")
+
+# Bounding box: (xmin, ymin, xmax, ymax)
+BBox = Tuple[float, float, float, float]
+
+
+def _widen_geography(bbox: BBox) -> BBox:
+    # Edges of geography shapes are great circle arcs that can go further towards the poles
+    # than their vertices, so we can't use the latitude of the box. If the longitudes of the
+    # vertices span half the globe or more, the shape might cross the antimeridian or contain
+    # a pole, in which case its longitudes aren't bounded by them either.
+    xmin, _, xmax, _ = bbox
+    if xmax - xmin >= 180:
+        xmin, xmax = -180.0, 180.0
+    return xmin, -90.0, xmax, 90.0
+
+
+def generate_bbox_index(
+    engine: "PsycopgEngine",
+    object_id: str,
+    changeset: Optional[Changeset],
+    column: str,
+    ctype: str,
+) -> Optional[List[float]]:
+    """
+    Generates a bounding box index for a given geometry or geography column and a given fragment:
+    the envelope of all shapes in the column. Requires PostGIS on the engine.
+
+    For geography columns, the box is computed from the longitudes and latitudes of the shapes'
+    vertices and widened so that it also contains their edges (see `_widen_geography`).
+
+    :param engine: Object engine the fragment is cached in.
+    :param object_id: Fragment ID
+    :param changeset: Optional, if specified, the old column values are included in the index.
+    :param column: Column name to generate the index on.
+    :param ctype: Type of the column (geometry or geography)
+    :return: List of [xmin, ymin, xmax, ymax] or None if the column doesn't have
+        any non-empty shapes in it.
+    """
+    if ctype not in BBOX_TYPES:
+        raise ValueError(
+            "Can't build a bounding box index on column %s of type %s!" % (column, ctype)
+        )
+
+    old_values = []
+    if changeset:
+        # Add the old values in the changeset for this column (see generate_bloom_index).
+        old_values = [
+            str(old_row[column])
+            for _, old_row, _ in changeset.values()
+            if old_row.get(column) is not None
+        ]
+
+    extent = engine.run_sql(
+        SQL(
+            "SELECT ST_XMin(e), ST_YMin(e), ST_XMax(e), ST_YMax(e) FROM "
+            "(SELECT ST_Extent(g) AS e FROM (SELECT {0}::geometry AS g FROM {1}.{2} "
+            "UNION ALL SELECT unnest(%s::text[])::geometry) v) e"
+        ).format(Identifier(column), Identifier(SPLITGRAPH_META_SCHEMA), Identifier(object_id)),
+        (old_values,),
+        return_shape=ResultShape.ONE_MANY,
+    )
+    if extent is None or extent[0] is None:
+        return None
+
+    bbox = (float(extent[0]), float(extent[1]), float(extent[2]), float(extent[3]))
+    if ctype == "geography":
+        bbox = _widen_geography(bbox)
+    return list(bbox)
+
+
+def describe(bbox: Optional[List[float]]) -> str:
+    """
+    Returns a pretty-printed summary of the bounding box index
+
+    :param bbox: Bounding box returned by generate_bbox_index
+    :return: String
+    """
+    if bbox is None:
+        return "empty"
+    return "[%r, %r] - [%r, %r]" % tuple(bbox)
+
+
+def get_query_bboxes(engine: "PsycopgEngine", quals: Any, column_types: Dict[str, str]) -> Any:
+    """
+    Replace the values of `&&` quals on geometry and geography columns with their
+    bounding boxes, so that they can be checked against the bounding box index without
+    PostGIS. The boxes are calculated on the given engine (which needs to have PostGIS).
+
+    :param engine: Engine to calculate the bounding boxes on.
+    :param quals: Quals in CNF.
+    :param column_types: Dictionary of column names and their types
+    :return: Quals where `&&` quals on geometry and geography columns have a bounding box
+        (or None if the value is an empty shape) as their value.
+    """
+    column_types = {c: _strip_type_mod(t) for c, t in column_types.items()}
+    values = sorted(
+        {
+            str(q[2])
+            for clause in quals
+            for q in clause
+            if q[1] == "&&" and column_types.get(q[0]) in BBOX_TYPES and q[2] is not None
+        }
+    )
+    if not values:
+        return quals
+
+    bboxes = dict(
+        zip(
+            values,
+            engine.run_sql(
+                SQL(
+                    "SELECT ARRAY[ST_XMin(b), ST_YMin(b), ST_XMax(b), ST_YMax(b)] FROM "
+                    "unnest(%s::text[]) WITH ORDINALITY v(g, i), Box2D(g::geometry) b ORDER BY i"
+                ),
+                (values,),
+                return_shape=ResultShape.MANY_ONE,
+            ),
+        )
+    )
+
+    def _get_bbox(value: str, ctype: str) -> Optional[BBox]:
+        bbox = bboxes[value]
+        if bbox is None or bbox[0] is None:
+            return None
+        result = (float(bbox[0]), float(bbox[1]), float(bbox[2]), float(bbox[3]))
+        return _widen_geography(result) if ctype == "geography" else result
+
+    return [
+        [
+            (c, o, _get_bbox(str(v), column_types[c]))
+            if o == "&&" and column_types.get(c) in BBOX_TYPES and v is not None
+            else (c, o, v)
+            for c, o, v in clause
+        ]
+        for clause in quals
+    ]
+
+
+def _prepare_bbox_quals(quals: Any) -> List[List[Tuple[str, Optional[BBox]]]]:
+    """
+    Convert list of qualifiers in CNF (with bounding boxes from `get_query_bboxes`) to prepare
+    it for querying the bounding box index. Same as
+    `splitgraph.core.indexing.bloom._prepare_bloom_quals`, but only `&&` clauses
+    are kept and converted to (column, bounding box).
+
+    :param quals: Quals in CNF.
+    :return: Transformed list of quals
+    """
+    result = []
+    for or_quals in quals:
+        processed = []
+        for column, operator, value in or_quals:
+            if operator != "&&" or not (value is None or isinstance(value, tuple)):
+                # We can't make a judgement on anything but bounding box overlaps, so the
+                # whole OR-clause might be true.
+                break
+            processed.append((column, value))
+        else:
+            result.append(processed)
+    return result
+
+
+def _match(qual: Tuple[str, Optional[BBox]], bbox_index: Dict[str, Optional[List[float]]]) -> bool:
+    column, bbox = qual
+    if column not in bbox_index:
+        # No index info for this column -- might match
+        return True
+    fragment_bbox = bbox_index[column]
+    if bbox is None or fragment_bbox is None:
+        # Empty shapes don't overlap anything.
+        return False
+    return (
+        fragment_bbox[0] <= bbox[2]
+        and fragment_bbox[2] >= bbox[0]
+        and fragment_bbox[1] <= bbox[3]
+        and fragment_bbox[3] >= bbox[1]
+    )
+
+
+def filter_bbox_index(engine: "PsycopgEngine", object_ids: List[str], quals: Any) -> List[str]:
+    """
+    Discards objects that definitely don't match the `&&` qualifiers using their
+    bounding box indexes.
+
+    :param engine: Metadata engine
+    :param object_ids: Object IDs
+    :param quals: List of qualifiers (with bounding boxes from `get_query_bboxes`)
+    :return: List of object IDs that might match the qualifiers in `quals` (including
+        IDs that don't have a bounding box index).
+    """
+    if not object_ids:
+        return object_ids
+
+    quals = _prepare_bbox_quals(quals)
+    if not quals:
+        return object_ids
+
+    bbox_index = engine.run_sql(
+        SQL(
+            "SELECT object_id, index -> 'bbox' FROM {}.{} WHERE object_id IN ("
+            + ",".join(itertools.repeat("%s", len(object_ids)))
+            + ")"
+        ).format(Identifier(SPLITGRAPH_META_SCHEMA), Identifier("objects")),
+        object_ids,
+    )
+    bbox_index = {o: index for o, index in bbox_index if index}
+
+    dropped = {
+        object_id
+        for object_id, index in bbox_index.items()
+        if not all(any(_match(q, index) for q in or_quals) for or_quals in quals)
+    }
+    return [o for o in object_ids if o not in dropped]
@@ -10,13 +10,24 @@ from typing import Any, Dict, List, Optional, Tuple, Union, cast, TYPE_CHECKING
 from psycopg2.sql import SQL, Identifier
 
 from splitgraph.config import SPLITGRAPH_META_SCHEMA
+from splitgraph.core.indexing.xor import decode_xor_index, hash_to_key, _match as _match_xor
 from splitgraph.core.output import pretty_size
 from splitgraph.core.types import Changeset
 from splitgraph.engine.postgres.engine import SG_UD_FLAG
 
+try:
+    import numpy as np
+
+    _NUMPY_SUPPORTED = True
+except ImportError:
+    _NUMPY_SUPPORTED = False
+
 if TYPE_CHECKING:
     from splitgraph.engine.postgres.engine import PsycopgEngine
 
+# Largest filter (in bits) that the NumPy builder can handle without overflowing uint64s
+_MAX_NUMPY_FILTER_BITS = 1 << 55
+
 
 def _hash_value(value: Union[datetime, int, str, None]) -> Tuple[bytes, bytes]:
     if value is None:
@@ -36,6 +47,7 @@ def generate_bloom_index(
     column: str,
     probability: Optional[float] = None,
     size: Optional[int] = None,
+    values: Optional[List[str]] = None,
 ) -> Tuple[int, str]:
     """
     Generates a bloom filter signature for a given column and a given fragment. Bloom filters
@@ -55,6 +67,9 @@ def generate_bloom_index(
     :param probability: Probability of a false positive. Either this or the size of the filter must
         be specified, but not both.
     :param size: Size of the filter, in bytes.
+    :param values: Optional, distinct text values of the column (with NULLs replaced by the
+        string 'NULL') if they have already been fetched (e.g. while hashing the object's source).
+        If specified, the object isn't scanned.
     :return: Dictionary to be inserted into the index.
     """
 
@@ -72,18 +87,23 @@ def generate_bloom_index(
     # it will only mean chunks with NULLs will be fetched for a query with "NULL"
     # and vice versa, which doesn't break anything (this is just a preflight optimisation).
 
-    digest_query = SQL(
-        "SELECT digest(coalesce({0}::text, 'NULL'), 'sha256'), "
-        "digest(coalesce({0}::text, 'NULL') || 'salt', 'sha256') "
-        "FROM {1}.{2} o WHERE o.{3} = true"
-    ).format(
-        Identifier(column),
-        Identifier(SPLITGRAPH_META_SCHEMA),
-        Identifier(object_id),
-        Identifier(SG_UD_FLAG),
-    )
-
-    digests = engine.run_sql(digest_query)
+    digests: List[Tuple[bytes, bytes]]
+    if values is not None:
+        # Postgres hashes the UTF-8 representation of the text value, so this
+        # gives the same digests as the query below.
+        digests = [_hash_value(v) for v in values]
+    else:
+        digest_query = SQL(
+            "SELECT digest(coalesce({0}::text, 'NULL'), 'sha256'), "
+            "digest(coalesce({0}::text, 'NULL') || 'salt', 'sha256') "
+            "FROM {1}.{2} o WHERE o.{3} = true"
+        ).format(
+            Identifier(column),
+            Identifier(SPLITGRAPH_META_SCHEMA),
+            Identifier(object_id),
+            Identifier(SG_UD_FLAG),
+        )
+        digests = [(bytes(d1), bytes(d2)) for d1, d2 in engine.run_sql(digest_query)]
 
     # Add digests of the old values in the changeset for this column.
     if changeset:
@@ -117,15 +137,64 @@ def generate_bloom_index(
     no_funcs = int(ceil(log(2) * size_bits / len(distinct_items)))
 
     # Generate the filter
+    if _NUMPY_SUPPORTED and size_bits < _MAX_NUMPY_FILTER_BITS:
+        result = _build_filter_numpy(distinct_items, size, no_funcs)
+    else:
+        result = _build_filter(distinct_items, size, no_funcs)
+
+    return no_funcs, base64.b64encode(result).decode("ascii")
+
+
+def _build_filter(digests: List[Tuple[bytes, bytes]], size: int, no_funcs: int) -> bytes:
+    """Set the bits for every item in a bloom filter of a given size, in bytes."""
+    size_bits = size * 8
     result = bytearray(size)
-    for hash_1, hash_2 in distinct_items:
+    for hash_1, hash_2 in digests:
         hash_1 = int.from_bytes(hash_1, byteorder="big")
         hash_2 = int.from_bytes(hash_2, byteorder="big")
         for i in range(no_funcs):
             hash_i = (hash_1 + i * hash_2) % size_bits
             result[hash_i // 8] |= 1 << hash_i % 8
+    return bytes(result)
 
-    return no_funcs, base64.b64encode(result).decode("ascii")
+
+def _digests_mod(digests: "np.ndarray", modulus: int) -> "np.ndarray":
+    # Reduce 256-bit big-endian digests (rows of bytes) modulo the filter size a few bytes
+    # at a time (Horner's method) so that we never have to deal with the whole number. Use
+    # the widest words that don't overflow: (modulus - 1) * 2 ** (8 * width) + word < 2 ** 64.
+    width = 4
+    while width > 1 and modulus.bit_length() + 8 * width > 64:
+        width //= 2
+    words = np.ascontiguousarray(digests).view(">u%d" % width)
+
+    shift = np.uint64(1 << (8 * width))
+    modulus_u64 = np.uint64(modulus)
+    result = np.zeros(len(digests), dtype=np.uint64)
+    for column in words.T:
+        result = (result * shift + column.astype(np.uint64)) % modulus_u64
+    return result.astype(np.int64)
+
+
+def _build_filter_numpy(digests: List[Tuple[bytes, bytes]], size: int, no_funcs: int) -> bytes:
+    """Same as `_build_filter`, but hashes all items at once with NumPy."""
+    size_bits = size * 8
+    digest_bytes = np.frombuffer(
+        b"".join(itertools.chain.from_iterable(digests)), dtype=np.uint8
+    ).reshape(len(digests), 2, -1)
+
+    # (hash_1 + i * hash_2) % size_bits == (hash_1 % size_bits + i * (hash_2 % size_bits)) % size_bits
+    hash_i = _digests_mod(digest_bytes[:, 0], size_bits)
+    hash_2 = _digests_mod(digest_bytes[:, 1], size_bits)
+
+    bits = np.zeros(size_bits, dtype=bool)
+    for i in range(no_funcs):
+        if i:
+            hash_i += hash_2
+            hash_i[hash_i >= size_bits] -= size_bits
+        bits[hash_i] = True
+
+    # Bit n of the filter is the (n % 8)th least significant bit of byte n // 8.
+    return np.packbits(bits, bitorder="little").tobytes()
 
 
 def describe(index_tuple: Tuple[int, str]) -> str:
@@ -182,7 +251,10 @@ def _prepare_bloom_quals(quals: Any) -> List[List[Tuple[str, int, int]]]:
 
     def _process_qual(qual):
         column, operator, value = qual
-        if operator != "=":
+        if operator == "IS NULL":
+            # NULLs are hashed as the string 'NULL' (see generate_bloom_index)
+            value = None
+        elif operator != "=":
             return True
 
         hash_1, hash_2 = _hash_value(value)
@@ -210,16 +282,26 @@ def _prepare_bloom_quals(quals: Any) -> List[List[Tuple[str, int, int]]]:
     return result
 
 
-def _match(qual: Tuple[str, int, int], bloom_index: Dict[str, Tuple[int, bytes]]) -> bool:
+def _match(
+    qual: Tuple[str, int, int],
+    bloom_index: Dict[str, Tuple[int, bytes]],
+    xor_index: Optional[Dict[str, Tuple[int, int, bytes]]] = None,
+) -> bool:
     """
     Checks whether a processed qual (column, hash_1, hash_2) can match a fragment with
     a given index.
 
     :param qual:
     :param bloom_index:
+    :param xor_index: Optional, xor filters of the fragment (see `generate_xor_index`).
     """
 
     column, hash_1, hash_2 = qual
+    if xor_index and column in xor_index:
+        # Xor filters only need 3 lookups, so check them first.
+        if not _match_xor(hash_to_key(hash_1), xor_index[column]):
+            return False
+
     if column not in bloom_index:
         # No index info for this column -- might match
         return True
@@ -239,13 +321,14 @@ def _match(qual: Tuple[str, int, int], bloom_index: Dict[str, Tuple[int, bytes]]
 def filter_bloom_index(engine: "PsycopgEngine", object_ids: List[str], quals: Any) -> List[str]:
     """
     Runs a bloom filter on given qualifiers using the given objects' previously-generated
-    fingerprints.
+    fingerprints. Columns that have an xor filter (see `generate_xor_index`) instead
+    of or as well as a bloom filter are checked against it too.
 
     :param engine: Object engine
     :param object_ids: Object IDs
     :param quals: List of qualifiers
     :return: List of object IDs that might match the qualifiers in `quals` (including
-        IDs that don't have a bloom index).
+        IDs that don't have a bloom or an xor index).
     """
     if not object_ids:
         return object_ids
@@ -260,17 +343,18 @@ def filter_bloom_index(engine: "PsycopgEngine", object_ids: List[str], quals: An
     # care of varying values of K and varying signature sizes.
     bloom_index = engine.run_sql(
         SQL(
-            "SELECT object_id, index -> 'bloom' FROM {}.{} WHERE object_id IN ("
+            "SELECT object_id, index -> 'bloom', index -> 'xor' FROM {}.{} WHERE object_id IN ("
             + ",".join(itertools.repeat("%s", len(object_ids)))
             + ")"
         ).format(Identifier(SPLITGRAPH_META_SCHEMA), Identifier("objects")),
         object_ids,
     )
 
+    xor_index = {o: decode_xor_index(index) for o, _, index in bloom_index if index}
     bloom_index = {
-        o: {col: (i[0], base64.b64decode(i[1])) for col, i in index.items()}
-        for o, index in bloom_index
-        if index
+        o: {col: (i[0], base64.b64decode(i[1])) for col, i in (index or {}).items()}
+        for o, index, xor in bloom_index
+        if index or xor
     }
 
     dropped = []
@@ -283,7 +367,7 @@ def filter_bloom_index(engine: "PsycopgEngine", object_ids: List[str], quals: An
         for or_quals in quals:
             or_result = False
             for or_qual in or_quals:
-                if _match(or_qual, bloom_index[object_id]):
+                if _match(or_qual, bloom_index[object_id], xor_index.get(object_id)):
                     or_result = True
                     break
             if not or_result:
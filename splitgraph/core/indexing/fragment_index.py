@@ -0,0 +1,516 @@
+"""
+In-memory copy of the range, bloom, xor, value set, n-gram and bounding box indexes of a set of
+fragments, loaded into NumPy arrays so that CNF quals can be evaluated against all fragments at once
+instead of querying the metadata engine (and decoding bloom filters) for every query.
+"""
+import base64
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from splitgraph.core.indexing.bbox import _prepare_bbox_quals, BBox
+from splitgraph.core.indexing.bloom import _prepare_bloom_quals
+from splitgraph.core.indexing.ngram import _prepare_ngram_quals, get_pattern_ngram_hashes
+from splitgraph.core.indexing.range import _strip_type_mod, get_like_prefix
+from splitgraph.core.indexing.valueset import _prepare_valueset_quals
+from splitgraph.core.indexing.xor import decode_xor_index, hash_to_key
+from splitgraph.core.metadata_manager import Object
+from splitgraph.core.types import TableSchema
+
+
+def _to_int(value: Any) -> Any:
+    if isinstance(value, str):
+        return int(value)
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return value
+    raise ValueError
+
+
+def _to_float(value: Any) -> float:
+    if isinstance(value, (str, int, float, Decimal)) and not isinstance(value, bool):
+        return float(value)
+    raise ValueError
+
+
+def _to_real(value: Any) -> Any:
+    # Postgres compares reals with numeric values as reals.
+    return np.float32(_to_float(value))
+
+
+def _to_decimal(value: Any) -> Decimal:
+    if isinstance(value, (str, int, float, Decimal)) and not isinstance(value, bool):
+        try:
+            return Decimal(str(value))
+        except InvalidOperation:
+            pass
+    raise ValueError
+
+
+def _to_text(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    raise ValueError
+
+
+def _to_timestamp(value: Any) -> np.datetime64:
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        raise ValueError
+    if isinstance(value, (str, date)):
+        return np.datetime64(value, "us")
+    raise ValueError
+
+
+def _to_date(value: Any) -> np.datetime64:
+    # Dates are compared with timestamps as timestamps, but text values are cast into dates
+    # (dropping the time part).
+    result = _to_timestamp(value)
+    if isinstance(value, str):
+        result = result.astype("datetime64[D]").astype("datetime64[us]")
+    return result
+
+
+# Types that we can evaluate range quals on in memory, mapped to functions that convert
+# a value to something that compares the same way Postgres compares the column
+# with that value, and the dtype of the array with the bounds.
+_RANGE_CONVERTERS: Dict[str, Tuple[Callable[[Any], Any], Any]] = {
+    **{
+        t: (_to_int, np.int64)
+        for t in ["bigint", "bigserial", "integer", "smallint", "smallserial", "serial"]
+    },
+    "real": (_to_real, np.float32),
+    "double precision": (_to_float, np.float64),
+    "numeric": (_to_decimal, object),
+    "text": (_to_text, object),
+    "character varying": (_to_text, object),
+    "varchar": (_to_text, object),
+    "timestamp": (_to_timestamp, "datetime64[us]"),
+    "timestamp without time zone": (_to_timestamp, "datetime64[us]"),
+    "date": (_to_date, "datetime64[us]"),
+}
+
+# Operators that we can evaluate against the range index
+_RANGE_OPERATORS = (">", ">=", "<", "<=", "=", "~~")
+
+
+class _RangeColumn:
+    """Minimum and maximum values of a column in every fragment."""
+
+    def __init__(self, bounds: List[Optional[Tuple[Any, Any]]], pg_type: str) -> None:
+        convert, dtype = _RANGE_CONVERTERS[pg_type]
+        self.convert = convert
+
+        # Fragments that have this column in their index
+        self.known = np.array([b is not None for b in bounds], dtype=bool)
+        # Fragments that only have NULLs in this column: they can't match any qual.
+        self.nulls = np.array([b is not None and None in b for b in bounds], dtype=bool)
+        valid = [b for b in bounds if b is not None and None not in b]
+        self.min = np.array([convert(b[0]) for b in valid], dtype=dtype)
+        self.max = np.array([convert(b[1]) for b in valid], dtype=dtype)
+
+    def match(self, operator: str, value: Any) -> np.ndarray:
+        if operator == "~~":
+            # Values that start with the prefix are at least as large as it.
+            prefix = self.convert(value)
+            matched = (self.max >= prefix) & (
+                np.array([m[: len(prefix)] for m in self.min], dtype=object) <= prefix
+            )
+            return self._apply(matched)
+
+        value = self.convert(value)
+        if operator == ">":
+            matched = self.max > value
+        elif operator == ">=":
+            matched = self.max >= value
+        elif operator == "<":
+            matched = self.min < value
+        elif operator == "<=":
+            matched = self.min <= value
+        else:
+            matched = (self.min <= value) & (self.max >= value)
+        return self._apply(matched)
+
+    def _apply(self, matched: np.ndarray) -> np.ndarray:
+        # Fragments without index information for this column might match.
+        result = ~self.known
+        result[self.known & ~self.nulls] = matched
+        return result
+
+
+class _BloomColumn:
+    """Bloom filters on a column of every fragment, grouped by their size and number of hash
+    functions so that every group can be checked at once."""
+
+    def __init__(self, filters: List[Optional[Tuple[int, bytes]]]) -> None:
+        self.size = len(filters)
+        groups: Dict[Tuple[int, int], List[int]] = {}
+        for i, bloom_filter in enumerate(filters):
+            if bloom_filter is not None:
+                groups.setdefault((bloom_filter[0], len(bloom_filter[1])), []).append(i)
+
+        self.groups = [
+            (
+                no_funcs,
+                size * 8,
+                np.array(positions, dtype=np.int64),
+                np.frombuffer(
+                    b"".join(filters[p][1] for p in positions),  # type: ignore
+                    dtype=np.uint8,
+                ).reshape(len(positions), size),
+            )
+            for (no_funcs, size), positions in groups.items()
+        ]
+
+    def match(self, hash_1: int, hash_2: int) -> np.ndarray:
+        # Fragments without a bloom filter on this column might match.
+        result = np.ones(self.size, dtype=bool)
+        for no_funcs, size_bits, positions, filters in self.groups:
+            hashes = np.array(
+                [(hash_1 + i * hash_2) % size_bits for i in range(no_funcs)], dtype=np.int64
+            )
+            bits = filters[:, hashes // 8] & (np.uint8(1) << (hashes % 8).astype(np.uint8))
+            result[positions] = (bits != 0).all(axis=1)
+        return result
+
+
+def _rotl(h: np.ndarray, bits: int) -> np.ndarray:
+    result: np.ndarray = (h << np.uint64(bits)) | (h >> np.uint64(64 - bits))
+    return result
+
+
+class _XorColumn:
+    """Xor filters on a column of every fragment, grouped by their fingerprint size and
+    concatenated so that every group can be checked at once. Has to give the same results
+    as `splitgraph.core.indexing.xor._match`."""
+
+    def __init__(self, filters: List[Optional[Tuple[int, int, bytes]]]) -> None:
+        self.size = len(filters)
+        groups: Dict[int, List[int]] = {}
+        for i, xor_filter in enumerate(filters):
+            if xor_filter is not None:
+                groups.setdefault(xor_filter[1], []).append(i)
+
+        self.groups = []
+        for bits, positions in groups.items():
+            group = [filters[p] for p in positions]
+            dtype = np.uint8 if bits == 8 else np.dtype("<u2")
+            capacities = [len(f[2]) // (bits // 8) for f in group]  # type: ignore
+            self.groups.append(
+                (
+                    bits,
+                    np.array(positions, dtype=np.int64),
+                    np.array([f[0] for f in group], dtype=np.uint64),  # type: ignore
+                    np.array([c // 3 for c in capacities], dtype=np.uint64),
+                    np.cumsum([0] + capacities[:-1]).astype(np.uint64),
+                    np.frombuffer(b"".join(f[2] for f in group), dtype=dtype),  # type: ignore
+                )
+            )
+
+    def match(self, key: int) -> np.ndarray:
+        # Fragments without an xor filter on this column might match.
+        result = np.ones(self.size, dtype=bool)
+        mask_32 = np.uint64((1 << 32) - 1)
+        shift_32 = np.uint64(32)
+        shift_33 = np.uint64(33)
+        for bits, positions, seeds, block_lengths, offsets, fingerprints in self.groups:
+            h = seeds + np.uint64(key)
+            h = (h ^ (h >> shift_33)) * np.uint64(0xFF51AFD7ED558CCD)
+            h = (h ^ (h >> shift_33)) * np.uint64(0xC4CEB9FE1A85EC53)
+            h ^= h >> shift_33
+
+            fingerprint = (h ^ (h >> shift_32)) & np.uint64((1 << bits) - 1)
+            for block, rotated in enumerate([h, _rotl(h, 21), _rotl(h, 42)]):
+                slots = offsets + np.uint64(block) * block_lengths
+                slots += ((rotated & mask_32) * block_lengths) >> shift_32
+                fingerprint ^= fingerprints[slots.astype(np.int64)]
+            result[positions] = fingerprint == 0
+        return result
+
+
+class _NgramColumn:
+    """N-gram bloom filters on a column of every fragment, grouped by the n-gram length."""
+
+    def __init__(self, filters: List[Optional[Tuple[int, int, bytes]]]) -> None:
+        self.size = len(filters)
+        self.bloom_columns = {
+            n: _BloomColumn(
+                [(f[1], f[2]) if f is not None and f[0] == n else None for f in filters]
+            )
+            for n in {f[0] for f in filters if f is not None}
+        }
+
+    def match(self, literals: Tuple[str, ...]) -> np.ndarray:
+        # Each bloom column says that fragments without a filter (or with a filter
+        # with a different n) might match.
+        result = np.ones(self.size, dtype=bool)
+        for n, bloom_column in self.bloom_columns.items():
+            for hash_1, hash_2 in get_pattern_ngram_hashes(literals, n):
+                result &= bloom_column.match(hash_1, hash_2)
+        return result
+
+
+class _ValuesetColumn:
+    """Distinct values of a column in every fragment, stored as an inverted index
+    of value -> fragments that have it."""
+
+    def __init__(self, valuesets: List[Optional[List[str]]]) -> None:
+        self.size = len(valuesets)
+        self.known = np.array([v is not None for v in valuesets], dtype=bool)
+        positions: Dict[str, List[int]] = {}
+        for i, values in enumerate(valuesets):
+            for value in values or []:
+                positions.setdefault(value, []).append(i)
+        self.positions = {v: np.array(p, dtype=np.int64) for v, p in positions.items()}
+
+    def match(self, value: str) -> np.ndarray:
+        # Fragments without a value set on this column might match.
+        result = ~self.known
+        if value in self.positions:
+            result[self.positions[value]] = True
+        return result
+
+
+class _BboxColumn:
+    """Bounding boxes of a column in every fragment."""
+
+    def __init__(self, bboxes: List[Any]) -> None:
+        # Each element is either False (no index information for this column), None (no
+        # non-empty shapes in the fragment) or the [xmin, ymin, xmax, ymax] bounding box.
+        self.known = np.array([b is not False for b in bboxes], dtype=bool)
+        self.empty = np.array([b is None for b in bboxes], dtype=bool)
+        self.bounds = np.array(
+            [b if b is not None and b is not False else [0.0] * 4 for b in bboxes],
+            dtype=np.float64,
+        ).reshape(len(bboxes), 4)
+
+    def match(self, bbox: Optional[BBox]) -> np.ndarray:
+        # Fragments without a bounding box on this column might match.
+        result = ~self.known
+        if bbox is None:
+            # Empty shapes don't overlap anything.
+            return result
+        overlaps = (
+            (self.bounds[:, 0] <= bbox[2])
+            & (self.bounds[:, 2] >= bbox[0])
+            & (self.bounds[:, 1] <= bbox[3])
+            & (self.bounds[:, 3] >= bbox[1])
+        )
+        result |= self.known & ~self.empty & overlaps
+        return result
+
+
+class FragmentIndex:
+    """
+    Range, bloom, xor, value set, n-gram and bounding box indexes of multiple fragments
+    loaded into memory.
+
+    Filtering with this gives the same results as
+    `splitgraph.core.fragment_manager.FragmentManager.filter_fragments` does when it runs
+    the quals against the index on the metadata engine.
+    """
+
+    def __init__(
+        self, object_ids: Sequence[str], object_meta: Dict[str, Object], table_schema: TableSchema
+    ) -> None:
+        """
+        :param object_ids: IDs of fragments. Fragments without metadata never match any quals.
+        :param object_meta: Metadata of the fragments (see `MetadataManager.get_object_meta`).
+        :param table_schema: Schema of the table the fragments belong to.
+        """
+        self.object_ids = list(object_ids)
+        self.positions = {o: i for i, o in enumerate(self.object_ids)}
+        self.registered = np.array([o in object_meta for o in self.object_ids], dtype=bool)
+        self.column_types = {c.name: _strip_type_mod(c.pg_type) for c in table_schema}
+
+        indexes = [object_meta[o].object_index if o in object_meta else {} for o in self.object_ids]
+        range_columns = {c for index in indexes for c in index.get("range", {}) if c != "$pk"}
+        bloom_columns = {c for index in indexes for c in index.get("bloom", {})}
+        xor_columns = {c for index in indexes for c in index.get("xor", {})}
+        null_count_columns = {c for index in indexes for c in index.get("null_count", {})}
+        valueset_columns = {c for index in indexes for c in index.get("valueset", {})}
+        ngram_columns = {c for index in indexes for c in index.get("ngram", {})}
+        bbox_columns = {c for index in indexes for c in index.get("bbox", {})}
+
+        # Fragments that might have NULLs in a column (no null count means they might)
+        self.has_nulls = {
+            column: np.array(
+                [index.get("null_count", {}).get(column, 1) > 0 for index in indexes], dtype=bool
+            )
+            for column in null_count_columns
+        }
+        # Fragments that might have non-NULL values in a column (both range bounds are NULL
+        # if the fragment only has NULLs in it).
+        self.has_values = {
+            column: np.array(
+                [
+                    column not in index.get("range", {}) or None not in index["range"][column]
+                    for index in indexes
+                ],
+                dtype=bool,
+            )
+            for column in range_columns
+        }
+
+        self.range_columns: Dict[str, Optional[_RangeColumn]] = {}
+        for column in range_columns:
+            pg_type = self.column_types.get(column)
+            try:
+                if pg_type not in _RANGE_CONVERTERS:
+                    raise ValueError
+                self.range_columns[column] = _RangeColumn(
+                    [index.get("range", {}).get(column) for index in indexes], pg_type
+                )
+            except ValueError:
+                # We can't evaluate quals on this column in memory.
+                self.range_columns[column] = None
+
+        self.bloom_columns = {
+            column: _BloomColumn(
+                [
+                    (index["bloom"][column][0], base64.b64decode(index["bloom"][column][1]))
+                    if column in index.get("bloom", {})
+                    else None
+                    for index in indexes
+                ]
+            )
+            for column in bloom_columns
+        }
+
+        xor_indexes = [decode_xor_index(index.get("xor", {})) for index in indexes]
+        self.xor_columns = {
+            column: _XorColumn([xor_index.get(column) for xor_index in xor_indexes])
+            for column in xor_columns
+        }
+
+        self.valueset_columns = {
+            column: _ValuesetColumn([index.get("valueset", {}).get(column) for index in indexes])
+            for column in valueset_columns
+        }
+
+        self.ngram_columns = {
+            column: _NgramColumn(
+                [
+                    (
+                        index["ngram"][column][0],
+                        index["ngram"][column][1],
+                        base64.b64decode(index["ngram"][column][2]),
+                    )
+                    if column in index.get("ngram", {})
+                    else None
+                    for index in indexes
+                ]
+            )
+            for column in ngram_columns
+        }
+
+        self.bbox_columns = {
+            column: _BboxColumn([index.get("bbox", {}).get(column, False) for index in indexes])
+            for column in bbox_columns
+        }
+
+    def _match_range(self, quals: Any) -> np.ndarray:
+        result: np.ndarray = self.registered.copy()
+        for or_quals in quals:
+            or_result = np.zeros(len(self.object_ids), dtype=bool)
+            for column, operator, value in or_quals:
+                if operator == "IS NULL" and column in self.has_nulls:
+                    or_result |= self.has_nulls[column]
+                    continue
+                if operator == "IS NOT NULL" and column in self.has_values:
+                    or_result |= self.has_values[column]
+                    continue
+                if operator == "~~":
+                    # LIKE patterns with a literal prefix are matched as a range.
+                    value = get_like_prefix(value, self.column_types.get(column, ""))
+                    if value is None:
+                        or_result[:] = True
+                        break
+                if column not in self.range_columns or operator not in _RANGE_OPERATORS:
+                    # Either no fragment has index information for this column or
+                    # we can't make a judgement about this operator.
+                    or_result[:] = True
+                    break
+                range_column = self.range_columns[column]
+                if range_column is None:
+                    raise ValueError
+                or_result |= range_column.match(operator, value)
+            result &= or_result
+        return result
+
+    def _match_bloom(self, quals: Any) -> np.ndarray:
+        result = np.ones(len(self.object_ids), dtype=bool)
+        for or_quals in _prepare_bloom_quals(quals):
+            or_result = np.zeros(len(self.object_ids), dtype=bool)
+            for column, hash_1, hash_2 in or_quals:
+                if column not in self.bloom_columns and column not in self.xor_columns:
+                    or_result[:] = True
+                    break
+                # Columns can have both kinds of filters, in which case both have to match.
+                matched = np.ones(len(self.object_ids), dtype=bool)
+                if column in self.bloom_columns:
+                    matched &= self.bloom_columns[column].match(hash_1, hash_2)
+                if column in self.xor_columns:
+                    matched &= self.xor_columns[column].match(hash_to_key(hash_1))
+                or_result |= matched
+            result &= or_result
+        return result
+
+    def _match_valueset(self, quals: Any) -> np.ndarray:
+        result = np.ones(len(self.object_ids), dtype=bool)
+        for or_quals in _prepare_valueset_quals(quals):
+            or_result = np.zeros(len(self.object_ids), dtype=bool)
+            for column, value in or_quals:
+                if column not in self.valueset_columns:
+                    or_result[:] = True
+                    break
+                or_result |= self.valueset_columns[column].match(value)
+            result &= or_result
+        return result
+
+    def _match_ngram(self, quals: Any) -> np.ndarray:
+        result = np.ones(len(self.object_ids), dtype=bool)
+        for or_quals in _prepare_ngram_quals(quals):
+            or_result = np.zeros(len(self.object_ids), dtype=bool)
+            for column, literals in or_quals:
+                if column not in self.ngram_columns:
+                    or_result[:] = True
+                    break
+                or_result |= self.ngram_columns[column].match(literals)
+            result &= or_result
+        return result
+
+    def _match_bbox(self, quals: Any) -> np.ndarray:
+        result = np.ones(len(self.object_ids), dtype=bool)
+        for or_quals in _prepare_bbox_quals(quals):
+            or_result = np.zeros(len(self.object_ids), dtype=bool)
+            for column, bbox in or_quals:
+                if column not in self.bbox_columns:
+                    or_result[:] = True
+                    break
+                or_result |= self.bbox_columns[column].match(bbox)
+            result &= or_result
+        return result
+
+    def filter(self, object_ids: List[str], quals: Any) -> Optional[List[str]]:
+        """
+        Discard fragments that definitely don't match the quals.
+
+        :param object_ids: Fragments to filter (must be in this index).
+        :param quals: Quals in CNF (see `FragmentManager.filter_fragments`)
+        :return: List of fragments that might match the quals (in the original order) or
+            None if the quals can't be evaluated in memory (e.g. the index has a column
+            of a type that we can't compare in Python or the qual values can't be
+            cast to the column type).
+        """
+        try:
+            matched = (
+                self._match_range(quals)
+                & self._match_bloom(quals)
+                & self._match_valueset(quals)
+                & self._match_ngram(quals)
+                & self._match_bbox(quals)
+            )
+        except (ValueError, TypeError):
+            return None
+        return [o for o in object_ids if matched[self.positions[o]]]
@@ -0,0 +1,182 @@
+"""N-gram bloom filtering on fragments for LIKE queries with infix patterns (e.g. `%abc%`)."""
+import base64
+import itertools
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+
+from psycopg2.sql import SQL, Identifier
+
+from splitgraph.config import SPLITGRAPH_META_SCHEMA
+from splitgraph.core.indexing.bloom import _hash_value, _match, generate_bloom_index
+from splitgraph.core.indexing.range import split_like_pattern
+from splitgraph.core.types import Changeset
+from splitgraph.engine import ResultShape
+from splitgraph.engine.postgres.engine import SG_UD_FLAG
+
+if TYPE_CHECKING:
+    from splitgraph.engine.postgres.engine import PsycopgEngine
+
+DEFAULT_NGRAM_SIZE = 3
+
+
+def _get_ngrams(value: str, n: int) -> Set[str]:
+    return {value[i : i + n] for i in range(len(value) - n + 1)}
+
+
+def generate_ngram_index(
+    engine: "PsycopgEngine",
+    object_id: str,
+    changeset: Optional[Changeset],
+    column: str,
+    n: int = DEFAULT_NGRAM_SIZE,
+    probability: Optional[float] = None,
+    size: Optional[int] = None,
+    values: Optional[List[str]] = None,
+) -> Optional[Tuple[int, int, str]]:
+    """
+    Generates a bloom filter of all substrings of length n (n-grams) of the values
+    of a given column in a given fragment. A value can only match a LIKE pattern if it
+    contains all n-grams of the literal parts of the pattern, so if some of them aren't in
+    the filter, the fragment can't have any matching rows.
+
+    :param engine: Object engine the fragment is cached in.
+    :param object_id: Fragment ID
+    :param changeset: Optional, if specified, the old column values are included in the index.
+    :param column: Column name to generate the index on.
+    :param n: Length of the n-grams.
+    :param probability: Probability of a false positive. Either this or the size of the filter must
+        be specified, but not both (see `generate_bloom_index`).
+    :param size: Size of the filter, in bytes.
+    :param values: Optional, distinct text values of the column (with NULLs replaced by the
+        string 'NULL', like in `generate_bloom_index`) if they have already been fetched.
+        If specified, the object isn't scanned.
+    :return: Tuple of (n, k, base64-encoded filter) or None if the column has no values
+        at least n characters long.
+    """
+    if n < 1:
+        raise ValueError("n must be positive!")
+
+    if values is None:
+        values = engine.run_sql(
+            SQL(
+                "SELECT DISTINCT coalesce({0}::text, 'NULL') FROM {1}.{2} o WHERE o.{3} = true"
+            ).format(
+                Identifier(column),
+                Identifier(SPLITGRAPH_META_SCHEMA),
+                Identifier(object_id),
+                Identifier(SG_UD_FLAG),
+            ),
+            return_shape=ResultShape.MANY_ONE,
+        )
+    values = list(values)
+
+    # Add the old values in the changeset for this column (see generate_bloom_index).
+    if changeset:
+        for _, old_row, _ in changeset.values():
+            if old_row.get(column) is not None:
+                values.append(str(old_row[column]))
+
+    ngrams = set().union(*(_get_ngrams(v, n) for v in values))
+    if not ngrams:
+        return None
+
+    no_funcs, bloom_filter = generate_bloom_index(
+        engine, object_id, None, column, probability=probability, size=size, values=sorted(ngrams)
+    )
+    return n, no_funcs, bloom_filter
+
+
+@lru_cache(maxsize=1024)
+def get_pattern_ngram_hashes(literals: Tuple[str, ...], n: int) -> Tuple[Tuple[int, int], ...]:
+    """
+    Get the hashes of all n-grams in the literal parts of a LIKE pattern
+
+    :param literals: Literal parts of the pattern (see `_prepare_ngram_quals`)
+    :param n: Length of the n-grams
+    :return: Tuple of (hash_1, hash_2) to be checked against the bloom filter
+    """
+    result = []
+    for ngram in sorted(set().union(*(_get_ngrams(literal, n) for literal in literals))):
+        hash_1, hash_2 = _hash_value(ngram)
+        result.append(
+            (int.from_bytes(hash_1, byteorder="big"), int.from_bytes(hash_2, byteorder="big"))
+        )
+    return tuple(result)
+
+
+def _prepare_ngram_quals(quals: Any) -> List[List[Tuple[str, Tuple[str, ...]]]]:
+    """
+    Convert list of qualifiers in CNF to prepare it for querying the n-gram index. Same as
+    `splitgraph.core.indexing.bloom._prepare_bloom_quals`, but only LIKE (~~) clauses
+    are kept and converted to (column, literal parts of the pattern).
+
+    :param quals: Quals in CNF.
+    :return: Transformed list of quals
+    """
+    result = []
+    for or_quals in quals:
+        processed = []
+        for column, operator, value in or_quals:
+            if operator != "~~" or not isinstance(value, str):
+                # We can't make a judgement on anything but LIKE, so the
+                # whole OR-clause might be true.
+                break
+            processed.append((column, tuple(l for l in split_like_pattern(value) if l)))
+        else:
+            result.append(processed)
+    return result
+
+
+def _match_ngrams(
+    qual: Tuple[str, Tuple[str, ...]], ngram_index: Dict[str, Tuple[int, int, bytes]]
+) -> bool:
+    column, literals = qual
+    if column not in ngram_index:
+        # No index info for this column -- might match
+        return True
+    n, no_funcs, bloom_filter = ngram_index[column]
+    bloom_index = {column: (no_funcs, bloom_filter)}
+    return all(
+        _match((column, hash_1, hash_2), bloom_index)
+        for hash_1, hash_2 in get_pattern_ngram_hashes(literals, n)
+    )
+
+
+def filter_ngram_index(engine: "PsycopgEngine", object_ids: List[str], quals: Any) -> List[str]:
+    """
+    Discards objects that definitely don't match the LIKE qualifiers using their
+    n-gram indexes.
+
+    :param engine: Metadata engine
+    :param object_ids: Object IDs
+    :param quals: List of qualifiers
+    :return: List of object IDs that might match the qualifiers in `quals` (including
+        IDs that don't have an n-gram index).
+    """
+    if not object_ids:
+        return object_ids
+
+    quals = _prepare_ngram_quals(quals)
+    if not quals:
+        return object_ids
+
+    ngram_index = engine.run_sql(
+        SQL(
+            "SELECT object_id, index -> 'ngram' FROM {}.{} WHERE object_id IN ("
+            + ",".join(itertools.repeat("%s", len(object_ids)))
+            + ")"
+        ).format(Identifier(SPLITGRAPH_META_SCHEMA), Identifier("objects")),
+        object_ids,
+    )
+    ngram_index = {
+        o: {col: (i[0], i[1], base64.b64decode(i[2])) for col, i in index.items()}
+        for o, index in ngram_index
+        if index
+    }
+
+    dropped = {
+        object_id
+        for object_id, index in ngram_index.items()
+        if not all(any(_match_ngrams(q, index) for q in or_quals) for or_quals in quals)
+    }
+    return [o for o in object_ids if o not in dropped]
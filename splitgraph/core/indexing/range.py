@@ -1,5 +1,16 @@
 import logging
-from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar, cast, TYPE_CHECKING
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    cast,
+    TYPE_CHECKING,
+)
 
 from psycopg2.sql import Composed, SQL, Composable
 from psycopg2.sql import Identifier
@@ -46,6 +57,49 @@ def _strip_type_mod(ctype: str) -> str:
     return ctype
 
 
+# Text types that LIKE patterns can be matched against the range index of
+_LIKE_TYPES = ("text", "varchar", "character varying")
+
+
+def split_like_pattern(pattern: str) -> List[str]:
+    """
+    Split a LIKE pattern into literal strings between its wildcards (% and _), unescaping them.
+
+    For example, `ABC%` becomes `["ABC", ""]` and `%a\\%b_c` becomes `["", "a%b", "c"]`:
+    the first element is the prefix that every matching value must start with.
+
+    :param pattern: LIKE pattern (using the default escape character)
+    :return: List of literal strings
+    """
+    result = []
+    current = ""
+    chars = iter(pattern)
+    for char in chars:
+        if char == "\\":
+            current += next(chars, "")
+        elif char in ("%", "_"):
+            result.append(current)
+            current = ""
+        else:
+            current += char
+    result.append(current)
+    return result
+
+
+def get_like_prefix(pattern: Any, ctype: str) -> Optional[str]:
+    """
+    Get the prefix that all values matching a LIKE pattern start with, if the pattern can
+    be matched against the range index of a column of a given type.
+
+    :param pattern: LIKE pattern
+    :param ctype: Column type
+    :return: Prefix or None if the pattern doesn't have one or the column isn't a text column.
+    """
+    if not isinstance(pattern, str) or ctype not in _LIKE_TYPES:
+        return None
+    return split_like_pattern(pattern)[0] or None
+
+
 def _qual_to_index_clause(qual: Tuple[str, str, Any], ctype: str) -> Tuple[SQL, Tuple]:
     """Convert our internal qual format into a WHERE clause that runs against an object's index entry.
     Returns a Postgres clause (as a Composable) and a tuple of arguments to be mogrified into it."""
@@ -82,6 +136,20 @@ def _qual_to_index_clause(qual: Tuple[str, str, Any], ctype: str) -> Tuple[SQL,
             + " %s"
         ).format((Identifier(column_name)))
         args.append(value)
+    elif qual_op == "IS NOT NULL":
+        # Objects that only have NULLs in this column have NULL bounds in the range index.
+        query += SQL(
+            "(index #>> '{{range,{0},0}}') IS NOT NULL OR (index #>> '{{range,{0},1}}') IS NOT NULL"
+        ).format(Identifier(column_name))
+    elif qual_op == "IS NULL":
+        # Only objects that have NULLs in this column might match. If there's no null count
+        # for the column, we have to assume they do.
+        return (
+            SQL("coalesce((index #>> '{{null_count,{}}}')::bigint, 1) > 0").format(
+                Identifier(column_name)
+            ),
+            (),
+        )
     elif qual_op == "=":
         query += SQL(
             _inject_collation(
@@ -93,8 +161,15 @@ def _qual_to_index_clause(qual: Tuple[str, str, Any], ctype: str) -> Tuple[SQL,
             )
         ).format((Identifier(column_name)))
         args.append(value)
-    # Currently, we ignore the LIKE (~~) qualifier since we can only make a judgement when the % pattern is at
-    # the end of a string.
+    # For LIKE (~~), we can only make a judgement when the pattern starts with a literal
+    # prefix: matching values are then at least as large as the prefix and start with it.
+    elif qual_op == "~~" and get_like_prefix(value, ctype) is not None:
+        prefix = cast(str, get_like_prefix(value, ctype))
+        query += SQL(
+            "((index #>> '{{range,{0},1}}') COLLATE \"C\" >= %s "
+            "AND left(index #>> '{{range,{0},0}}', %s) COLLATE \"C\" <= %s)"
+        ).format(Identifier(column_name))
+        args.extend([prefix, len(prefix), prefix])
     # For inequality, we can't really say when an object is definitely not pertinent to a qual:
     #   * if a <> X and X is included in an object's range, the object still might have values that aren't X.
     #   * if X isn't included in an object's range, the object definitely has values that aren't X so we have
@@ -105,9 +180,11 @@ def _qual_to_index_clause(qual: Tuple[str, str, Any], ctype: str) -> Tuple[SQL,
     return query, tuple(args)
 
 
-def _qual_to_sql_clause(qual: Tuple[str, str, str], ctype: str) -> Tuple[Composed, Tuple[str]]:
+def _qual_to_sql_clause(qual: Tuple[str, str, str], ctype: str) -> Tuple[Composed, Tuple]:
     """Convert a qual to a normal SQL clause that can be run against the actual object rather than the index."""
     column_name, qual_op, value = qual
+    if qual_op in ("IS NULL", "IS NOT NULL"):
+        return SQL("{} " + qual_op).format(Identifier(column_name)), ()
     return SQL("{}::" + ctype + " " + qual_op + " %s").format(Identifier(column_name)), (value,)
 
 
@@ -200,12 +277,105 @@ def extract_min_max_pks(
     return min_max
 
 
+def get_range_index_columns(
+    table_schema: "TableSchema", columns: Optional[List[str]] = None
+) -> List[str]:
+    """
+    Get the columns that the range index will be generated on.
+
+    :param table_schema: Schema of the table
+    :param columns: Columns requested by the user (default all). PK columns are always included,
+        columns with types that don't support comparisons are always excluded.
+    :return: List of column names
+    """
+    columns = columns or [c.name for c in table_schema]
+    return [
+        c.name
+        for c in table_schema
+        if _strip_type_mod(c.pg_type) in PG_INDEXABLE_TYPES and (c.is_pk or c.name in columns)
+    ]
+
+
+def get_range_index_expressions(
+    table_schema: "TableSchema", columns_to_index: List[str]
+) -> Composable:
+    """
+    Get the list of MIN/MAX aggregates that calculate the range index on given columns.
+
+    :param table_schema: Schema of the table
+    :param columns_to_index: Columns to index (see `get_range_index_columns`)
+    :return: SQL Composable with a comma-separated list of MIN(col), MAX(col) aggregates.
+    """
+    column_types = {c.name: _strip_type_mod(c.pg_type) for c in table_schema}
+    return SQL(",").join(
+        SQL(
+            _inject_collation("MIN({0}", column_types[c])
+            + "), "
+            + _inject_collation("MAX({0}", column_types[c])
+            + ")"
+        ).format(Identifier(c))
+        for c in columns_to_index
+    )
+
+
+def get_null_count_expressions(table_schema: "TableSchema") -> Composable:
+    """
+    Get the list of aggregates that count the NULLs in every column of the table.
+
+    :param table_schema: Schema of the table
+    :return: SQL Composable with a comma-separated list of COUNT(*) - COUNT(col) expressions.
+    """
+    return SQL(",").join(
+        SQL("COUNT(*) - COUNT({})").format(Identifier(c.name)) for c in table_schema
+    )
+
+
+def generate_null_count_index(
+    object_engine: "PsycopgEngine",
+    object_id: str,
+    table_schema: "TableSchema",
+    changeset: Optional[Changeset],
+    null_counts: Optional[Sequence[int]] = None,
+) -> Dict[str, int]:
+    """
+    Count the NULL values in every column of the object (including deleted values), used
+    to discard objects that can't match IS NULL qualifiers.
+
+    :param object_engine: Engine the object is located on
+    :param object_id: ID of the object.
+    :param table_schema: Schema of the table
+    :param changeset: Changeset (old NULL values are counted too)
+    :param null_counts: Optional, result of the aggregates from `get_null_count_expressions`
+        if it has already been calculated. If specified, the object isn't scanned.
+    :return: Dictionary of {column: number of NULLs}
+    """
+    if null_counts is None:
+        query = SQL("SELECT ") + get_null_count_expressions(table_schema)
+        query += SQL(" FROM {}.{}").format(
+            Identifier(SPLITGRAPH_META_SCHEMA), Identifier(object_id)
+        )
+        null_counts = object_engine.run_sql(query, return_shape=ResultShape.ONE_MANY)
+    index = {c.name: int(n) for c, n in zip(table_schema, null_counts)}
+
+    if changeset:
+        # Same as with the range index: if this object overwrites a row that had a NULL
+        # in some column, it has to be fetched for queries looking for NULLs in that column.
+        # (Deleted rows are stored in the object with NULLs in non-PK columns, so they've
+        # been counted already.)
+        for _, old_row, _ in changeset.values():
+            for col, val in old_row.items():
+                if col in index and val is None:
+                    index[col] += 1
+    return index
+
+
 def generate_range_index(
     object_engine: "PsycopgEngine",
     object_id: str,
     table_schema: "TableSchema",
     changeset: Optional[Changeset],
     columns: Optional[List[str]] = None,
+    min_max: Optional[Sequence[Any]] = None,
 ) -> Dict[str, Tuple[T, T]]:
     """
     Calculate the minimum/maximum values of every column in the object (including deleted values).
@@ -215,34 +385,26 @@ def generate_range_index(
     :param table_schema: Schema of the table
     :param changeset: Changeset (old values will be included in the index)
     :param columns: Columns to run the index on (default all)
+    :param min_max: Optional, result of the aggregates from `get_range_index_expressions`
+        if it has already been calculated (e.g. while hashing the object's source). If
+        specified, the object isn't scanned to get the column ranges.
     :return: Dictionary of {column: [min, max]}
     """
-    columns = columns or [c.name for c in table_schema]
-
     object_pk = [c.name for c in table_schema if c.is_pk]
     if not object_pk:
         object_pk = [c.name for c in table_schema if c.pg_type in PG_INDEXABLE_TYPES]
     column_types = {c.name: _strip_type_mod(c.pg_type) for c in table_schema}
-    columns_to_index = [
-        c.name
-        for c in table_schema
-        if _strip_type_mod(c.pg_type) in PG_INDEXABLE_TYPES and (c.is_pk or c.name in columns)
-    ]
+    columns_to_index = get_range_index_columns(table_schema, columns)
 
-    logging.debug("Running range index on columns %s", columns_to_index)
-    query = SQL("SELECT ") + SQL(",").join(
-        SQL(
-            _inject_collation("MIN({0}", column_types[c])
-            + "), "
-            + _inject_collation("MAX({0}", column_types[c])
-            + ")"
-        ).format(Identifier(c))
-        for c in columns_to_index
-    )
-    query += SQL(" FROM {}.{}").format(Identifier(SPLITGRAPH_META_SCHEMA), Identifier(object_id))
-    result = object_engine.run_sql(query, return_shape=ResultShape.ONE_MANY)
+    if min_max is None:
+        logging.debug("Running range index on columns %s", columns_to_index)
+        query = SQL("SELECT ") + get_range_index_expressions(table_schema, columns_to_index)
+        query += SQL(" FROM {}.{}").format(
+            Identifier(SPLITGRAPH_META_SCHEMA), Identifier(object_id)
+        )
+        min_max = object_engine.run_sql(query, return_shape=ResultShape.ONE_MANY)
     index = {
-        col: (cmin, cmax) for col, cmin, cmax in zip(columns_to_index, result[0::2], result[1::2])
+        col: (cmin, cmax) for col, cmin, cmax in zip(columns_to_index, min_max[0::2], min_max[1::2])
     }
     # Also explicitly store the ranges of composite PKs (since they won't be included
     # in the columns list) to be used for faster chunking/querying.
@@ -290,12 +452,114 @@ def generate_range_index(
     return range_index
 
 
+# Column types whose range index bounds are cast into typed columns of
+# splitgraph_meta.object_ranges (mapped to the suffix of those columns).
+_RANGE_TYPE_FAMILIES = {
+    **{
+        t: "numeric"
+        for t in [
+            "bigint",
+            "bigserial",
+            "double precision",
+            "integer",
+            "numeric",
+            "real",
+            "smallint",
+            "smallserial",
+            "serial",
+        ]
+    },
+    **{t: "text" for t in ["text", "character varying"]},
+    **{t: "timestamp" for t in ["date", "timestamp", "timestamp without time zone"]},
+}
+
+
+def _qual_to_typed_index_clause(
+    qual: Tuple[str, str, Any], ctype: str, alias: Optional[str]
+) -> Tuple[Composable, Tuple]:
+    """Like `_qual_to_index_clause`, but runs against the typed range index in
+    splitgraph_meta.object_ranges (joined as `alias`) if the column's type is supported."""
+    column_name, qual_op, value = qual
+    family = _RANGE_TYPE_FAMILIES.get(ctype)
+    if not family or not alias or qual_op not in (">", ">=", "<", "<=", "="):
+        return _qual_to_index_clause(qual, ctype)
+
+    min_col = Identifier(alias) + SQL(".") + Identifier("min_" + family)
+    max_col = Identifier(alias) + SQL(".") + Identifier("max_" + family)
+    value_sql = SQL("%s::" + family)
+
+    # If there's no index information for the column or the bounds couldn't be cast
+    # into the column's type, we have to assume the object might match the qual.
+    # If the bounds are NULL (the object only has NULLs in this column), it doesn't match.
+    query = SQL(
+        "{0}.object_id IS NULL OR ({0}.min_text IS NOT NULL AND {1} IS NULL) "
+        "OR ({0}.max_text IS NOT NULL AND {2} IS NULL) OR "
+    ).format(Identifier(alias), min_col, max_col)
+
+    if qual_op in (">", ">="):
+        query += max_col + SQL(" " + qual_op + " ") + value_sql
+        args: Tuple = (value,)
+    elif qual_op in ("<", "<="):
+        query += min_col + SQL(" " + qual_op + " ") + value_sql
+        args = (value,)
+    else:
+        query += SQL("({0} <= {2} AND {1} >= {2})").format(min_col, max_col, value_sql)
+        args = (value, value)
+    return query, args
+
+
+def _filter_range_index_typed(
+    metadata_engine: "PsycopgEngine",
+    object_ids: List[str],
+    quals: Any,
+    column_types: Dict[str, str],
+) -> List[str]:
+    # Join the typed range index once for every column that we can use it for.
+    range_columns = sorted(
+        {
+            q[0]
+            for clause in quals
+            for q in clause
+            if _strip_type_mod(column_types[q[0]]) in _RANGE_TYPE_FAMILIES
+            and q[1] in (">", ">=", "<", "<=", "=")
+        }
+    )
+    aliases = {c: "r%d" % i for i, c in enumerate(range_columns)}
+
+    query = SQL("SELECT o.object_id FROM {}.objects o").format(Identifier(SPLITGRAPH_META_SCHEMA))
+    for column_name in range_columns:
+        query += SQL(
+            " LEFT JOIN {0}.object_ranges {1} ON {1}.object_id = o.object_id "
+            "AND {1}.column_name = %s"
+        ).format(Identifier(SPLITGRAPH_META_SCHEMA), Identifier(aliases[column_name]))
+
+    clause, args = _quals_to_clause(
+        quals,
+        column_types,
+        qual_to_clause=lambda q, ctype: _qual_to_typed_index_clause(q, ctype, aliases.get(q[0])),
+    )
+    query += SQL(" WHERE o.object_id = ANY(%s) AND ") + clause
+
+    return cast(
+        List[str],
+        metadata_engine.run_sql(
+            query, range_columns + [object_ids] + list(args), return_shape=ResultShape.MANY_ONE,
+        ),
+    )
+
+
 def filter_range_index(
     metadata_engine: "PsycopgEngine",
     object_ids: List[str],
     quals: Any,
     column_types: Dict[str, str],
 ) -> List[str]:
+    # Registries only let us access object metadata through the API, so we have to evaluate
+    # the quals against the JSON index and chunk the object list up there. Otherwise,
+    # use the typed copy of the range index.
+    if not metadata_engine.registry:
+        return _filter_range_index_typed(metadata_engine, object_ids, quals, column_types)
+
     clause, args = _quals_to_clause(quals, column_types)
     query = (
         select("get_object_meta", "object_id", table_args="(%s)", schema=SPLITGRAPH_API_SCHEMA)
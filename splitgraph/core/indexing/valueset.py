@@ -0,0 +1,174 @@
+"""Exact value set filtering on fragments for equality queries on low-cardinality columns."""
+import itertools
+from typing import Any, Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+
+from psycopg2.sql import SQL, Identifier
+
+from splitgraph.config import SPLITGRAPH_META_SCHEMA
+from splitgraph.core.types import Changeset
+from splitgraph.engine import ResultShape
+from splitgraph.engine.postgres.engine import SG_UD_FLAG
+
+if TYPE_CHECKING:
+    from splitgraph.engine.postgres.engine import PsycopgEngine
+
+# Maximum number of distinct values in a fragment's column that we store in the index
+# by default. Columns with more values get a bloom filter instead.
+DEFAULT_MAX_VALUES = 100
+
+# False positive probability of the bloom filter that replaces the value set
+# if the column has too many distinct values.
+DEFAULT_FALLBACK_PROBABILITY = 0.01
+
+
+def _value_key(value: Any) -> str:
+    # Same as the bloom index: values are compared using their text representation
+    # and NULLs are stored as the string 'NULL'.
+    if value is None:
+        return "NULL"
+    return str(value)
+
+
+def generate_valueset_index(
+    engine: "PsycopgEngine",
+    object_id: str,
+    changeset: Optional[Changeset],
+    column: str,
+    max_values: int = DEFAULT_MAX_VALUES,
+    values: Optional[List[str]] = None,
+) -> Optional[List[str]]:
+    """
+    Generates a value set index for a given column and a given fragment: a sorted list of all
+    distinct values in that column. Unlike the bloom filter, it can say with certainty whether
+    a fragment has a given value, but its size grows with the number of distinct values, so
+    it's only built for columns that have at most `max_values` of them.
+
+    :param engine: Object engine the fragment is cached in.
+    :param object_id: Fragment ID
+    :param changeset: Optional, if specified, the old column values are included in the index.
+    :param column: Column name to generate the index on.
+    :param max_values: Maximum number of distinct values to store.
+    :param values: Optional, distinct text values of the column (with NULLs replaced by the
+        string 'NULL') if they have already been fetched. If specified, the object isn't scanned.
+    :return: Sorted list of distinct text values of the column or None if there are more
+        than `max_values` of them.
+    """
+    if max_values < 1:
+        raise ValueError("max_values must be positive!")
+
+    distinct: Set[str]
+    if values is not None:
+        distinct = set(values)
+    else:
+        # Only fetch one value more than the limit: we don't need the rest if we're over it.
+        distinct = set(
+            engine.run_sql(
+                SQL(
+                    "SELECT DISTINCT coalesce({0}::text, 'NULL') FROM {1}.{2} o "
+                    "WHERE o.{3} = true LIMIT %s"
+                ).format(
+                    Identifier(column),
+                    Identifier(SPLITGRAPH_META_SCHEMA),
+                    Identifier(object_id),
+                    Identifier(SG_UD_FLAG),
+                ),
+                (max_values + 1,),
+                return_shape=ResultShape.MANY_ONE,
+            )
+        )
+
+    # Add the old values in the changeset for this column (see generate_bloom_index).
+    if changeset:
+        for _, old_row, _ in changeset.values():
+            if column in old_row:
+                distinct.add(_value_key(old_row[column]))
+
+    if len(distinct) > max_values:
+        return None
+    return sorted(distinct)
+
+
+def describe(values: List[str]) -> str:
+    """
+    Returns a pretty-printed summary of the value set index
+
+    :param values: List of values returned by generate_valueset_index
+    :return: String
+    """
+    shown = ", ".join(values[:5])
+    if len(values) > 5:
+        shown += ", ..."
+    return "%d value(s): %s" % (len(values), shown)
+
+
+def _prepare_valueset_quals(quals: Any) -> List[List[Tuple[str, str]]]:
+    """
+    Convert list of qualifiers in CNF to prepare it for querying the value set index. Same as
+    `splitgraph.core.indexing.bloom._prepare_bloom_quals`, but clauses with equality
+    are converted to (column, text value).
+
+    :param quals: Quals in CNF.
+    :return: Transformed list of quals
+    """
+    result = []
+    for or_quals in quals:
+        processed = []
+        for column, operator, value in or_quals:
+            if operator == "IS NULL":
+                value = None
+            elif operator != "=":
+                # We can't make a judgement on anything but exact matches, so the
+                # whole OR-clause might be true.
+                break
+            processed.append((column, _value_key(value)))
+        else:
+            result.append(processed)
+    return result
+
+
+def _match(qual: Tuple[str, str], valueset_index: Dict[str, Set[str]]) -> bool:
+    column, value = qual
+    if column not in valueset_index:
+        # No index info for this column -- might match
+        return True
+    return value in valueset_index[column]
+
+
+def filter_valueset_index(engine: "PsycopgEngine", object_ids: List[str], quals: Any) -> List[str]:
+    """
+    Discards objects that definitely don't match the given qualifiers using their value set
+    indexes.
+
+    :param engine: Metadata engine
+    :param object_ids: Object IDs
+    :param quals: List of qualifiers
+    :return: List of object IDs that might match the qualifiers in `quals` (including
+        IDs that don't have a value set index).
+    """
+    if not object_ids:
+        return object_ids
+
+    quals = _prepare_valueset_quals(quals)
+    if not quals:
+        return object_ids
+
+    valueset_index = engine.run_sql(
+        SQL(
+            "SELECT object_id, index -> 'valueset' FROM {}.{} WHERE object_id IN ("
+            + ",".join(itertools.repeat("%s", len(object_ids)))
+            + ")"
+        ).format(Identifier(SPLITGRAPH_META_SCHEMA), Identifier("objects")),
+        object_ids,
+    )
+    valueset_index = {
+        o: {col: set(values) for col, values in index.items()}
+        for o, index in valueset_index
+        if index
+    }
+
+    dropped = {
+        object_id
+        for object_id, index in valueset_index.items()
+        if not all(any(_match(q, index) for q in or_quals) for or_quals in quals)
+    }
+    return [o for o in object_ids if o not in dropped]
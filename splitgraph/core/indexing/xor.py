@@ -0,0 +1,341 @@
+"""
+Xor filtering on fragments for equality queries. Xor filters answer the same questions as bloom
+filters, but take about 1.23 * fingerprint size bits per item (compared to 1.44 * log2(1 / p)
+for a bloom filter with the same false positive probability p) and only need 3 lookups to check
+an item, no matter how low the false positive probability is.
+
+See Graf, Lemire: "Xor Filters: Faster and Smaller Than Bloom and Cuckoo Filters" (2019).
+"""
+
+import base64
+from hashlib import sha256
+from math import ceil
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from psycopg2.sql import SQL, Identifier
+
+from splitgraph.config import SPLITGRAPH_META_SCHEMA
+from splitgraph.core.output import pretty_size
+from splitgraph.core.types import Changeset
+from splitgraph.engine import ResultShape
+from splitgraph.engine.postgres.engine import SG_UD_FLAG
+
+try:
+    import numpy as np
+
+    _NUMPY_SUPPORTED = True
+except ImportError:
+    _NUMPY_SUPPORTED = False
+
+if TYPE_CHECKING:
+    from splitgraph.engine.postgres.engine import PsycopgEngine
+
+# Supported fingerprint sizes: a filter with b-bit fingerprints has a false positive
+# probability of 2 ** -b.
+FINGERPRINT_BITS = (8, 16)
+
+# Number of seeds to try before giving up on building the filter. Every attempt fails with
+# a small probability, so we should never run out of them in practice.
+_MAX_ATTEMPTS = 100
+
+_MASK_32 = (1 << 32) - 1
+_MASK_64 = (1 << 64) - 1
+
+
+def _digest_key(digest: bytes) -> int:
+    # Same as the bloom index: items are identified by the SHA256 of their text representation.
+    # The first 64 bits of it are enough to tell them apart.
+    return int.from_bytes(digest[:8], byteorder="big")
+
+
+def hash_to_key(hash_1: int) -> int:
+    """
+    Get the xor filter key from the first hash of a value, as calculated by
+    `splitgraph.core.indexing.bloom._prepare_bloom_quals`.
+    """
+    return hash_1 >> 192
+
+
+def _mix(key: int, seed: int) -> int:
+    # Finalizer from MurmurHash3: scrambles the key so that different seeds give
+    # independent item positions.
+    h = (key + seed) & _MASK_64
+    h = ((h ^ (h >> 33)) * 0xFF51AFD7ED558CCD) & _MASK_64
+    h = ((h ^ (h >> 33)) * 0xC4CEB9FE1A85EC53) & _MASK_64
+    return h ^ (h >> 33)
+
+
+def _rotl(h: int, bits: int) -> int:
+    return ((h << bits) | (h >> (64 - bits))) & _MASK_64
+
+
+def _positions(h: int, block_length: int) -> Tuple[int, int, int]:
+    # Every item has one slot in each of the three blocks of the filter.
+    return (
+        ((h & _MASK_32) * block_length) >> 32,
+        block_length + (((_rotl(h, 21) & _MASK_32) * block_length) >> 32),
+        2 * block_length + (((_rotl(h, 42) & _MASK_32) * block_length) >> 32),
+    )
+
+
+def _fingerprint(h: int, bits: int) -> int:
+    return (h ^ (h >> 32)) & ((1 << bits) - 1)
+
+
+def _seed(attempt: int) -> int:
+    return _mix(attempt, 0x9E3779B97F4A7C15)
+
+
+def _peel(
+    counts: List[int], xor_hashes: List[int], num_keys: int, block_length: int, bits: int
+) -> Optional[List[int]]:
+    """
+    Assign the fingerprints of an xor filter, given the number of items in each of its slots
+    and the xor of their hashes.
+
+    :return: List of fingerprints or None if the items can't be peeled off the slots
+        (and another seed has to be tried).
+    """
+    # Peel items off slots that only have one of them until we run out of such slots.
+    # If there's only one item in a slot, the xor of the hashes in it is that item's hash.
+    queue = [slot for slot, count in enumerate(counts) if count == 1]
+    stack: List[Tuple[int, int]] = []
+    while queue:
+        slot = queue.pop()
+        if counts[slot] != 1:
+            continue
+        h = xor_hashes[slot]
+        stack.append((slot, h))
+        for other in _positions(h, block_length):
+            counts[other] -= 1
+            xor_hashes[other] ^= h
+            if counts[other] == 1:
+                queue.append(other)
+
+    if len(stack) < num_keys:
+        # Some items are left in a cycle.
+        return None
+
+    # Assign the fingerprints in reverse peeling order: the slot that an item was peeled
+    # off isn't used by any item assigned after it.
+    fingerprints = [0] * len(counts)
+    for slot, h in reversed(stack):
+        h0, h1, h2 = _positions(h, block_length)
+        fingerprints[slot] = (
+            _fingerprint(h, bits) ^ fingerprints[h0] ^ fingerprints[h1] ^ fingerprints[h2]
+        )
+    return fingerprints
+
+
+def _build_filter(keys: List[int], bits: int) -> Tuple[int, List[int]]:
+    """
+    Build an xor filter: an array of fingerprints where, for every item, the fingerprints
+    in its three slots xor to the item's fingerprint.
+
+    :param keys: Distinct 64-bit keys of the items
+    :param bits: Size of the fingerprint
+    :return: Seed used to hash the keys and the list of fingerprints
+    """
+    block_length = int(ceil((32 + 1.23 * len(keys)) / 3))
+    capacity = block_length * 3
+
+    for attempt in range(_MAX_ATTEMPTS):
+        seed = _seed(attempt)
+
+        # Count the items in each slot and the xor of their hashes.
+        counts = [0] * capacity
+        xor_hashes = [0] * capacity
+        for key in keys:
+            h = _mix(key, seed)
+            for slot in _positions(h, block_length):
+                counts[slot] += 1
+                xor_hashes[slot] ^= h
+
+        fingerprints = _peel(counts, xor_hashes, len(keys), block_length, bits)
+        if fingerprints is not None:
+            return seed, fingerprints
+
+    raise ValueError("Couldn't build an xor filter in %d attempts!" % _MAX_ATTEMPTS)
+
+
+def _mix_numpy(keys: "np.ndarray", seed: int) -> "np.ndarray":
+    # Same as _mix: uint64 arithmetic wraps around like the masking there.
+    shift = np.uint64(33)
+    h = keys + np.uint64(seed)
+    h = (h ^ (h >> shift)) * np.uint64(0xFF51AFD7ED558CCD)
+    h = (h ^ (h >> shift)) * np.uint64(0xC4CEB9FE1A85EC53)
+    return h ^ (h >> shift)
+
+
+def _positions_numpy(hashes: "np.ndarray", block_length: int) -> "np.ndarray":
+    # Same as _positions, returning an array of the three slots of every item.
+    mask = np.uint64(_MASK_32)
+    length = np.uint64(block_length)
+    slots = []
+    for block, rotation in enumerate((0, 21, 42)):
+        h = hashes
+        if rotation:
+            h = (h << np.uint64(rotation)) | (h >> np.uint64(64 - rotation))
+        slots.append(
+            block * block_length + (((h & mask) * length) >> np.uint64(32)).astype(np.int64)
+        )
+    return np.stack(slots, axis=1)
+
+
+def _build_filter_numpy(keys: List[int], bits: int) -> Tuple[int, List[int]]:
+    """
+    Same as `_build_filter`, but hashes all items and counts them in their slots at once
+    with NumPy. Peeling the items off the slots is still done one item at a time.
+    """
+    block_length = int(ceil((32 + 1.23 * len(keys)) / 3))
+    capacity = block_length * 3
+    key_array = np.array(keys, dtype=np.uint64)
+
+    for attempt in range(_MAX_ATTEMPTS):
+        seed = _seed(attempt)
+        hashes = _mix_numpy(key_array, seed)
+        slots = _positions_numpy(hashes, block_length).ravel()
+
+        counts = np.bincount(slots, minlength=capacity)
+        xor_hashes = np.zeros(capacity, dtype=np.uint64)
+        np.bitwise_xor.at(xor_hashes, slots, np.repeat(hashes, 3))
+
+        fingerprints = _peel(counts.tolist(), xor_hashes.tolist(), len(keys), block_length, bits)
+        if fingerprints is not None:
+            return seed, fingerprints
+
+    raise ValueError("Couldn't build an xor filter in %d attempts!" % _MAX_ATTEMPTS)
+
+
+def _get_bits(probability: Optional[float], fingerprint_bits: Optional[int]) -> int:
+    if probability is not None and fingerprint_bits is not None:
+        raise ValueError("Only one of probability or fingerprint_bits can be specified!")
+    if fingerprint_bits is not None:
+        if fingerprint_bits not in FINGERPRINT_BITS:
+            raise ValueError(
+                "Unsupported fingerprint size %d, expected one of %r!"
+                % (fingerprint_bits, FINGERPRINT_BITS)
+            )
+        return fingerprint_bits
+    if probability is None:
+        return FINGERPRINT_BITS[0]
+    for bits in FINGERPRINT_BITS:
+        if 2 ** -bits <= probability:
+            return bits
+    raise ValueError(
+        "Can't build an xor filter with false positive probability %f "
+        "(minimum %f)!" % (probability, 2 ** -FINGERPRINT_BITS[-1])
+    )
+
+
+def generate_xor_index(
+    engine: "PsycopgEngine",
+    object_id: str,
+    changeset: Optional[Changeset],
+    column: str,
+    probability: Optional[float] = None,
+    fingerprint_bits: Optional[int] = None,
+    values: Optional[List[str]] = None,
+) -> Tuple[int, int, str]:
+    """
+    Generates an xor filter for a given column and a given fragment. Like a bloom filter, it can
+    answer queries asking whether an item is definitely not in a given set or possibly can be.
+
+    The size of the fingerprint (8 or 16 bits) determines the false positive probability
+    (2 ** -8 or 2 ** -16). Either the fingerprint size or the maximum acceptable false positive
+    probability can be specified, in which case the smallest fingerprint that achieves it is used.
+    By default, 8-bit fingerprints are used.
+
+    Building the filter takes longer than building a bloom filter with the same number of items,
+    since the items have to be peeled off the filter's slots one at a time (in pure Python). If
+    NumPy is installed, it's used to hash the items and count them in their slots, but
+    peeling still takes a few seconds per million distinct values at commit time.
+
+    :param engine: Object engine the fragment is cached in.
+    :param object_id: Fragment ID
+    :param changeset: Optional, if specified, the old column values are included in the index.
+    :param column: Column name to generate the index on.
+    :param probability: Maximum probability of a false positive.
+    :param fingerprint_bits: Size of the fingerprint, in bits.
+    :param values: Optional, distinct text values of the column (with NULLs replaced by the
+        string 'NULL', like in `generate_bloom_index`) if they have already been fetched.
+        If specified, the object isn't scanned.
+    :return: Tuple of (seed, fingerprint size, base64-encoded filter) to be inserted into the index.
+    """
+    bits = _get_bits(probability, fingerprint_bits)
+
+    if values is not None:
+        digests = [sha256(v.encode("utf-8")).digest() for v in values]
+    else:
+        digests = [
+            bytes(d)
+            for d in engine.run_sql(
+                SQL(
+                    "SELECT DISTINCT digest(coalesce({0}::text, 'NULL'), 'sha256') "
+                    "FROM {1}.{2} o WHERE o.{3} = true"
+                ).format(
+                    Identifier(column),
+                    Identifier(SPLITGRAPH_META_SCHEMA),
+                    Identifier(object_id),
+                    Identifier(SG_UD_FLAG),
+                ),
+                return_shape=ResultShape.MANY_ONE,
+            )
+        ]
+
+    # Add the old values in the changeset for this column (see generate_bloom_index).
+    if changeset:
+        for _, old_row, _ in changeset.values():
+            if column in old_row:
+                value = old_row[column]
+                digests.append(
+                    sha256(str("NULL" if value is None else value).encode("utf-8")).digest()
+                )
+
+    keys = sorted({_digest_key(d) for d in digests})
+    if _NUMPY_SUPPORTED:
+        seed, fingerprints = _build_filter_numpy(keys, bits)
+    else:
+        seed, fingerprints = _build_filter(keys, bits)
+    result = b"".join(f.to_bytes(bits // 8, byteorder="little") for f in fingerprints)
+    return seed, bits, base64.b64encode(result).decode("ascii")
+
+
+def describe(index_tuple: Tuple[int, int, str]) -> str:
+    """
+    Returns a pretty-printed summary of the xor filter
+
+    :param index_tuple: Tuple of (seed, fingerprint size, base64-encoded filter)
+        returned by generate_xor_index
+    :return: String
+    """
+    _, bits, xor_filter = index_tuple
+    capacity = len(base64.b64decode(xor_filter)) // (bits // 8)
+    return "%d-bit fingerprints, size %s, approx. %d item(s), false positive probability %.3f%%" % (
+        bits,
+        pretty_size(len(xor_filter)),
+        int(max(capacity - 32, 0) / 1.23),
+        100 * 2 ** -bits,
+    )
+
+
+def _match(key: int, xor_filter: Tuple[int, int, bytes]) -> bool:
+    """
+    Checks whether an item with a given key (see `hash_to_key`) might be in the filter.
+
+    :param key: Item key
+    :param xor_filter: Tuple of (seed, fingerprint size, filter)
+    """
+    seed, bits, data = xor_filter
+    width = bits // 8
+    block_length = len(data) // width // 3
+    h = _mix(key, seed)
+    result = _fingerprint(h, bits)
+    for slot in _positions(h, block_length):
+        result ^= int.from_bytes(data[slot * width : (slot + 1) * width], byteorder="little")
+    return result == 0
+
+
+def decode_xor_index(index: Dict[str, List]) -> Dict[str, Tuple[int, int, bytes]]:
+    """Decode the base64-encoded filters of an object's xor index."""
+    return {col: (i[0], i[1], base64.b64decode(i[2])) for col, i in index.items()}
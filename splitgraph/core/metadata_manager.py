@@ -2,13 +2,16 @@
 Classes related to managing table/image/object metadata tables.
 """
 import itertools
+import threading
+from collections import OrderedDict
+from copy import deepcopy
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING, NamedTuple, cast, Sequence
 
 from psycopg2.extras import Json
 from psycopg2.sql import SQL, Identifier
 
-from splitgraph.config import SPLITGRAPH_API_SCHEMA, SPLITGRAPH_META_SCHEMA
+from splitgraph.config import SPLITGRAPH_API_SCHEMA, SPLITGRAPH_META_SCHEMA, CONFIG, get_singleton
 from splitgraph.core.types import TableSchema
 from splitgraph.engine import ResultShape
 from splitgraph.engine.postgres.engine import API_MAX_VARIADIC_ARGS, chunk
@@ -56,6 +59,16 @@ class MetadataManager:
     def __init__(self, metadata_engine: "PsycopgEngine") -> None:
         self.metadata_engine = metadata_engine
 
+        # LRU cache of object metadata. Objects are immutable apart from their indexes
+        # (that can be changed by reindexing), so we only have to invalidate records when
+        # objects are reregistered or deleted. Callers get copies of the cached records,
+        # so that changing an Object's index doesn't change the cache.
+        self.object_meta_cache_size = int(get_singleton(CONFIG, "SG_OBJECT_META_CACHE_SIZE"))
+        self._object_meta_cache: "OrderedDict[str, Object]" = OrderedDict()
+        self._object_meta_cache_lock = threading.Lock()
+        self.object_meta_cache_hits = 0
+        self.object_meta_cache_misses = 0
+
     def register_objects(self, objects: List[Object], namespace: Optional[str] = None) -> None:
         """
         Registers multiple Splitgraph objects in the tree.
@@ -80,6 +93,7 @@ class MetadataManager:
             ).format(Identifier(SPLITGRAPH_API_SCHEMA)),
             object_meta,
         )
+        self._invalidate_object_meta([o.object_id for o in objects])
 
     def register_tables(
         self, repository: "Repository", table_meta: List[Tuple[str, str, TableSchema, List[str]]]
@@ -184,7 +198,8 @@ class MetadataManager:
 
     def get_object_meta(self, objects: List[str]) -> Dict[str, Object]:
         """
-        Get metadata for multiple Splitgraph objects from the tree
+        Get metadata for multiple Splitgraph objects from the tree. Objects that have
+        been requested recently are returned from an in-memory cache.
 
         :param objects: List of objects to get metadata for.
         :return: Dictionary of object_id -> Object
@@ -192,6 +207,20 @@ class MetadataManager:
         if not objects:
             return {}
 
+        result: Dict[str, Object] = {}
+        with self._object_meta_cache_lock:
+            for object_id in objects:
+                cached = self._object_meta_cache.get(object_id)
+                if cached is not None:
+                    self._object_meta_cache.move_to_end(object_id)
+                    result[object_id] = deepcopy(cached)
+            missing = [o for o in objects if o not in result]
+            self.object_meta_cache_hits += len(objects) - len(missing)
+            self.object_meta_cache_misses += len(missing)
+
+        if not missing:
+            return {o: result[o] for o in objects}
+
         metadata = self.metadata_engine.run_chunked_sql(
             select(
                 "get_object_meta",
@@ -199,11 +228,24 @@ class MetadataManager:
                 schema=SPLITGRAPH_API_SCHEMA,
                 table_args="(%s)",
             ),
-            (list(objects),),
+            (missing,),
             chunk_position=0,
         )
-        result = [Object(*m) for m in metadata]
-        return {o.object_id: o for o in result}
+        fetched = [Object(*m) for m in metadata]
+        result.update({o.object_id: o for o in fetched})
+
+        if self.object_meta_cache_size:
+            with self._object_meta_cache_lock:
+                for obj in fetched:
+                    self._object_meta_cache[obj.object_id] = deepcopy(obj)
+                while len(self._object_meta_cache) > self.object_meta_cache_size:
+                    self._object_meta_cache.popitem(last=False)
+        return {o: result[o] for o in objects if o in result}
+
+    def _invalidate_object_meta(self, object_ids: Sequence[str]) -> None:
+        with self._object_meta_cache_lock:
+            for object_id in object_ids:
+                self._object_meta_cache.pop(object_id, None)
 
     def get_objects_for_repository(
         self, repository: "Repository", image_hash: Optional[str] = None
@@ -239,6 +281,7 @@ class MetadataManager:
                 arguments=(object_ids,),
                 chunk_position=0,
             )
+        self._invalidate_object_meta(object_ids)
 
     def get_unused_objects(self, threshold: Optional[int] = None) -> List[Tuple[str, datetime]]:
         """
@@ -19,10 +19,13 @@ from typing import (
     Sequence,
 )
 
+from psycopg2 import DatabaseError
+from psycopg2.extras import Json
 from psycopg2.sql import SQL, Identifier
 
 from splitgraph.config import SPLITGRAPH_META_SCHEMA, CONFIG, get_singleton
 from splitgraph.core.fragment_manager import FragmentManager
+from splitgraph.core.metadata_manager import Object
 from splitgraph.core.types import Quals
 from splitgraph.engine import ResultShape, switch_engine
 from splitgraph.exceptions import (
@@ -75,6 +78,100 @@ class ObjectManager(FragmentManager):
         # of more possible cache misses.
         self.eviction_min_fraction = float(get_singleton(CONFIG, "SG_EVICTION_MIN_FRACTION"))
 
+        # Maximum number of query plans in the engine-wide plan cache (0 to disable it).
+        self.plan_cache_size = int(get_singleton(CONFIG, "SG_LQ_PLAN_CACHE_SIZE"))
+
+    def register_objects(self, objects: List[Object], namespace: Optional[str] = None) -> None:
+        super().register_objects(objects, namespace)
+        # Objects might have been reindexed, so plans that use them might be stale.
+        self.invalidate_query_plans([o.object_id for o in objects])
+
+    def delete_object_meta(self, object_ids: Sequence[str]):
+        super().delete_object_meta(object_ids)
+        self.invalidate_query_plans(object_ids)
+
+    def get_cached_query_plan(self, plan_key: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a query plan from the engine-wide plan cache. This only reads from the engine,
+        so it works on read-only engines too.
+
+        :param plan_key: Key of the plan (see `splitgraph.core.table.QueryPlan`)
+        :return: Plan dictionary or None if the plan isn't in the cache.
+        """
+        if not self.plan_cache_size:
+            return None
+        return cast(
+            Optional[Dict[str, Any]],
+            self.object_engine.run_sql(
+                SQL("SELECT plan FROM {}.query_plans WHERE plan_key = %s").format(
+                    Identifier(SPLITGRAPH_META_SCHEMA)
+                ),
+                (plan_key,),
+                return_shape=ResultShape.ONE_ONE,
+            ),
+        )
+
+    def cache_query_plan(self, plan_key: str, object_ids: List[str], plan: Dict[str, Any]) -> None:
+        """
+        Add a query plan to the engine-wide plan cache, evicting the oldest plans if the
+        cache is full.
+
+        The plan is stored in the current transaction on the object engine (but not committed)
+        and becomes visible to other sessions when the caller commits. Caching is best-effort:
+        if the plan can't be stored (e.g. the engine is read-only), it's skipped.
+
+        :param plan_key: Key of the plan
+        :param object_ids: Objects in the table that the plan is for
+        :param plan: JSON-serializable plan dictionary
+        """
+        if not self.plan_cache_size:
+            return
+        engine = self.object_engine
+
+        def _store_plan() -> None:
+            # Skip plans that other sessions are evicting instead of waiting for them.
+            engine.run_sql(
+                SQL(
+                    "INSERT INTO {0}.query_plans (plan_key, object_ids, plan, last_used) "
+                    "VALUES (%s, %s, %s, %s) ON CONFLICT (plan_key) DO UPDATE "
+                    "SET object_ids = EXCLUDED.object_ids, plan = EXCLUDED.plan, "
+                    "last_used = EXCLUDED.last_used; "
+                    "DELETE FROM {0}.query_plans WHERE plan_key IN "
+                    "(SELECT plan_key FROM {0}.query_plans ORDER BY last_used DESC OFFSET %s "
+                    "FOR UPDATE SKIP LOCKED)"
+                ).format(Identifier(SPLITGRAPH_META_SCHEMA)),
+                (plan_key, object_ids, Json(plan), dt.utcnow(), self.plan_cache_size),
+                return_shape=None,
+            )
+
+        try:
+            if engine.autocommit:
+                _store_plan()
+            else:
+                # Don't let a failure roll back the caller's transaction.
+                with engine.savepoint("cache_query_plan"):
+                    _store_plan()
+        except DatabaseError as e:
+            logging.info("Couldn't cache the query plan: %s", e)
+
+    def invalidate_query_plans(self, object_ids: Sequence[str]) -> None:
+        """
+        Delete cached query plans for tables that contain any of the given objects.
+
+        :param object_ids: List of object IDs
+        """
+        # Registries don't run layered queries and don't have the plan cache.
+        if not object_ids or self.object_engine.registry:
+            return
+        self.object_engine.run_chunked_sql(
+            SQL("DELETE FROM {}.query_plans WHERE object_ids && %s::varchar[]").format(
+                Identifier(SPLITGRAPH_META_SCHEMA)
+            ),
+            (list(object_ids),),
+            chunk_position=0,
+            return_shape=None,
+        )
+
     def get_downloaded_objects(self, limit_to: Optional[List[str]] = None) -> List[str]:
         """
         Gets a list of objects currently in the Splitgraph cache (i.e. not only existing externally.)
@@ -211,9 +308,10 @@ class ObjectManager(FragmentManager):
 
             # If all objects are externally hosted, there's no need to try and get the table's
             # upstream (there's a corner case where the metadata engine is different from the object
-            # engine and the repo actually has no upstream)
+            # engine and the repo actually has no upstream). The metadata engine can also be an
+            # SPIEngine that queries the same database as the object engine without a connection.
             if (
-                self.metadata_engine == self.object_engine
+                _same_database(self.metadata_engine, self.object_engine)
                 and table is not None
                 and upstream_manager is None
             ):
@@ -840,3 +938,12 @@ def _fetch_external_objects(
             with switch_engine(engine):
                 successful.extend(handler.download_objects(objects, source_engine))
     return successful
+
+
+def _same_database(metadata_engine: "PsycopgEngine", object_engine: "PostgresEngine") -> bool:
+    from splitgraph.engine.postgres.spi import SPIEngine
+
+    if metadata_engine is object_engine:
+        return True
+    # SPIEngines run queries in the backend of the engine that they're named after.
+    return isinstance(metadata_engine, SPIEngine) and metadata_engine.name == object_engine.name
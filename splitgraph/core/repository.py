@@ -401,6 +401,7 @@ class Repository:
         extra_indexes: Optional[Dict[str, ExtraIndexInfo]] = None,
         in_fragment_order: Optional[Dict[str, List[str]]] = None,
         overwrite: bool = False,
+        workers: int = 1,
     ) -> Image:
         """
         Commits all pending changes to a given repository, creating a new image.
@@ -423,6 +424,8 @@ class Repository:
         :param in_fragment_order: Dictionary of {table: list of columns}. If specified, will
         sort the data inside each chunk by this/these key(s) for each table.
         :param overwrite: If an object already exists, will force recreate it.
+        :param workers: Number of parallel engine connections to use to store, hash and index
+            chunks of tables that are stored as snapshots.
 
         :return: The newly created Image object.
         """
@@ -449,6 +452,7 @@ class Repository:
             extra_indexes=extra_indexes,
             in_fragment_order=in_fragment_order,
             overwrite=overwrite,
+            workers=workers,
         )
 
         set_head(self, image_hash)
@@ -467,6 +471,7 @@ class Repository:
         extra_indexes: Optional[Dict[str, ExtraIndexInfo]] = None,
         in_fragment_order: Optional[Dict[str, List[str]]] = None,
         overwrite: bool = False,
+        workers: int = 1,
     ) -> None:
         """
         Reads the recorded pending changes to all tables in a given checked-out image,
@@ -518,6 +523,7 @@ class Repository:
                     extra_indexes=extra_indexes.get(table),
                     in_fragment_order=in_fragment_order.get(table),
                     overwrite=overwrite,
+                    workers=workers,
                 )
                 continue
 
@@ -1,12 +1,20 @@
 """Table metadata-related classes."""
+import heapq
 import itertools
 import logging
+from hashlib import sha256
 import threading
-from contextlib import contextmanager
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, closing
+from copy import deepcopy
+from queue import Queue, Full
 from math import ceil
 from typing import (
     Any,
     Callable,
+    Deque,
+    Iterable,
     Iterator,
     List,
     Optional,
@@ -27,14 +35,24 @@ from splitgraph.core.fragment_manager import (
     get_chunk_groups,
     ExtraIndexInfo,
 )
+from splitgraph.core.indexing.aggregate import (
+    Aggregate,
+    combine_aggregates,
+    get_aggregate_expressions,
+    get_fragment_aggregates,
+    validate_aggregates,
+)
 from splitgraph.core.indexing.range import quals_to_sql
 from splitgraph.core.output import pluralise, truncate_list
 from splitgraph.core.sql import select
 from splitgraph.core.types import TableSchema, Quals
 from splitgraph.engine import ResultShape
+from splitgraph.engine.postgres.engine import DEFAULT_FETCH_SIZE, SG_UD_FLAG, get_change_key
 from splitgraph.exceptions import ObjectIndexingError
 
 if TYPE_CHECKING:
+    import numpy as np
+
     from splitgraph.core.image import Image
     from splitgraph.core.repository import Repository
     from splitgraph.engine.postgres.engine import PostgresEngine
@@ -44,6 +62,18 @@ if TYPE_CHECKING:
 # of initializing a batch of object applications and not reporting anything at all
 _PROGRESS_EVERY = 5 * 1024 * 1024
 
+# Maximum number of row batches that a parallel fragment scan can buffer in memory
+# before the consumer catches up with it.
+_MAX_BUFFERED_BATCHES = 2
+
+# Types that have to be sorted with the "C" collation (by code point) on the engine so that
+# Python orders their values the same way (this includes arrays of them).
+_TEXT_TYPES = {"text", "character varying", "varchar", "character", "char", "bpchar", "name"}
+
+
+def _is_text_type(pg_type: str) -> bool:
+    return pg_type.split("(", 1)[0].split("[", 1)[0].strip() in _TEXT_TYPES
+
 
 def _generate_select_query(
     engine: "PostgresEngine",
@@ -51,6 +81,9 @@ def _generate_select_query(
     columns: Sequence[str],
     qual_sql: Optional[Composable] = None,
     qual_args: Optional[Tuple] = None,
+    order_by: Optional[Sequence[str]] = None,
+    descending: bool = False,
+    text_columns: Sequence[str] = (),
 ) -> bytes:
     cur = engine.connection.cursor()
 
@@ -58,7 +91,18 @@ def _generate_select_query(
         SQL("SELECT ")
         + SQL(",").join(Identifier(c) for c in columns)
         + SQL(" FROM " + table.decode("utf-8"))
-        + (SQL(" WHERE ") + qual_sql if qual_args else SQL(""))
+        + (SQL(" WHERE ") + qual_sql if qual_sql is not None else SQL(""))
+        + (
+            SQL(" ORDER BY ")
+            + SQL(",").join(
+                Identifier(c)
+                + (SQL(' COLLATE "C"') if c in text_columns else SQL(""))
+                + (SQL(" DESC") if descending else SQL(""))
+                for c in order_by
+            )
+            if order_by
+            else SQL("")
+        )
     )
     query = cur.mogrify(query, qual_args)
 
@@ -76,6 +120,48 @@ def _generate_table_names(engine: "PostgresEngine", schema: str, tables: List[st
     return result
 
 
+def _put_until_stopped(batches: "Queue[Any]", item: Any, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            batches.put(item, timeout=0.1)
+            return True
+        except Full:
+            continue
+    return False
+
+
+def _stream_query(
+    engine: "PostgresEngine",
+    query: bytes,
+    fetch_size: int,
+    batches: "Queue[Any]",
+    stop: threading.Event,
+) -> None:
+    # Runs in a worker thread: pass batches of rows (and finally None or an exception)
+    # to the consumer, giving up if the consumer has stopped reading.
+    try:
+        if stop.is_set():
+            return
+        with closing(engine.run_sql_streaming(query, fetch_size=fetch_size)) as stream:
+            for batch in stream:
+                if not _put_until_stopped(batches, batch, stop):
+                    return
+    except Exception as e:
+        _put_until_stopped(batches, e, stop)
+        return
+    _put_until_stopped(batches, None, stop)
+
+
+def _consume_batches(batches: "Queue[Any]") -> Iterator[Tuple]:
+    while True:
+        batch = batches.get()
+        if batch is None:
+            return
+        if isinstance(batch, Exception):
+            raise batch
+        yield from batch
+
+
 def _delete_temporary_table(engine: "PostgresEngine", schema: str, table: str) -> None:
     """
     Workaround for Multicorn deadlocks at end_scan time, supposed to be run in a separate thread.
@@ -146,33 +232,57 @@ class QueryPlan:
 
         self.required_objects = table.objects
         self.tracer.log("resolve_objects")
-        self.filtered_objects = self.object_manager.filter_fragments(
-            self.required_objects, table, quals
-        )
-        # Estimate the number of rows in the filtered objects
-        self.estimated_rows = sum(
-            [
-                o.rows_inserted - o.rows_deleted
-                for o in self.object_manager.get_object_meta(self.filtered_objects).values()
-            ]
-        )
-        self.tracer.log("filter_objects")
-
-        # Prepare a list of objects to query
-
-        # Special fast case: single-chunk groups can all be batched together
-        # and queried directly without having to copy them to a staging table.
-        # We also grab all fragments from multiple-fragment groups and batch them together
-        # for future application.
-        #
-        # Technically, we could do multiple batches of application for these groups
-        # (apply first batch to the staging table, extract the result, clean the table,
-        # apply next batch etc): in the middle of it we could also talk back to the object
-        # manager and release the objects that we don't need so that they can be garbage
-        # collected. The tradeoff is that we perform more calls to apply_fragments (hence
-        # more roundtrips).
-        self.non_singletons, self.singletons = self._extract_singleton_fragments()
 
+        # Fragment filtering and grouping only depend on the table's objects and the quals,
+        # so we can reuse them from the engine-wide plan cache that's shared between sessions.
+        plan_key = _get_persistent_plan_key(table, quals)
+        cached_plan = self.object_manager.get_cached_query_plan(plan_key)
+        if cached_plan and cached_plan.get("version") != _PLAN_FORMAT_VERSION:
+            # Plan stored by a different version of Splitgraph: recompute it.
+            cached_plan = None
+        if cached_plan:
+            self.filtered_objects = cached_plan["filtered_objects"]
+            self.estimated_rows = cached_plan["estimated_rows"]
+            self.non_singleton_groups = cached_plan["non_singleton_groups"]
+            self.singletons = cached_plan["singletons"]
+            self.tracer.log("load_cached_plan")
+        else:
+            self.filtered_objects = self.object_manager.filter_fragments(
+                self.required_objects, table, quals
+            )
+            # Estimate the number of rows in the filtered objects
+            self.estimated_rows = sum(
+                [
+                    o.rows_inserted - o.rows_deleted
+                    for o in self.object_manager.get_object_meta(self.filtered_objects).values()
+                ]
+            )
+            self.tracer.log("filter_objects")
+
+            # Prepare a list of objects to query
+
+            # Special fast case: single-chunk groups can all be batched together
+            # and queried directly without having to copy them to a staging table.
+            # We also keep the multiple-fragment groups: by default, they all get batched
+            # together and applied to one staging table. In incremental mode (see
+            # Table.query_indirect), each group is applied to its own staging table and
+            # its objects are released before the next group is processed, at the cost
+            # of more calls to apply_fragments (hence more roundtrips).
+            self.non_singleton_groups, self.singletons = self._extract_singleton_fragments()
+
+            self.object_manager.cache_query_plan(
+                plan_key,
+                self.required_objects,
+                {
+                    "version": _PLAN_FORMAT_VERSION,
+                    "filtered_objects": self.filtered_objects,
+                    "estimated_rows": self.estimated_rows,
+                    "non_singleton_groups": self.non_singleton_groups,
+                    "singletons": self.singletons,
+                },
+            )
+
+        self.non_singletons = [o for group in self.non_singleton_groups for o in group]
         logging.info(
             "Fragment grouping: %d singletons, %d non-singletons",
             len(self.singletons),
@@ -192,29 +302,35 @@ class QueryPlan:
             self.singleton_queries = []
         self.tracer.log("generate_singleton_queries")
 
-    def _extract_singleton_fragments(self) -> Tuple[List[str], List[str]]:
-        # Get fragment boundaries (min-max PKs of every fragment).
-        table_pk = [(t[1], t[2]) for t in self.table.table_schema if t[3]]
-        if not table_pk:
-            table_pk = [(t[1], t[2]) for t in self.table.table_schema]
-        object_pks = self.object_manager.get_min_max_pks(self.filtered_objects, table_pk)
-        # Group fragments into non-overlapping groups: those can be applied independently of each other.
-        object_groups = get_chunk_groups(
-            [
-                (object_id, min_max[0], min_max[1])
-                for object_id, min_max in zip(self.filtered_objects, object_pks)
-            ]
-        )
+    def _extract_singleton_fragments(self) -> Tuple[List[List[str]], List[str]]:
+        # Get non-overlapping groups of fragments (those can be applied independently of each
+        # other) that were precomputed for the whole table and restrict them to the fragments
+        # that we actually need to query.
+        filtered_objects = set(self.filtered_objects)
+        object_groups = []
+        for group in self.object_manager.get_table_chunk_groups(self.table):
+            chunks = [c for c in group if c[0] in filtered_objects]
+            if len(chunks) == len(group):
+                object_groups.append(chunks)
+            elif chunks:
+                # The fragments that were filtered out might have been the ones linking
+                # the rest of the group together, so regroup the remaining fragments.
+                object_groups.extend(get_chunk_groups(chunks))
+
         singletons: List[str] = []
-        non_singletons: List[str] = []
-        for group in object_groups:
-            if len(group) == 1:
-                singletons.append(group[0][0])
+        non_singleton_groups: List[List[str]] = []
+        for chunks in object_groups:
+            if len(chunks) == 1:
+                singletons.append(chunks[0][0])
             else:
-                non_singletons.extend(object_id for object_id, _, _ in group)
-        return non_singletons, singletons
+                non_singleton_groups.append([object_id for object_id, _, _ in chunks])
+        return non_singleton_groups, singletons
 
 
+# Version of the format of plans stored in the engine-wide plan cache. Bump this when
+# changing what gets stored, so that plans stored in the old format aren't used.
+_PLAN_FORMAT_VERSION = 2
+
 QueryPlanCacheKey = Tuple[Optional[Tuple[Tuple[Tuple[str, str, Any]]]], Tuple[str]]
 
 
@@ -231,6 +347,28 @@ def _get_plan_cache_key(quals: Optional[Quals], columns: Sequence[str]) -> Query
     return quals, columns
 
 
+def _get_persistent_plan_key(table: "Table", quals: Optional[Quals]) -> str:
+    """
+    Get a key for the engine-wide query plan cache. Unlike the in-memory cache key,
+    this one doesn't include the columns (they don't affect fragment filtering) and
+    normalizes the order of the quals so that equivalent queries share a plan.
+    """
+    normalized_quals = (
+        sorted(sorted(repr(tuple(q)) for q in clause) for clause in quals) if quals else None
+    )
+    return sha256(
+        repr(
+            (
+                _PLAN_FORMAT_VERSION,
+                table.image.image_hash,
+                table.table_name,
+                tuple(table.objects),
+                normalized_quals,
+            )
+        ).encode("utf-8")
+    ).hexdigest()
+
+
 def merge_index_data(current_index: Dict[str, Any], new_index: Dict[str, Any]):
     for index_type, index_data in new_index.items():
         for col_name, col_index_data in index_data.items():
@@ -355,7 +493,11 @@ class Table:
             engine.run_sql(query, args)
 
     def query_indirect(
-        self, columns: List[str], quals: Optional[Quals]
+        self,
+        columns: List[str],
+        quals: Optional[Quals],
+        incremental: bool = False,
+        extra_columns: Optional[Sequence[str]] = None,
     ) -> Tuple[Iterator[bytes], Callable, QueryPlan]:
         """
         Run a read-only query against this table without materializing it. Instead of
@@ -372,10 +514,20 @@ class Table:
         :param columns: List of columns from this table to fetch
         :param quals: List of qualifiers in conjunctive normal form. See the documentation for
             FragmentManager.filter_fragments for the actual format.
+        :param incremental: Apply each group of overlapping fragments to its own staging table,
+            only downloading/claiming its objects right before that and releasing them right
+            after. The staging table gets deleted when the caller asks for the next query,
+            so the caller must be done reading from it by then. This means that the peak
+            staging area size and the number of objects kept in the cache depend on the largest
+            group rather than on the whole table.
+        :param extra_columns: Other columns that the caller will read from the staging tables
+            (e.g. to sort on). Staging tables only have the requested columns, the columns
+            used in the qualifiers and the columns that fragments are applied on.
         :return: Generator of queries (bytes), a callback and a query plan object (containing stats
             that are fully populated after the callback has been called to end the query).
         """
         plan = self.get_query_plan(quals, columns)
+        staging_schema = self._get_staging_schema(plan, extra_columns)
         required_objects = plan.filtered_objects
         logging.info(
             "Using %d fragments (%s) to satisfy the query",
@@ -402,7 +554,7 @@ class Table:
 
             # There's a slight issue: we can't use temporary tables if we're returning
             # pointers to tables since the caller might be in a different session.
-            staging_table = self._create_staging_table()
+            staging_table = self._create_staging_table(staging_schema)
             engine = self.repository.object_engine
 
             def _f(from_fdw=False):
@@ -436,27 +588,14 @@ class Table:
             nonlocal release_callback
             release_callback.append(_f)
 
-            # Apply the fragments (just the parts that match the qualifiers) to the staging area
-            if quals:
-                engine.apply_fragments(
-                    [(SPLITGRAPH_META_SCHEMA, o) for o in plan.non_singletons],
-                    SPLITGRAPH_META_SCHEMA,
-                    staging_table,
-                    extra_quals=plan.sql_quals,
-                    extra_qual_args=plan.sql_qual_vals,
-                    schema_spec=self.table_schema,
-                )
-            else:
-                engine.apply_fragments(
-                    [(SPLITGRAPH_META_SCHEMA, o) for o in plan.non_singletons],
-                    SPLITGRAPH_META_SCHEMA,
-                    staging_table,
-                    schema_spec=self.table_schema,
-                )
+            self._apply_to_staging_table(staging_table, plan.non_singletons, plan, staging_schema)
             engine.commit()
             table_name = _generate_table_names(engine, SPLITGRAPH_META_SCHEMA, [staging_table])[0]
             yield table_name
 
+        if incremental:
+            return self._query_indirect_incremental(plan, staging_schema)
+
         with object_manager.ensure_objects(
             self, objects=required_objects, defer_release=True, tracer=plan.tracer
         ) as eo_result:
@@ -467,36 +606,256 @@ class Table:
                 plan,
             )
 
+    def _query_indirect_incremental(
+        self, plan: QueryPlan, staging_schema: TableSchema
+    ) -> Tuple[Iterator[bytes], Callable, QueryPlan]:
+        object_manager = self.repository.objects
+        engine = self.repository.object_engine
+
+        # Only claim the singletons upfront: objects in each group of overlapping fragments
+        # get claimed just before the group is applied and released right after that.
+        with object_manager.ensure_objects(
+            self, objects=plan.singletons, defer_release=True, tracer=plan.tracer
+        ) as eo_result:
+            _, release_callback = cast(Tuple, eo_result)
+
+        def _generate_group_queries():
+            for group in plan.non_singleton_groups:
+                with object_manager.ensure_objects(
+                    self, objects=group, defer_release=True, tracer=plan.tracer
+                ) as eo_result:
+                    _, group_release_callback = cast(Tuple, eo_result)
+
+                staging_table = self._create_staging_table(staging_schema)
+                try:
+                    try:
+                        self._apply_to_staging_table(staging_table, group, plan, staging_schema)
+                        engine.commit()
+                    finally:
+                        group_release_callback()
+                    yield _generate_table_names(engine, SPLITGRAPH_META_SCHEMA, [staging_table])[0]
+                finally:
+                    # We get here when the caller asks for the next query (so it's done
+                    # reading this table) or when the generator gets closed.
+                    engine.delete_table(SPLITGRAPH_META_SCHEMA, staging_table)
+                    engine.commit()
+
+        group_queries = _generate_group_queries()
+        release_callback.append(lambda **kwargs: group_queries.close())
+
+        return (
+            itertools.chain(plan.singleton_queries, group_queries),
+            cast(Callable, release_callback),
+            plan,
+        )
+
+    def _get_staging_schema(
+        self, plan: QueryPlan, extra_columns: Optional[Sequence[str]] = None
+    ) -> TableSchema:
+        # Staging tables only need the columns that the caller reads, the columns that
+        # the qualifiers get rechecked on and the change key (that fragments are applied on),
+        # so that we don't write out columns of wide tables that the query doesn't need.
+        columns = set(plan.columns) | set(extra_columns or [])
+        columns.update(q[0] for clause in plan.quals or [] for q in clause)
+        columns.update(c for c, _ in get_change_key(self.table_schema))
+        return [c for c in self.table_schema if c.name in columns]
+
+    def _apply_to_staging_table(
+        self, staging_table: str, objects: List[str], plan: QueryPlan, schema_spec: TableSchema
+    ) -> None:
+        # Apply the fragments (just the parts that match the qualifiers) to the staging area
+        engine = self.repository.object_engine
+        if plan.quals:
+            engine.apply_fragments(
+                [(SPLITGRAPH_META_SCHEMA, o) for o in objects],
+                SPLITGRAPH_META_SCHEMA,
+                staging_table,
+                extra_quals=plan.sql_quals,
+                extra_qual_args=plan.sql_qual_vals,
+                schema_spec=schema_spec,
+            )
+        else:
+            engine.apply_fragments(
+                [(SPLITGRAPH_META_SCHEMA, o) for o in objects],
+                SPLITGRAPH_META_SCHEMA,
+                staging_table,
+                schema_spec=schema_spec,
+            )
+
     @contextmanager
-    def query_lazy(self, columns: List[str], quals: Quals) -> Iterator[Iterator[Dict[str, Any]]]:
+    def query_lazy(
+        self,
+        columns: List[str],
+        quals: Quals,
+        workers: int = 1,
+        order_by_pk: bool = False,
+        fetch_size: int = DEFAULT_FETCH_SIZE,
+        incremental: bool = False,
+        order_by: Optional[Sequence[str]] = None,
+        descending: bool = False,
+    ) -> Iterator[Iterator[Dict[str, Any]]]:
         """
         Run a read-only query against this table without materializing it.
 
         :param columns: List of columns from this table to fetch
         :param quals: List of qualifiers in conjunctive normal form. See the documentation for
             FragmentManager.filter_fragments for the actual format.
+        :param workers: Number of engine connections to use to scan fragments that don't
+            overlap with other fragments. At most this many fragments are buffered in memory.
+        :param order_by_pk: Return the results ordered by the table's primary key (or all
+            columns if the table doesn't have a primary key).
+        :param fetch_size: Number of rows to fetch from the engine in one roundtrip. Results
+            are read through server-side cursors, so memory usage doesn't depend on the
+            size of the fragments.
+        :param incremental: Apply groups of overlapping fragments one by one, see
+            `query_indirect`.
+        :param order_by: Return the results ordered by these columns instead. Each fragment
+            is sorted by the engine and the fragments are then merged. Unless the columns
+            are a prefix of the primary key, all fragments are read at the same time on the
+            main connection (`workers` is ignored), `incremental` isn't supported and
+            the fetch size is split between the fragments. NULLs come last (first if
+            `descending` is set), like in PostgreSQL. Text columns are sorted by code point
+            (the "C" collation) rather than the database's collation, like Python does.
+        :param descending: Sort in descending order. Not supported in incremental mode.
         :return: Generator of dictionaries of results.
         """
 
-        table_gen, release_callback, plan = self.query_indirect(columns, quals)
+        pk_columns = [c.name for c in self.table_schema if c.is_pk] or [
+            c.name for c in self.table_schema
+        ]
+        sort_columns = pk_columns if order_by_pk else list(order_by or [])
+
+        # Singleton fragments don't overlap with each other and are in the PK order
+        # of their groups (and so are the groups of overlapping fragments), so when sorting
+        # by a prefix of the PK, their results can just be concatenated instead of being merged.
+        concatenate_fragments = sort_columns == pk_columns[: len(sort_columns)]
+        if incremental and sort_columns and (descending or not concatenate_fragments):
+            raise ValueError(
+                "Incremental mode only supports ascending order on a prefix of the primary key!"
+            )
+
+        table_gen, release_callback, plan = self.query_indirect(
+            columns, quals, incremental=incremental, extra_columns=sort_columns
+        )
         engine = self.repository.object_engine
 
+        select_columns = list(plan.columns) + [c for c in sort_columns if c not in plan.columns]
+        sort_indices = [select_columns.index(c) for c in sort_columns]
+
+        # Rows from different fragments get merged by comparing them in Python, so the engine
+        # has to sort text columns the same way.
+        column_types = {c.name: c.pg_type for c in self.table_schema}
+        text_columns = [c for c in sort_columns if _is_text_type(column_types.get(c, ""))]
+
+        def _fetch_rows(
+            tables: Iterable[bytes], fetch_workers: Optional[int], batch_size: int = fetch_size
+        ) -> Iterator[Tuple]:
+            queries = (
+                _generate_select_query(
+                    engine,
+                    table,
+                    select_columns,
+                    plan.sql_quals if plan.quals else None,
+                    plan.sql_qual_vals,
+                    order_by=sort_columns,
+                    descending=descending,
+                    text_columns=text_columns,
+                )
+                for table in tables
+            )
+            if fetch_workers is None:
+                # Use the main connection.
+                for query in queries:
+                    for batch in engine.run_sql_streaming(query, fetch_size=batch_size):
+                        yield from batch
+                return
+
+            # Fragments get scanned on their own connections, keeping at most
+            # fetch_workers scans in flight, and are returned in their original order.
+            # Each scan buffers at most _MAX_BUFFERED_BATCHES batches of rows. The worker
+            # connections only read committed objects and are closed (rolling back their
+            # read-only transactions) once we're done.
+            stop = threading.Event()
+            pending: Deque["Queue[Any]"] = deque()
+            try:
+                with ThreadPoolExecutor(max_workers=fetch_workers) as tpe:
+                    try:
+                        for query in queries:
+                            batches: "Queue[Any]" = Queue(maxsize=_MAX_BUFFERED_BATCHES)
+                            tpe.submit(_stream_query, engine, query, batch_size, batches, stop)
+                            pending.append(batches)
+                            if len(pending) >= fetch_workers:
+                                yield from _consume_batches(pending.popleft())
+                        while pending:
+                            yield from _consume_batches(pending.popleft())
+                    finally:
+                        stop.set()
+            finally:
+                engine.close_others()
+
+        def _sort_key(row: Tuple) -> Tuple:
+            return tuple((row[i] is None, row[i]) for i in sort_indices)
+
         def _generate_results():
-            for table in table_gen:
-                result = engine.run_sql(
-                    _generate_select_query(
-                        engine, table, plan.columns, plan.sql_quals, plan.sql_qual_vals
-                    )
+            singleton_tables = list(itertools.islice(table_gen, len(plan.singleton_queries)))
+
+            if sort_columns and not concatenate_fragments:
+                # K-way merge of all fragments. Materializing the staging table commits
+                # the transaction on the main connection, which invalidates cursors open on it,
+                # so we have to do that before we start reading from the singletons.
+                tables = list(table_gen) + singleton_tables
+                # Cursors on all fragments are open at the same time: split the fetch size
+                # between them so that we only buffer about fetch_size rows.
+                batch_size = max(1, fetch_size // max(len(tables), 1))
+                rows = heapq.merge(
+                    *(_fetch_rows([t], None, batch_size) for t in tables),
+                    key=_sort_key,
+                    reverse=descending,
+                )
+            else:
+                if descending:
+                    singleton_tables.reverse()
+                # Materializing staging tables commits the transaction on the main connection,
+                # which invalidates cursors open on it. When returning ordered results, we read
+                # from singletons and staging tables at the same time, so in incremental mode
+                # (multiple staging tables) singletons have to be read from a different connection.
+                singleton_rows = _fetch_rows(
+                    singleton_tables,
+                    workers if workers > 1 or (sort_columns and incremental) else None,
                 )
-                for row in result:
-                    yield {c: v for c, v in zip(columns, row)}
+                staging_rows = _fetch_rows(table_gen, None)
+
+                if sort_columns:
+                    # Start with the staging table so that in non-incremental mode,
+                    # it gets materialized before cursors on singletons are opened.
+                    rows = heapq.merge(
+                        staging_rows, singleton_rows, key=_sort_key, reverse=descending
+                    )
+                else:
+                    rows = itertools.chain(singleton_rows, staging_rows)
 
+            for row in rows:
+                yield {c: v for c, v in zip(columns, row)}
+
+        results = _generate_results()
         try:
-            yield _generate_results()
+            yield results
         finally:
+            # Make sure the worker threads are done before we release the objects.
+            results.close()
             release_callback()
 
-    def query(self, columns: List[str], quals: Quals):
+    def query(
+        self,
+        columns: List[str],
+        quals: Quals,
+        workers: int = 1,
+        order_by_pk: bool = False,
+        fetch_size: int = DEFAULT_FETCH_SIZE,
+        incremental: bool = False,
+        order_by: Optional[Sequence[str]] = None,
+        descending: bool = False,
+    ):
         """
         Run a read-only query against this table without materializing it.
 
@@ -506,11 +865,171 @@ class Table:
         :param columns: List of columns from this table to fetch
         :param quals: List of qualifiers in conjunctive normal form. See the documentation for
             FragmentManager.filter_fragments for the actual format.
+        :param workers: Number of engine connections to use to scan fragments.
+        :param order_by_pk: Return the results ordered by the table's primary key.
+        :param fetch_size: Number of rows to fetch from the engine in one roundtrip.
+        :param incremental: Apply groups of overlapping fragments one by one.
+        :param order_by: Return the results ordered by these columns.
+        :param descending: Sort in descending order.
         :return: List of dictionaries of results
         """
-        with self.query_lazy(columns, quals) as result:
+        with self.query_lazy(
+            columns,
+            quals,
+            workers=workers,
+            order_by_pk=order_by_pk,
+            fetch_size=fetch_size,
+            incremental=incremental,
+            order_by=order_by,
+            descending=descending,
+        ) as result:
             return list(result)
 
+    @contextmanager
+    def query_columns_lazy(
+        self, columns: List[str], quals: Quals
+    ) -> Iterator[Iterator[Dict[str, "np.ndarray"]]]:
+        """
+        Run a read-only query against this table without materializing it and return
+        the results as batches of NumPy arrays (one batch per scanned fragment) instead
+        of dictionaries. This doesn't create Python objects for every row.
+        Requires NumPy.
+
+        :param columns: List of columns from this table to fetch
+        :param quals: List of qualifiers in conjunctive normal form. See the documentation for
+            FragmentManager.filter_fragments for the actual format.
+        :return: Generator of dictionaries of column name -> NumPy array.
+        """
+        table_gen, release_callback, plan = self.query_indirect(columns, quals)
+        engine = self.repository.object_engine
+
+        def _generate_batches():
+            for table in table_gen:
+                yield engine.run_sql_columnar(
+                    _generate_select_query(
+                        engine,
+                        table,
+                        plan.columns,
+                        plan.sql_quals if plan.quals else None,
+                        plan.sql_qual_vals,
+                    )
+                )
+
+        try:
+            yield _generate_batches()
+        finally:
+            release_callback()
+
+    def query_columns(self, columns: List[str], quals: Quals) -> Dict[str, "np.ndarray"]:
+        """
+        Run a read-only query against this table without materializing it and return
+        the results as NumPy arrays.
+
+        This is a wrapper around query_columns_lazy() that concatenates all batches.
+
+        :param columns: List of columns from this table to fetch
+        :param quals: List of qualifiers in conjunctive normal form. See the documentation for
+            FragmentManager.filter_fragments for the actual format.
+        :return: Dictionary of column name -> NumPy array
+        """
+        import numpy as np
+
+        with self.query_columns_lazy(columns, quals) as result:
+            batches = list(result)
+        return {
+            c: np.concatenate([b[c] for b in batches]) if batches else np.empty(0, dtype=object)
+            for c in columns
+        }
+
+    def aggregate(
+        self, aggregates: Sequence[Aggregate], quals: Optional[Quals] = None
+    ) -> List[Any]:
+        """
+        Calculate aggregates over this table without materializing it.
+
+        If there are no qualifiers, fragments that don't overlap with other fragments and
+        don't delete anything are answered from the statistics recorded for them at commit
+        time (number of rows, numbers of NULLs, range and sum indexes) without being
+        downloaded. Other fragments are aggregated on the engine, applying groups of
+        overlapping fragments to a staging table first.
+
+        :param aggregates: List of (function, column) tuples, where function is one of
+            `count`, `min`, `max` or `sum` and column is None for COUNT(*). Like in the
+            range index, MIN/MAX of text columns use the C collation.
+        :param quals: List of qualifiers in conjunctive normal form. See the documentation for
+            FragmentManager.filter_fragments for the actual format.
+        :return: List of aggregate values (in the same order as `aggregates`)
+        """
+        validate_aggregates(aggregates, self.table_schema)
+        columns = sorted({c for _, c in aggregates if c is not None}) or [self.table_schema[0].name]
+        plan = self.get_query_plan(quals, columns)
+        object_manager = self.repository.objects
+        engine = self.repository.object_engine
+
+        partials: List[Sequence[Any]] = []
+        to_scan: List[str] = []
+        if quals:
+            # Statistics are for whole fragments, so they can't be used with qualifiers.
+            to_scan = list(plan.singletons)
+        else:
+            object_meta = object_manager.get_object_meta(plan.singletons)
+            for object_id in plan.singletons:
+                partial = get_fragment_aggregates(
+                    object_meta[object_id], aggregates, self.table_schema
+                )
+                if partial is None:
+                    to_scan.append(object_id)
+                else:
+                    partials.append(partial)
+        plan.tracer.log("aggregate_metadata")
+        logging.info(
+            "Answered aggregates for %d fragment(s) from metadata, scanning %d fragment(s)",
+            len(partials),
+            len(to_scan) + len(plan.non_singletons),
+        )
+
+        if not to_scan and not plan.non_singletons:
+            return combine_aggregates(aggregates, partials)
+
+        def _aggregate_table(table: str, is_object: bool) -> Sequence[Any]:
+            query = (
+                SQL("SELECT ")
+                + get_aggregate_expressions(aggregates, self.table_schema)
+                + SQL(" FROM {}.{}").format(Identifier(SPLITGRAPH_META_SCHEMA), Identifier(table))
+            )
+            conditions = []
+            if is_object:
+                # Skip deletion markers (fragments scanned directly don't delete anything
+                # that we're querying).
+                conditions.append(SQL("{}").format(Identifier(SG_UD_FLAG)))
+            if plan.quals:
+                conditions.append(SQL("(") + plan.sql_quals + SQL(")"))
+            if conditions:
+                query += SQL(" WHERE ") + SQL(" AND ").join(conditions)
+            return cast(
+                Sequence[Any],
+                engine.run_sql(query, plan.sql_qual_vals, return_shape=ResultShape.ONE_MANY),
+            )
+
+        with object_manager.ensure_objects(
+            self, objects=to_scan + plan.non_singletons, tracer=plan.tracer
+        ):
+            partials.extend(_aggregate_table(object_id, True) for object_id in to_scan)
+            if plan.non_singletons:
+                staging_schema = self._get_staging_schema(plan)
+                staging_table = self._create_staging_table(staging_schema)
+                try:
+                    self._apply_to_staging_table(
+                        staging_table, plan.non_singletons, plan, staging_schema
+                    )
+                    partials.append(_aggregate_table(staging_table, False))
+                finally:
+                    engine.delete_table(SPLITGRAPH_META_SCHEMA, staging_table)
+                    engine.commit()
+        plan.tracer.log("aggregate_fragments")
+
+        return combine_aggregates(aggregates, partials)
+
     def get_size(self) -> int:
         """
         Get the physical size used by the table's objects (including those shared with other tables).
@@ -593,28 +1112,31 @@ class Table:
                 logging.warning(message)
 
         # Download the objects to reindex them
+        reindexed_objects = []
         with object_manager.ensure_objects(self, objects=list(valid_objects)):
             for object_id in tqdm(valid_objects, unit="objs", ascii=SG_CMD_ASCII):
-                current_index = valid_objects[object_id].object_index
+                new_index = deepcopy(valid_objects[object_id].object_index)
 
                 index_struct = object_manager.generate_object_index(
                     object_id, self.table_schema, changeset=None, extra_indexes=extra_indexes
                 )
 
-                # Update the index in-place and overwrite it
-                merge_index_data(current_index, index_struct)
+                # Merge the new index into a copy of the old one (so that if indexing fails,
+                # the old metadata isn't changed) and overwrite it
+                merge_index_data(new_index, index_struct)
+                reindexed_objects.append(valid_objects[object_id]._replace(object_index=new_index))
 
-        object_manager.register_objects(list(valid_objects.values()))
+        object_manager.register_objects(reindexed_objects)
         return list(valid_objects)
 
-    def _create_staging_table(self) -> str:
+    def _create_staging_table(self, schema_spec: TableSchema) -> str:
         staging_table = get_temporary_table_id()
 
         logging.debug("Using staging table %s", staging_table)
         self.repository.object_engine.create_table(
             schema=SPLITGRAPH_META_SCHEMA,
             table=staging_table,
-            schema_spec=self.table_schema,
+            schema_spec=schema_spec,
             unlogged=True,
         )
         return staging_table
@@ -672,6 +672,9 @@ def get_engine(
             registry=is_registry,
             check_version=check_version,
             in_fdw=use_fdw_params and name == "LOCAL",
+            # Engines used by the LQ FDW get reused by many short scans in the same backend,
+            # so don't reconnect to them after every commit.
+            keep_connection=use_fdw_params,
         )
     return _ENGINES[name]
 
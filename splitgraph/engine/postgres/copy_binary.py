@@ -0,0 +1,191 @@
+"""
+Decoder for the PostgreSQL binary COPY format that turns query results into NumPy arrays
+(one per column) without creating Python objects for every row.
+
+Values of fixed-width types (numbers, booleans, dates and timestamps) are gathered
+straight out of the COPY buffer with NumPy. Text-like values still become Python
+strings (stored in object arrays). Other types aren't supported: the caller has to
+cast them to text before running the COPY.
+"""
+import json
+import struct
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+_SIGNATURE = b"PGCOPY\n\377\r\n\0"
+
+# PostgreSQL epoch for dates and timestamps
+_PG_EPOCH_DAYS = np.datetime64("2000-01-01", "D")
+_PG_EPOCH_US = np.datetime64("2000-01-01", "us")
+
+# Type OIDs of values that are stored in the binary format as big-endian numbers.
+# Timestamps are microseconds since the PG epoch (timestamptz ones are in UTC)
+# and dates are days since the PG epoch.
+_FIXED_WIDTH_TYPES: Dict[int, str] = {
+    16: "?",  # boolean
+    21: ">i2",  # smallint
+    23: ">i4",  # integer
+    20: ">i8",  # bigint
+    26: ">u4",  # oid
+    700: ">f4",  # real
+    701: ">f8",  # double precision
+    1082: ">i4",  # date
+    1114: ">i8",  # timestamp
+    1184: ">i8",  # timestamptz
+}
+
+# Type OIDs of values that are stored in the binary format as UTF-8 text.
+_TEXT_TYPES = {
+    19,  # name
+    25,  # text
+    114,  # json
+    1042,  # char
+    1043,  # varchar
+    3802,  # jsonb (prefixed with a version byte)
+}
+
+TEXT_TYPE_OID = 25
+
+
+def is_supported_type(type_oid: int) -> bool:
+    """Check if values of a given PG type can be decoded from the binary COPY format."""
+    return type_oid in _FIXED_WIDTH_TYPES or type_oid in _TEXT_TYPES
+
+
+def _get_fixed_row_layout(
+    data: bytes, start: int, type_oids: Sequence[int]
+) -> Tuple[np.ndarray, np.ndarray]:
+    # Fast path: if all columns are fixed-width and there are no NULLs, every
+    # row has the same size and we can find field offsets without walking the buffer.
+    widths = [np.dtype(_FIXED_WIDTH_TYPES[o]).itemsize for o in type_oids]
+    row_size = 2 + sum(4 + w for w in widths)
+    body_size = len(data) - start - 2
+    if body_size % row_size:
+        raise ValueError
+    rows = body_size // row_size
+
+    field_starts = np.cumsum([2 + 4] + [4 + w for w in widths[:-1]])
+    offsets = start + np.arange(rows, dtype=np.int64)[:, None] * row_size + field_starts
+    lengths = np.broadcast_to(np.array(widths, dtype=np.int64), (rows, len(widths)))
+
+    # Check the field counts and lengths: a NULL or a mismatch means the layout isn't fixed.
+    buf = np.frombuffer(data, dtype=np.uint8)
+    row_starts = start + np.arange(rows, dtype=np.int64) * row_size
+    field_counts = _gather(buf, row_starts, ">i2")
+    actual_lengths = _gather(buf, (offsets - 4).ravel(), ">i4").reshape(offsets.shape)
+    if (field_counts != len(widths)).any() or (actual_lengths != lengths).any():
+        raise ValueError
+    return offsets, lengths
+
+
+def _walk_rows(data: bytes, start: int, columns: int) -> Tuple[np.ndarray, np.ndarray]:
+    unpack_from = struct.unpack_from
+    offsets: List[int] = []
+    lengths: List[int] = []
+    pos = start
+    while True:
+        (fields,) = unpack_from(">h", data, pos)
+        pos += 2
+        if fields == -1:
+            break
+        if fields != columns:
+            raise ValueError("Expected %d fields in a COPY row, got %d" % (columns, fields))
+        for _ in range(columns):
+            (length,) = unpack_from(">i", data, pos)
+            pos += 4
+            offsets.append(pos)
+            lengths.append(length)
+            if length > 0:
+                pos += length
+    return (
+        np.array(offsets, dtype=np.int64).reshape(-1, columns),
+        np.array(lengths, dtype=np.int64).reshape(-1, columns),
+    )
+
+
+def _gather(buf: np.ndarray, offsets: np.ndarray, dtype: str) -> np.ndarray:
+    width = np.dtype(dtype).itemsize
+    values = buf[offsets[:, None] + np.arange(width)]
+    return np.ascontiguousarray(values).view(dtype).reshape(-1)
+
+
+def _decode_fixed_width(
+    buf: np.ndarray, offsets: np.ndarray, lengths: np.ndarray, type_oid: int
+) -> np.ndarray:
+    nulls = lengths == -1
+    values = _gather(buf, offsets[~nulls], _FIXED_WIDTH_TYPES[type_oid])
+
+    if type_oid == 1082:
+        values = _PG_EPOCH_DAYS + values.astype("timedelta64[D]")
+        null_value = np.datetime64("NaT")
+    elif type_oid in (1114, 1184):
+        values = _PG_EPOCH_US + values.astype("timedelta64[us]")
+        null_value = np.datetime64("NaT")
+    elif type_oid == 16:
+        null_value = None
+    else:
+        values = values.astype(values.dtype.newbyteorder("="))
+        null_value = np.nan
+
+    if not nulls.any():
+        return values
+
+    # Same as Pandas: integers with NULLs become floats and booleans become objects.
+    if values.dtype.kind in "iu":
+        values = values.astype(np.float64)
+    result = np.empty(len(lengths), dtype=values.dtype if null_value is not None else object)
+    result[nulls] = null_value
+    result[~nulls] = values
+    return result
+
+
+def _decode_text(
+    data: bytes, offsets: np.ndarray, lengths: np.ndarray, type_oid: int
+) -> np.ndarray:
+    decode: Callable[[bytes], object]
+    if type_oid == 3802:
+        decode = lambda b: json.loads(b[1:].decode("utf-8"))
+    elif type_oid == 114:
+        decode = lambda b: json.loads(b.decode("utf-8"))
+    else:
+        decode = lambda b: b.decode("utf-8")
+
+    result = np.empty(len(lengths), dtype=object)
+    result[:] = [
+        decode(data[o : o + l]) if l != -1 else None
+        for o, l in zip(offsets.tolist(), lengths.tolist())
+    ]
+    return result
+
+
+def decode_copy_binary(data: bytes, type_oids: Sequence[int]) -> List[np.ndarray]:
+    """
+    Decode the output of `COPY ... TO STDOUT (FORMAT binary)` into NumPy arrays.
+
+    NULLs become NaN (integers with NULLs get converted to floats), NaT or None,
+    similarly to what Pandas does.
+
+    :param data: Output of the COPY command
+    :param type_oids: PG type OIDs of the columns (see `is_supported_type`)
+    :return: List of NumPy arrays, one per column.
+    """
+    if not data.startswith(_SIGNATURE):
+        raise ValueError("Invalid binary COPY signature!")
+    (extension_length,) = struct.unpack_from(">i", data, len(_SIGNATURE) + 4)
+    start = len(_SIGNATURE) + 8 + extension_length
+
+    try:
+        if not all(o in _FIXED_WIDTH_TYPES for o in type_oids):
+            raise ValueError
+        offsets, lengths = _get_fixed_row_layout(data, start, type_oids)
+    except ValueError:
+        offsets, lengths = _walk_rows(data, start, len(type_oids))
+
+    buf = np.frombuffer(data, dtype=np.uint8)
+    return [
+        _decode_fixed_width(buf, offsets[:, i], lengths[:, i], oid)
+        if oid in _FIXED_WIDTH_TYPES
+        else _decode_text(data, offsets[:, i], lengths[:, i], oid)
+        for i, oid in enumerate(type_oids)
+    ]
@@ -14,6 +14,7 @@ from threading import get_ident
 from typing import (
     Any,
     Dict,
+    Generator,
     Iterator,
     List,
     Optional,
@@ -54,6 +55,8 @@ from splitgraph.exceptions import (
 from splitgraph.hooks.mount_handlers import mount_postgres
 
 if TYPE_CHECKING:
+    import numpy as np
+
     # Import the connection object under a different name as it shadows
     # the connection property otherwise
     from psycopg2._psycopg import connection as Connection
@@ -74,7 +77,7 @@ RETRY_DELAY = 5
 RETRY_AMOUNT = 12
 
 # Internal API data
-_API_VERSION = "0.0.1"
+_API_VERSION = "0.1.0"
 
 # Limitations for SQL API that the client uses to talk to the registry. Because
 # we let the client run SQL in a controlled environment on the registry, it allows
@@ -90,6 +93,12 @@ API_MAX_QUERY_LENGTH = 261000
 # number.
 API_MAX_VARIADIC_ARGS = 1000
 
+# Default number of rows to fetch from server-side cursors in one roundtrip.
+DEFAULT_FETCH_SIZE = 10000
+
+# Sequence used to give server-side cursors unique names.
+_CURSOR_IDS = itertools.count()
+
 
 # PG types we can run max/min/comparisons on
 
@@ -192,6 +201,7 @@ class PsycopgEngine(SQLEngine):
         registry: bool = False,
         in_fdw: bool = False,
         check_version: bool = True,
+        keep_connection: bool = False,
     ) -> None:
         """
         :param name: Name of the engine
@@ -199,6 +209,8 @@ class PsycopgEngine(SQLEngine):
         :param pool: If specified, a Psycopg connection pool to use in this engine. By default, parameters
             in conn_params are used so one of them must be specified.
         :param autocommit: If True, the engine will not use transactions for its operation.
+        :param keep_connection: If True, keep the connection open after a commit or a rollback instead
+            of closing it and reconnecting on next use. It's still closed by close().
         """
         super().__init__()
 
@@ -237,6 +249,11 @@ class PsycopgEngine(SQLEngine):
                 dbname=dbname,
                 application_name="sgr " + __version__,
             )
+            if keep_connection:
+                # The pool closes connections that are returned to it unless it has fewer than
+                # minconn idle connections. This is set after creating the pool, since it
+                # otherwise opens minconn connections straight away.
+                self._pool.minconn = 1
         else:
             self._pool = pool
 
@@ -511,6 +528,102 @@ class PsycopgEngine(SQLEngine):
                 return [c[0] for c in cur.fetchall()]
             return cur.fetchall()
 
+    def run_sql_streaming(
+        self,
+        statement: Union[bytes, Composed, str, SQL],
+        arguments: Optional[Sequence[Any]] = None,
+        fetch_size: int = DEFAULT_FETCH_SIZE,
+    ) -> Generator[List[Tuple], None, None]:
+        """
+        Run a query using a server-side cursor and yield its results in batches of
+        at most `fetch_size` rows, so that the whole result doesn't have to be buffered
+        in memory.
+
+        Outside of autocommit mode, the cursor is only valid until the current transaction
+        is committed, so the caller shouldn't commit until it's done consuming the results.
+
+        :param statement: Statement to run
+        :param arguments: Query arguments
+        :param fetch_size: Number of rows to fetch in one roundtrip
+        :return: Generator of lists of tuples
+        """
+        connection = self.connection
+
+        # Named cursors can only be used outside of transactions if they're holdable.
+        with connection.cursor(
+            name="sg_cursor_%d" % next(_CURSOR_IDS), withhold=connection.autocommit
+        ) as cur:
+            try:
+                cur.execute(statement, _convert_vals(arguments) if arguments else None)
+                while True:
+                    batch = cur.fetchmany(fetch_size)
+                    if not batch:
+                        return
+                    yield batch
+            except DatabaseError:
+                self.rollback()
+                raise
+
+    def run_sql_columnar(
+        self,
+        statement: Union[bytes, Composed, str, SQL],
+        arguments: Optional[Sequence[Any]] = None,
+    ) -> Dict[str, "np.ndarray"]:
+        """
+        Run a query and return its results as NumPy arrays, one per column. The results
+        are fetched with `COPY ... TO STDOUT (FORMAT binary)` and decoded without creating
+        Python objects for every row (see `splitgraph.engine.postgres.copy_binary`).
+
+        Columns of types that can't be decoded from the binary format are returned as text.
+        Requires NumPy.
+
+        :param statement: SELECT query to run
+        :param arguments: Query arguments
+        :return: Dictionary of column name -> NumPy array
+        """
+        from splitgraph.engine.postgres.copy_binary import (
+            decode_copy_binary,
+            is_supported_type,
+            TEXT_TYPE_OID,
+        )
+
+        connection = self.connection
+        with connection.cursor() as cur:
+            try:
+                query = SQL(
+                    cur.mogrify(statement, _convert_vals(arguments) if arguments else None)
+                    .decode("utf-8")
+                    .strip()
+                    .rstrip(";")
+                )
+
+                # Get the names and the types of the result's columns.
+                cur.execute(SQL("SELECT * FROM (") + query + SQL(") q LIMIT 0"))
+                names = [c.name for c in cur.description]
+                type_oids = [c.type_code for c in cur.description]
+
+                if not all(is_supported_type(o) for o in type_oids):
+                    query = (
+                        SQL("SELECT ")
+                        + SQL(",").join(
+                            SQL("q.{}").format(Identifier(n))
+                            + (SQL("") if is_supported_type(o) else SQL("::text"))
+                            for n, o in zip(names, type_oids)
+                        )
+                        + SQL(" FROM (")
+                        + query
+                        + SQL(") q")
+                    )
+                    type_oids = [o if is_supported_type(o) else TEXT_TYPE_OID for o in type_oids]
+
+                stream = BytesIO()
+                cur.copy_expert(SQL("COPY (") + query + SQL(") TO STDOUT (FORMAT binary)"), stream)
+            except DatabaseError:
+                self.rollback()
+                raise
+
+        return dict(zip(names, decode_copy_binary(stream.getvalue(), type_oids)))
+
     def get_primary_keys(self, schema: str, table: str) -> List[Tuple[str, str]]:
         """Inspects the Postgres information_schema to get the primary keys for a given table."""
         return cast(
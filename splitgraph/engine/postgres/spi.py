@@ -0,0 +1,308 @@
+"""
+Engine that runs queries through SPI (PostgreSQL's Server Programming Interface) in the
+current backend instead of connecting to the engine through libpq.
+
+This is only usable from code that runs inside of a PL/Python function on the engine
+(for example, `splitgraph_api.lq_aggregate`): PL/Python only lets `plpy` run queries
+while one of its functions is executing. There, it saves connecting back to the same
+engine (which starts another backend) and a socket roundtrip for every query.
+
+This doesn't reduce the number of backends that layered querying uses: Multicorn scans
+have no SPI entry point and the FDW's object engine always connects back to the engine,
+since claiming objects in the cache has to commit. Currently, SPIEngine is only used for
+metadata queries in `lq_aggregate` if the `use_spi` option is set.
+
+SPIEngine reuses PostgresEngine by giving it a stand-in for the Psycopg connection
+pool that hands out a connection-like object backed by `plpy`. Queries are formatted
+on the client side like Psycopg does, but with `plpy` doing the quoting, and the results
+are converted into the same Python types that Psycopg would return for metadata columns.
+"""
+import json
+from collections import namedtuple
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+    cast,
+    TYPE_CHECKING,
+)
+
+import psycopg2
+import psycopg2.errors
+from psycopg2.extensions import adapt
+from psycopg2.extras import Json
+from psycopg2.pool import AbstractConnectionPool
+from psycopg2.sql import Composable, Composed, Identifier, Literal, Placeholder, SQL
+
+from splitgraph.core.output import parse_date, parse_dt
+from splitgraph.engine.postgres.engine import PostgresEngine
+
+if TYPE_CHECKING:
+    import numpy as np
+
+try:
+    import plpy
+except ImportError:
+    # Not running inside of PL/Python on the engine (SPIEngine can't be used).
+    plpy = None
+
+# PL/Python returns values of these types as strings: convert them into what Psycopg returns.
+_RESULT_PARSERS: Dict[int, Callable[[str], Any]] = {
+    114: json.loads,  # json
+    3802: json.loads,  # jsonb
+    1082: parse_date,  # date
+    1114: parse_dt,  # timestamp
+}
+
+_Column = namedtuple("_Column", ["name", "type_code"])
+
+
+def _quote(value: Any) -> str:
+    """Render a query argument as an SQL literal, like Psycopg's adaptation does."""
+    if value is None:
+        return "NULL"
+    if isinstance(value, str):
+        return cast(str, plpy.quote_literal(value))
+    if isinstance(value, Json):
+        return cast(str, plpy.quote_literal(value.dumps(value.adapted)))
+    if isinstance(value, tuple):
+        return "(" + ", ".join(_quote(v) for v in value) + ")"
+    if isinstance(value, list):
+        return "ARRAY[" + ",".join(_quote(v) for v in value) + "]" if value else "'{}'"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return "'\\x%s'::bytea" % bytes(value).hex()
+    # Numbers, booleans, dates and timestamps don't need a connection to be adapted.
+    return cast(str, adapt(value).getquoted().decode("utf-8"))
+
+
+def _as_string(query: Union[bytes, str, Composable]) -> str:
+    if isinstance(query, bytes):
+        return query.decode("utf-8")
+    if isinstance(query, str):
+        return query
+    if isinstance(query, Composed):
+        return "".join(_as_string(q) for q in query.seq)
+    if isinstance(query, SQL):
+        return cast(str, query.string)
+    if isinstance(query, Identifier):
+        return ".".join(plpy.quote_ident(s) for s in query.strings)
+    if isinstance(query, Literal):
+        return _quote(query.wrapped)
+    if isinstance(query, Placeholder):
+        return "%s" if query.name is None else "%%(%s)s" % query.name
+    raise TypeError("Can't convert %r into a query!" % query)
+
+
+def _convert_error(error: Exception) -> Exception:
+    # Raise the same exception that Psycopg would raise, so that the engine's error handling
+    # (e.g. rolling back or detecting a missing splitgraph_meta) works the same way.
+    try:
+        error_class = psycopg2.errors.lookup(getattr(error, "sqlstate", None))
+    except KeyError:
+        error_class = psycopg2.DatabaseError
+    return cast(Exception, error_class(str(error)))
+
+
+class _SPICursor:
+    """Implements the subset of the Psycopg cursor interface that PostgresEngine uses."""
+
+    def __init__(
+        self, connection: "_SPIConnection", name: Optional[str] = None, named_tuples: bool = False
+    ) -> None:
+        self.connection = connection
+        self.name = name
+        self.named_tuples = named_tuples
+        self.description: Optional[List[_Column]] = None
+        self.rowcount = -1
+        self._rows: List[Tuple] = []
+        self._position = 0
+        self._cursor: Any = None
+
+    def __enter__(self) -> "_SPICursor":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._cursor is not None:
+            self._cursor.close()
+            self._cursor = None
+
+    def mogrify(
+        self,
+        query: Union[bytes, str, Composable],
+        args: Optional[Union[Sequence[Any], Dict[str, Any]]] = None,
+    ) -> bytes:
+        statement = _as_string(query)
+        # Like Psycopg, only interpolate (and unescape %%) if there are arguments.
+        if isinstance(args, dict):
+            statement = statement % {k: _quote(v) for k, v in args.items()}
+        elif args is not None:
+            statement = statement % tuple(_quote(v) for v in args)
+        return statement.encode("utf-8")
+
+    def execute(
+        self,
+        query: Union[bytes, str, Composable],
+        args: Optional[Union[Sequence[Any], Dict[str, Any]]] = None,
+    ) -> None:
+        statement = self.mogrify(query, args).decode("utf-8")
+        self.close()
+        self.description = None
+        self._rows = []
+        self._position = 0
+        try:
+            if self.name:
+                # Named cursors fetch results lazily (see PostgresEngine.run_sql_streaming)
+                self._cursor = plpy.cursor(statement)
+                return
+            result = plpy.execute(statement)
+        except plpy.SPIError as e:
+            raise _convert_error(e) from e
+
+        self.rowcount = result.nrows()
+        self._rows = self._convert_result(result)
+
+    def _convert_result(self, result: Any) -> List[Tuple]:
+        try:
+            names = result.colnames()
+        except TypeError:
+            # The statement didn't return any rows (e.g. INSERT without RETURNING)
+            return []
+        types = result.coltypes()
+        self.description = [_Column(n, t) for n, t in zip(names, types)]
+        parsers = [_RESULT_PARSERS.get(t) for t in types]
+
+        make_row: Callable[..., Tuple] = lambda *values: tuple(values)
+        if self.named_tuples:
+            make_row = namedtuple("Record", names, rename=True)  # type: ignore
+
+        return [
+            make_row(
+                *(
+                    p(row[n]) if p is not None and row[n] is not None else row[n]
+                    for n, p in zip(names, parsers)
+                )
+            )
+            for row in result
+        ]
+
+    def fetchmany(self, size: int) -> List[Tuple]:
+        if self._cursor is not None:
+            try:
+                return self._convert_result(self._cursor.fetch(size))
+            except plpy.SPIError as e:
+                raise _convert_error(e) from e
+        rows = self._rows[self._position : self._position + size]
+        self._position += len(rows)
+        return rows
+
+    def fetchone(self) -> Optional[Tuple]:
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def fetchall(self) -> List[Tuple]:
+        if self._cursor is not None:
+            result: List[Tuple] = []
+            while True:
+                batch = self.fetchmany(1000)
+                if not batch:
+                    return result
+                result.extend(batch)
+        rows = self._rows[self._position :]
+        self._position = len(self._rows)
+        return rows
+
+
+class _SPIConnection:
+    """Implements the subset of the Psycopg connection interface that PostgresEngine uses."""
+
+    closed = 0
+
+    def __init__(self) -> None:
+        self.autocommit = False
+        self.notices: List[str] = []
+
+    def cursor(
+        self, name: Optional[str] = None, withhold: bool = False, cursor_factory: Any = None
+    ) -> _SPICursor:
+        # The only cursor factory that the engine uses is NamedTupleCursor
+        return _SPICursor(self, name=name, named_tuples=cursor_factory is not None)
+
+    # Queries run in the transaction of the statement that called the PL/Python function,
+    # which can't be committed or rolled back from inside of it. Statements that fail get
+    # rolled back by PL/Python.
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class _SPIConnectionPool:
+    """Stands in for the Psycopg connection pool: there's only one backend to run queries in."""
+
+    def __init__(self) -> None:
+        self._conn = _SPIConnection()
+
+    def getconn(self, key: Any = None) -> _SPIConnection:
+        return self._conn
+
+    def putconn(self, conn: _SPIConnection, key: Any = None, close: bool = False) -> None:
+        pass
+
+
+class SPIEngine(PostgresEngine):
+    """
+    PostgresEngine that runs queries through SPI in the current backend (see the module
+    docstring). Queries run in the caller's transaction: commit() and rollback() don't do
+    anything and savepoints are implemented with PL/Python subtransactions. SPI can only
+    be used from the backend's main thread.
+
+    This only saves the round-trips of metadata queries: it doesn't replace the connections
+    that the object engine and Multicorn scans make back to the engine.
+    """
+
+    def __init__(self, name: Optional[str] = None) -> None:
+        """
+        :param name: Name of the engine that this engine runs queries on (usually LOCAL).
+        """
+        if plpy is None:
+            raise ValueError("SPIEngine can only be used inside of PL/Python on the engine!")
+        super().__init__(
+            name=name,
+            pool=cast(AbstractConnectionPool, _SPIConnectionPool()),
+            # We're running the same library as the engine
+            check_version=False,
+            in_fdw=True,
+        )
+
+    def __repr__(self) -> str:
+        return "SPIEngine " + (self.name or "")
+
+    @contextmanager
+    def savepoint(self, name: str) -> Iterator[None]:
+        with plpy.subtransaction():
+            yield
+
+    def close_others(self) -> None:
+        # All threads share the same backend, so there are no other connections to close.
+        pass
+
+    def run_sql_columnar(
+        self,
+        statement: Union[bytes, Composed, str, SQL],
+        arguments: Optional[Sequence[Any]] = None,
+    ) -> Dict[str, "np.ndarray"]:
+        raise ValueError("SPIEngine can't fetch results with COPY, use run_sql instead!")
@@ -57,7 +57,12 @@ class PandasIngestionAdapter(IngestionAdapter):
         df_to_table_fast(engine, data, schema, table)
 
     @staticmethod
-    def query_to_data(engine, query: str, schema: Optional[str] = None, **kwargs):
+    def query_to_data(
+        engine, query: str, schema: Optional[str] = None, columnar: bool = False, **kwargs
+    ):
+        if columnar:
+            return _query_to_df_columnar(engine, query, schema, **kwargs)
+
         # Pandas' `read_sql_table/query` because they has type inference via SQLAlchemy
         # (from the datatypes in the query that postgres gives back).
         if schema:
@@ -88,6 +93,25 @@ def df_to_table_fast(
     copy_csv_buffer(buffer, engine, target_schema, target_table, no_header=True)
 
 
+def _query_to_df_columnar(
+    engine: "PsycopgEngine", query: str, schema: Optional[str] = None, index_col=None
+) -> DataFrame:
+    # Decode the query results straight into NumPy arrays (using binary COPY) instead of
+    # getting a list of tuples from SQLAlchemy.
+    if schema:
+        engine.run_sql("SET search_path TO %s,public", (schema,), return_shape=None)
+    try:
+        columns = engine.run_sql_columnar(query)
+    finally:
+        if schema:
+            engine.run_sql("SET search_path TO public", return_shape=None)
+
+    df = DataFrame(columns)
+    if index_col:
+        df = df.set_index(index_col)
+    return df
+
+
 _pandas_adapter = PandasIngestionAdapter()
 
 
@@ -96,6 +120,7 @@ def sql_to_df(
     image: Optional[Union[Image, str]] = None,
     repository: Optional[Repository] = None,
     use_lq: bool = False,
+    columnar: bool = False,
     **kwargs
 ) -> DataFrame:
     """
@@ -107,9 +132,13 @@ def sql_to_df(
     :param image: Image object, image hash/tag (`str`) or None (use the currently checked out image).
     :param repository: Repository the image belongs to. Must be set if `image` is a hash/tag or None.
     :param use_lq: Whether to use layered querying or check out the image if it's not checked out.
+    :param columnar: Fetch the results with binary COPY and build the dataframe from columns
+        instead of going through `read_sql_query`. This is faster for large results, but only
+        supports `index_col` as an extra argument and returns types that can't be decoded
+        from the binary format (e.g. numeric) as text.
     :return: A Pandas dataframe.
     """
-    return _pandas_adapter.to_data(sql, image, repository, use_lq, **kwargs)
+    return _pandas_adapter.to_data(sql, image, repository, use_lq, columnar=columnar, **kwargs)
 
 
 def df_to_table(
@@ -0,0 +1,14 @@
+-- Cache of layered query plans (fragments that have to be scanned to satisfy a query against
+-- a table with given qualifiers), shared between all LQ foreign tables on the engine.
+-- plan_key:   sha256 of the image, table, its objects and the normalized qualifiers.
+-- object_ids: objects the table consists of (the plan is invalidated if their metadata changes).
+-- plan:       JSON with the filtered objects, the row estimate and the fragment grouping.
+-- last_used:  Timestamp (UTC) this plan was last used (for LRU eviction).
+CREATE TABLE splitgraph_meta.query_plans (
+    plan_key varchar(64) NOT NULL PRIMARY KEY,
+    object_ids varchar[] NOT NULL,
+    plan jsonb NOT NULL,
+    last_used timestamp NOT NULL
+);
+
+CREATE INDEX idx_query_plans_objects ON splitgraph_meta.query_plans USING GIN (object_ids);
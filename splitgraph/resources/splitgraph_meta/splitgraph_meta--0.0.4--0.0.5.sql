@@ -0,0 +1,16 @@
+-- Fragments of every table grouped into non-overlapping groups with their PK ranges,
+-- calculated when the table is registered (see FragmentManager.get_table_chunk_groups).
+-- object_ids: objects the groups were calculated for (the groups are stale if they
+--             differ from the table's objects).
+-- groups:     JSON list of groups, each a list of [object_id, min_pk, max_pk].
+CREATE TABLE splitgraph_meta.table_chunk_groups (
+    namespace varchar NOT NULL,
+    repository varchar NOT NULL,
+    image_hash varchar NOT NULL,
+    table_name varchar NOT NULL,
+    object_ids varchar[] NOT NULL,
+    groups jsonb NOT NULL,
+    PRIMARY KEY (namespace, repository, image_hash, table_name),
+    CONSTRAINT tcg_fk FOREIGN KEY (namespace, repository, image_hash, table_name) REFERENCES
+        splitgraph_meta.tables ON DELETE CASCADE
+);
@@ -0,0 +1,86 @@
+-- Range index of every object (the "range" key of objects.index) with the bounds cast into
+-- typed columns, so that fragment filtering doesn't have to extract and cast them from
+-- JSON for every candidate object. Maintained by a trigger on splitgraph_meta.objects.
+--
+-- min_text/max_text:           bounds as text (NULL if the column only has NULLs).
+-- min_numeric/max_numeric:     bounds cast to numeric (NULL if they aren't numbers).
+-- min_timestamp/max_timestamp: bounds cast to timestamp (NULL if they aren't dates/timestamps).
+CREATE TABLE splitgraph_meta.object_ranges (
+    object_id varchar NOT NULL REFERENCES splitgraph_meta.objects ON DELETE CASCADE,
+    column_name varchar NOT NULL,
+    min_text text COLLATE "C",
+    max_text text COLLATE "C",
+    min_numeric numeric,
+    max_numeric numeric,
+    min_timestamp timestamp,
+    max_timestamp timestamp,
+    PRIMARY KEY (object_id, column_name)
+);
+
+CREATE INDEX idx_object_ranges_text ON splitgraph_meta.object_ranges (column_name, min_text, max_text);
+CREATE INDEX idx_object_ranges_numeric ON splitgraph_meta.object_ranges (column_name, min_numeric, max_numeric);
+CREATE INDEX idx_object_ranges_timestamp ON splitgraph_meta.object_ranges (column_name, min_timestamp, max_timestamp);
+
+CREATE OR REPLACE FUNCTION splitgraph_meta.range_to_numeric (bound text)
+    RETURNS numeric
+    AS $$
+    SELECT
+        CASE WHEN bound ~ '^-?[0-9]+(\.[0-9]+)?([eE][-+]?[0-9]+)?$' THEN
+            bound::numeric
+        END
+$$
+LANGUAGE sql
+IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION splitgraph_meta.range_to_timestamp (bound text)
+    RETURNS timestamp
+    AS $$
+    SELECT
+        CASE WHEN bound ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}([ T][0-9]{2}:[0-9]{2}:[0-9]{2}(\.[0-9]+)?)?$' THEN
+            bound::timestamp
+        END
+$$
+LANGUAGE sql
+IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION splitgraph_meta.update_object_ranges ()
+    RETURNS TRIGGER
+    AS $$
+BEGIN
+    DELETE FROM splitgraph_meta.object_ranges
+    WHERE object_id = NEW.object_id;
+    -- Composite PK ranges ($pk) are arrays and can't be cast.
+    INSERT INTO splitgraph_meta.object_ranges
+    SELECT
+        NEW.object_id,
+        r.column_name,
+        r.min_text,
+        r.max_text,
+        splitgraph_meta.range_to_numeric (r.min_text),
+        splitgraph_meta.range_to_numeric (r.max_text),
+        splitgraph_meta.range_to_timestamp (r.min_text),
+        splitgraph_meta.range_to_timestamp (r.max_text)
+    FROM (
+        SELECT
+            key AS column_name,
+            value ->> 0 AS min_text,
+            value ->> 1 AS max_text
+        FROM
+            jsonb_each(NEW.index -> 'range')
+        WHERE
+            key <> '$pk') r;
+    RETURN NEW;
+END;
+$$
+LANGUAGE plpgsql;
+
+CREATE TRIGGER sg_update_object_ranges_trigger
+    AFTER INSERT OR UPDATE OF index ON splitgraph_meta.objects
+    FOR EACH ROW
+    EXECUTE PROCEDURE splitgraph_meta.update_object_ranges ();
+
+-- Backfill the ranges of existing objects.
+UPDATE
+    splitgraph_meta.objects
+SET
+    index = index;
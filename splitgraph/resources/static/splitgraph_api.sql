@@ -16,7 +16,7 @@ BEGIN
     -- warn the user if there are API version incompatibilities.
     -- If you bump this, also bump the client expected version
     -- in splitgraph.engine.postgres.engine.
-    RETURN '0.0.1';
+    RETURN '0.1.0';
 END;
 $$
 LANGUAGE plpgsql
@@ -676,6 +676,87 @@ $$
 LANGUAGE plpgsql
 SECURITY DEFINER SET search_path = splitgraph_meta, pg_temp;
 
+--
+-- HASHING API
+--
+-- lthash(digest): aggregate that sums 256-bit row digests (e.g. digest(row::text, 'sha256'))
+-- as vectors of 16 unsigned 2-byte big-endian integers with wraparound and returns the
+-- result as a hex string. Equivalent to splitgraph.core.fragment_manager.Digest but doesn't
+-- require the client to fetch the digest of every row.
+CREATE OR REPLACE FUNCTION splitgraph_api.lthash_add (
+    state integer[],
+    digest bytea
+)
+    RETURNS integer[]
+    AS $$
+    SELECT ARRAY[
+        (state[1] + get_byte(digest, 0) * 256 + get_byte(digest, 1)) & 65535,
+        (state[2] + get_byte(digest, 2) * 256 + get_byte(digest, 3)) & 65535,
+        (state[3] + get_byte(digest, 4) * 256 + get_byte(digest, 5)) & 65535,
+        (state[4] + get_byte(digest, 6) * 256 + get_byte(digest, 7)) & 65535,
+        (state[5] + get_byte(digest, 8) * 256 + get_byte(digest, 9)) & 65535,
+        (state[6] + get_byte(digest, 10) * 256 + get_byte(digest, 11)) & 65535,
+        (state[7] + get_byte(digest, 12) * 256 + get_byte(digest, 13)) & 65535,
+        (state[8] + get_byte(digest, 14) * 256 + get_byte(digest, 15)) & 65535,
+        (state[9] + get_byte(digest, 16) * 256 + get_byte(digest, 17)) & 65535,
+        (state[10] + get_byte(digest, 18) * 256 + get_byte(digest, 19)) & 65535,
+        (state[11] + get_byte(digest, 20) * 256 + get_byte(digest, 21)) & 65535,
+        (state[12] + get_byte(digest, 22) * 256 + get_byte(digest, 23)) & 65535,
+        (state[13] + get_byte(digest, 24) * 256 + get_byte(digest, 25)) & 65535,
+        (state[14] + get_byte(digest, 26) * 256 + get_byte(digest, 27)) & 65535,
+        (state[15] + get_byte(digest, 28) * 256 + get_byte(digest, 29)) & 65535,
+        (state[16] + get_byte(digest, 30) * 256 + get_byte(digest, 31)) & 65535]
+$$
+LANGUAGE sql
+IMMUTABLE STRICT PARALLEL SAFE;
+
+CREATE OR REPLACE FUNCTION splitgraph_api.lthash_combine (
+    state_1 integer[],
+    state_2 integer[]
+)
+    RETURNS integer[]
+    AS $$
+    SELECT ARRAY[
+        (state_1[1] + state_2[1]) & 65535,
+        (state_1[2] + state_2[2]) & 65535,
+        (state_1[3] + state_2[3]) & 65535,
+        (state_1[4] + state_2[4]) & 65535,
+        (state_1[5] + state_2[5]) & 65535,
+        (state_1[6] + state_2[6]) & 65535,
+        (state_1[7] + state_2[7]) & 65535,
+        (state_1[8] + state_2[8]) & 65535,
+        (state_1[9] + state_2[9]) & 65535,
+        (state_1[10] + state_2[10]) & 65535,
+        (state_1[11] + state_2[11]) & 65535,
+        (state_1[12] + state_2[12]) & 65535,
+        (state_1[13] + state_2[13]) & 65535,
+        (state_1[14] + state_2[14]) & 65535,
+        (state_1[15] + state_2[15]) & 65535,
+        (state_1[16] + state_2[16]) & 65535]
+$$
+LANGUAGE sql
+IMMUTABLE STRICT PARALLEL SAFE;
+
+CREATE OR REPLACE FUNCTION splitgraph_api.lthash_final (
+    state integer[]
+)
+    RETURNS varchar(64)
+    AS $$
+    SELECT string_agg(lpad(to_hex(s), 4, '0'), '' ORDER BY i)
+    FROM unnest(state) WITH ORDINALITY AS t (s, i)
+$$
+LANGUAGE sql
+IMMUTABLE STRICT PARALLEL SAFE;
+
+CREATE AGGREGATE splitgraph_api.lthash (bytea) (
+    SFUNC = splitgraph_api.lthash_add,
+    STYPE = integer[],
+    COMBINEFUNC = splitgraph_api.lthash_combine,
+    FINALFUNC = splitgraph_api.lthash_final,
+    INITCOND = '{0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0}',
+    PARALLEL = SAFE
+);
+
 --
 -- S3 UPLOAD/DOWNLOAD API
 --
@@ -710,3 +791,33 @@ CREATE OR REPLACE FUNCTION splitgraph_api.get_object_download_urls (
 $$
 LANGUAGE plpython3u
 SECURITY DEFINER;
+
+--
+-- LAYERED QUERYING
+--
+-- lq_aggregate(foreign_table, aggregates): calculate aggregates (e.g. ARRAY['count(*)', 'max(ts)'])
+-- over a table checked out with layered querying without scanning every fragment
+-- (see Table.aggregate). Returns a JSON array with the results.
+CREATE OR REPLACE FUNCTION splitgraph_api.lq_aggregate (
+    foreign_table regclass,
+    aggregates text[]
+)
+    RETURNS jsonb
+    AS $$
+    import json
+    from splitgraph.core.fdw_checkout import lq_aggregate
+
+    plan = plpy.prepare(
+        "SELECT s.srvoptions, t.ftoptions FROM pg_foreign_table t "
+        "JOIN pg_foreign_server s ON s.oid = t.ftserver "
+        "WHERE t.ftrelid = $1 AND has_table_privilege($1, 'SELECT')",
+        ["regclass"])
+    rows = plpy.execute(plan, [foreign_table])
+    if not rows:
+        plpy.error("%s is not a foreign table that can be queried" % foreign_table)
+    # Multicorn passes the server options and the table options to the FDW together.
+    options = [o.split("=", 1) for o in (rows[0]["srvoptions"] or []) + (rows[0]["ftoptions"] or [])]
+    return json.dumps(lq_aggregate(dict(options), aggregates))
+$$
+LANGUAGE plpython3u
+SECURITY INVOKER;
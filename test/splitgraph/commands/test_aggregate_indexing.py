@@ -0,0 +1,103 @@
+from datetime import datetime as dt, timedelta
+from decimal import Decimal
+from unittest import mock
+
+import pytest
+from test.splitgraph.conftest import OUTPUT
+
+from splitgraph.core.indexing.aggregate import combine_aggregates, parse_aggregate
+from splitgraph.engine import ResultShape
+
+
+@pytest.mark.parametrize(
+    "test_case",
+    [
+        ("count(*)", ("count", None)),
+        (" COUNT ( * ) ", ("count", None)),
+        ("max(ts)", ("max", "ts")),
+        ("min(Value)", ("min", "value")),
+        ('sum("Value ""1""")', ("sum", 'Value "1"')),
+    ],
+)
+def test_parse_aggregate(test_case):
+    aggregate, expected = test_case
+    assert parse_aggregate(aggregate) == expected
+
+
+def test_parse_aggregate_invalid():
+    with pytest.raises(ValueError):
+        parse_aggregate("count(a, b)")
+
+
+def test_combine_aggregates():
+    aggregates = [("count", None), ("min", "a"), ("max", "a"), ("sum", "b")]
+    assert combine_aggregates(aggregates, []) == [0, None, None, None]
+    assert combine_aggregates(
+        aggregates, [[2, 1, 5, None], [0, None, None, None], [3, 3, 7, Decimal("1.5")]]
+    ) == [5, 1, 7, Decimal("1.5")]
+
+
+def test_table_aggregate(local_engine_empty):
+    OUTPUT.init()
+    OUTPUT.run_sql(
+        "CREATE TABLE test (key INTEGER PRIMARY KEY, value_1 VARCHAR, "
+        "value_2 NUMERIC, ts TIMESTAMP)"
+    )
+    for i in range(27):
+        OUTPUT.run_sql(
+            "INSERT INTO test VALUES (%s, %s, %s, %s)",
+            (
+                i + 1,
+                chr(ord("a") + i) if i % 4 else None,
+                Decimal(i) / 2,
+                dt(2020, 1, 1) + timedelta(days=i),
+            ),
+        )
+    OUTPUT.commit(chunk_size=9)
+    # Overwrite a row in the last chunk: the patch and the chunk have to be applied together.
+    OUTPUT.run_sql("UPDATE test SET value_1 = 'UPD', value_2 = 100 WHERE key = 27")
+    head = OUTPUT.commit()
+    table = head.get_table("test")
+    assert len(table.objects) == 4
+
+    # The sums are recorded in the index when the objects are committed
+    object_meta = OUTPUT.objects.get_object_meta(table.objects)
+    assert object_meta[table.objects[0]].object_index["sum"] == {
+        "key": 45,
+        "value_2": "18.0",
+    }
+
+    aggregates = [
+        ("count", None),
+        ("count", "value_1"),
+        ("min", "value_1"),
+        ("max", "value_1"),
+        ("sum", "key"),
+        ("sum", "value_2"),
+        ("min", "ts"),
+        ("max", "ts"),
+    ]
+    expected = list(
+        OUTPUT.run_sql(
+            'SELECT COUNT(*), COUNT(value_1), MIN(value_1 COLLATE "C"), MAX(value_1 COLLATE "C"), '
+            "SUM(key), SUM(value_2), MIN(ts), MAX(ts) FROM test",
+            return_shape=ResultShape.ONE_MANY,
+        )
+    )
+    assert expected[:2] == [27, 20]
+
+    with mock.patch.object(
+        OUTPUT.objects, "ensure_objects", wraps=OUTPUT.objects.ensure_objects
+    ) as ensure_objects:
+        assert table.aggregate(aggregates) == expected
+
+    # Only the last chunk and the patch that overwrites it got scanned.
+    assert ensure_objects.call_count == 1
+    assert sorted(ensure_objects.call_args[1]["objects"]) == sorted(table.objects[2:])
+
+    # With qualifiers, all fragments are scanned.
+    assert table.aggregate([("count", None), ("max", "key")], [[("key", "<", 12)]]) == [11, 11]
+    assert table.aggregate([("count", None)], [[("key", ">", 100)]]) == [0]
+
+    with pytest.raises(ValueError):
+        table.aggregate([("sum", "value_1")])
@@ -0,0 +1,121 @@
+from unittest import mock
+
+import pytest
+from test.splitgraph.conftest import OUTPUT
+
+from splitgraph.core.indexing.bbox import (
+    _match,
+    _prepare_bbox_quals,
+    _widen_geography,
+    describe,
+    filter_bbox_index,
+)
+from splitgraph.core.indexing.fragment_index import _BboxColumn
+from splitgraph.engine import ResultShape
+
+
+@pytest.mark.parametrize(
+    "test_case",
+    [
+        # Bounding box overlaps are kept
+        ([[("a", "&&", (0, 0, 1, 1))]], [[("a", (0, 0, 1, 1))]]),
+        # Empty shapes (None) too
+        ([[("a", "&&", None)]], [[("a", None)]]),
+        # a && box or b > 6: b > 6 might be true, so this collapses into nothing
+        ([[("a", "&&", (0, 0, 1, 1)), ("b", ">", 6)]], []),
+        ([[("a", "&&", (0, 0, 1, 1))], [("b", ">", 6)]], [[("a", (0, 0, 1, 1))]]),
+        # && on other types (e.g. arrays) can't be checked
+        ([[("a", "&&", [1, 2])]], []),
+    ],
+)
+def test_bbox_qual_preprocessing(test_case):
+    quals, expected = test_case
+    assert _prepare_bbox_quals(quals) == expected
+
+
+def test_bbox_widen_geography():
+    assert _widen_geography((10.0, 20.0, 30.0, 40.0)) == (10.0, -90.0, 30.0, 90.0)
+    # Shapes that might cross the antimeridian
+    assert _widen_geography((-170.0, 20.0, 170.0, 40.0)) == (-180.0, -90.0, 180.0, 90.0)
+
+
+def test_bbox_describe():
+    assert describe([0.0, 1.0, 2.5, 3.0]) == "[0.0, 1.0] - [2.5, 3.0]"
+    assert describe(None) == "empty"
+
+
+def test_bbox_match_in_memory():
+    bboxes = [[0.0, 0.0, 1.0, 1.0], None, False, [2.0, 2.0, 3.0, 3.0]]
+    column = _BboxColumn(bboxes)
+    indexes = [{"a": b} if b is not False else {} for b in bboxes]
+
+    for bbox in [
+        (0.5, 0.5, 0.6, 0.6),
+        (1.0, 1.0, 2.0, 2.0),
+        (1.5, 1.5, 1.6, 1.6),
+        (-1, -1, 4, 4),
+        None,
+    ]:
+        assert list(column.match(bbox)) == [_match(("a", bbox), i) for i in indexes]
+
+    assert list(column.match((1.5, 1.5, 1.6, 1.6))) == [False, False, True, False]
+    assert list(column.match((1.0, 1.0, 2.0, 2.0))) == [True, False, True, True]
+
+
+def test_bbox_index_querying(local_engine_empty):
+    if not OUTPUT.engine.run_sql("SELECT 1 FROM pg_available_extensions WHERE name = 'postgis'"):
+        pytest.skip("PostGIS isn't installed on the engine")
+    OUTPUT.engine.run_sql("CREATE EXTENSION IF NOT EXISTS postgis")
+
+    OUTPUT.init()
+    OUTPUT.run_sql(
+        "CREATE TABLE test (key INTEGER PRIMARY KEY, geom geometry(Point), geog geography)"
+    )
+    # Each chunk of 10 rows has points in a separate 10x10 square on the diagonal
+    for i in range(30):
+        OUTPUT.run_sql(
+            "INSERT INTO test VALUES (%s, ST_MakePoint(%s, %s), ST_MakePoint(%s, %s)::geography)",
+            (i, i, i, i, i),
+        )
+    OUTPUT.run_sql("UPDATE test SET geom = NULL WHERE key >= 20")
+    head = OUTPUT.commit(chunk_size=10, extra_indexes={"test": {"bbox": {"geom": {}, "geog": {}}}})
+
+    table = head.get_table("test")
+    objects = table.objects
+    object_meta = OUTPUT.objects.get_object_meta(objects)
+    assert object_meta[objects[0]].object_index["bbox"] == {
+        "geom": [0.0, 0.0, 9.0, 9.0],
+        "geog": [0.0, -90.0, 9.0, 90.0],
+    }
+    assert object_meta[objects[2]].object_index["bbox"]["geom"] is None
+
+    def _window(xmin, ymin, xmax, ymax):
+        return OUTPUT.engine.run_sql(
+            "SELECT ST_MakeEnvelope(%s, %s, %s, %s)::text",
+            (xmin, ymin, xmax, ymax),
+            return_shape=ResultShape.ONE_ONE,
+        )
+
+    def test_filter(quals, result):
+        assert OUTPUT.objects.filter_fragments(objects, table, quals) == result
+        with mock.patch.object(OUTPUT.objects, "in_memory_index", True):
+            assert OUTPUT.objects.filter_fragments(objects, table, quals) == result
+
+    test_filter([[("geom", "&&", _window(1, 1, 2, 2))]], [objects[0]])
+    test_filter([[("geom", "&&", _window(5, 5, 15, 15))]], [objects[0], objects[1]])
+    # The third fragment only has NULLs
+    test_filter([[("geom", "&&", _window(20, 20, 30, 30))]], [])
+    test_filter([[("geom", "&&", _window(100, 100, 200, 200))]], [])
+    test_filter([[("geom", "&&", _window(1, 15, 2, 16))]], [])
+    # Geography columns can only be pruned on the longitude
+    test_filter([[("geog", "&&", _window(12, -50, 13, -40))]], [objects[1]])
+
+    # Check the results of the query are correct
+    assert table.query(["key"], [[("geom", "&&", _window(5, 5, 15, 15))]], order_by_pk=True) == [
+        {"key": i} for i in range(5, 16)
+    ]
+
+    # Filtering the index directly requires the shapes to be converted into bounding boxes
+    assert filter_bbox_index(OUTPUT.engine, objects, [[("geom", "&&", (1, 1, 2, 2))]]) == [
+        objects[0]
+    ]
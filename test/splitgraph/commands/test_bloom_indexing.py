@@ -1,3 +1,4 @@
+import json
 from datetime import datetime as dt, timedelta
 from unittest import mock
 
@@ -5,7 +6,15 @@ import pytest
 from test.splitgraph.commands.test_layered_querying import _prepare_fully_remote_repo
 from test.splitgraph.conftest import OUTPUT
 
-from splitgraph.core.indexing.bloom import _prepare_bloom_quals, filter_bloom_index, describe
+from splitgraph.core.indexing.bloom import (
+    _prepare_bloom_quals,
+    filter_bloom_index,
+    describe,
+    _build_filter,
+    _build_filter_numpy,
+    _hash_value,
+    _NUMPY_SUPPORTED,
+)
 from splitgraph.core.repository import clone, Repository
 from splitgraph.engine import ResultShape
 from splitgraph.exceptions import ObjectIndexingError
@@ -22,6 +31,8 @@ from splitgraph.exceptions import ObjectIndexingError
         # a = 5 and b > 6: no matter whether b > 6 is true, if a can never be = 5,
         # this statement can still be false
         ([[("a", "=", 5)], [("b", ">", 6)]], [[("a", mock.ANY, mock.ANY)]]),
+        # IS NULL looks for the hash of NULL
+        ([[("a", "IS NULL", None)]], [[("a", mock.ANY, mock.ANY)]]),
     ],
 )
 def test_bloom_qual_preprocessing(test_case):
@@ -38,6 +49,17 @@ def test_bloom_describe():
     )
 
 
+@pytest.mark.skipif(not _NUMPY_SUPPORTED, reason="NumPy not installed")
+@pytest.mark.parametrize(
+    "items,size,no_funcs", [(1, 1, 1), (26, 16, 4), (1000, 1199, 7), (5000, 3, 2)]
+)
+def test_bloom_numpy_builder(items, size, no_funcs):
+    # The NumPy builder has to produce the same filters as the pure Python one
+    # so that indexes built by either of them can be used interchangeably.
+    digests = [_hash_value(i) for i in range(items)]
+    assert _build_filter_numpy(digests, size, no_funcs) == _build_filter(digests, size, no_funcs)
+
+
 def test_bloom_index_structure(local_engine_empty):
     OUTPUT.init()
     OUTPUT.run_sql("CREATE TABLE test (key INTEGER PRIMARY KEY, value_1 VARCHAR, value_2 INTEGER)")
@@ -86,6 +108,39 @@ def test_bloom_index_structure(local_engine_empty):
     assert len(index["bloom"]["value_2"][1]) == 40
 
 
+def test_bloom_index_fused_with_hashing(local_engine_empty):
+    # Indexes of base fragments are built from the same scan that hashes the source table:
+    # check they match the indexes generated by scanning the object after it's been stored.
+    OUTPUT.init()
+    OUTPUT.run_sql(
+        "CREATE TABLE test (key_1 INTEGER, key_2 VARCHAR, value_1 VARCHAR, value_2 INTEGER, "
+        "PRIMARY KEY (key_1, key_2))"
+    )
+    for i in range(26):
+        OUTPUT.run_sql(
+            "INSERT INTO test VALUES (%s, %s, %s, %s)",
+            (i // 5, chr(ord("a") + i), chr(ord("a") + i) if i % 3 else None, i * 2),
+        )
+    extra_indexes = {"bloom": {"value_1": {"size": 16}, "value_2": {"probability": 0.01}}}
+    head = OUTPUT.commit(chunk_size=10, extra_indexes={"test": extra_indexes})
+
+    table = head.get_table("test")
+    object_meta = OUTPUT.objects.get_object_meta(table.objects)
+    assert len(object_meta) == 3
+
+    for object_id, meta in object_meta.items():
+        # Roundtrip through JSON since that's how the index is stored in the metadata.
+        assert meta.object_index == json.loads(
+            json.dumps(
+                OUTPUT.objects.generate_object_index(
+                    object_id, table.table_schema, extra_indexes=extra_indexes
+                )
+            )
+        )
+        assert meta.object_index["range"]["$pk"]
+        assert set(meta.object_index["bloom"].keys()) == {"value_1", "value_2"}
+
+
 def test_bloom_index_querying(local_engine_empty):
     # Same dataset as the previous, but this time test querying the bloom index
     # by calling it directly (not as part of an LQ).
@@ -295,6 +350,40 @@ def test_bloom_reindex_changed_table(local_engine_empty):
     assert objects[2] not in reindexed
 
 
+def test_bloom_reindex_failure_leaves_metadata(local_engine_empty):
+    OUTPUT.init()
+    OUTPUT.run_sql("CREATE TABLE test (key INTEGER PRIMARY KEY, value_1 VARCHAR)")
+    for i in range(26):
+        OUTPUT.run_sql("INSERT INTO test VALUES (%s, %s)", (i + 1, chr(ord("a") + i)))
+    head = OUTPUT.commit(chunk_size=13)
+    table = head.get_table("test")
+    assert len(table.objects) == 2
+    object_meta = OUTPUT.objects.get_object_meta(table.objects)
+
+    # Indexing the second object fails: the index of the first one mustn't change
+    # either in the engine or in the object metadata cache.
+    generate_object_index = OUTPUT.objects.generate_object_index
+    with mock.patch.object(
+        OUTPUT.objects,
+        "generate_object_index",
+        side_effect=[
+            generate_object_index(
+                table.objects[0],
+                table.table_schema,
+                changeset=None,
+                extra_indexes={"bloom": {"value_1": {"probability": 0.01}}},
+            ),
+            ObjectIndexingError("Indexing failed"),
+        ],
+    ):
+        with pytest.raises(ObjectIndexingError):
+            table.reindex(extra_indexes={"bloom": {"value_1": {"probability": 0.01}}})
+
+    new_object_meta = OUTPUT.objects.get_object_meta(table.objects)
+    assert new_object_meta == object_meta
+    assert "bloom" not in new_object_meta[table.objects[0]].object_index
+
+
 @pytest.mark.registry
 def test_bloom_reindex_remote(local_engine_empty, unprivileged_pg_repo, clean_minio):
     _prepare_fully_remote_repo(local_engine_empty, unprivileged_pg_repo)
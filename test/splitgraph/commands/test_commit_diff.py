@@ -156,7 +156,12 @@ def test_commit_chunking(local_engine_empty):
                         "key": [min_key, max_key],
                         "value_1": [chr(ord("z") - max_key + 1), chr(ord("z") - min_key + 1)],
                         "value_2": [(min_key - 1) * 2, (max_key - 1) * 2],
-                    }
+                    },
+                    "null_count": {"key": 0, "value_1": 0, "value_2": 0},
+                    "sum": {
+                        "key": sum(range(min_key, max_key + 1)),
+                        "value_2": sum((k - 1) * 2 for k in range(min_key, max_key + 1)),
+                    },
                 },
                 # Added 5 (1 in last chunk), removed 0 rows
                 5 if i < 2 else 1,
@@ -231,6 +236,68 @@ def test_commit_chunking_order(local_engine_empty):
         ) == list(range(max_key, min_key - 1, -1))
 
 
+def test_commit_chunking_parallel(local_engine_empty):
+    # Check that storing chunks in parallel produces the same objects as doing it serially.
+    OUTPUT.init()
+    OUTPUT.run_sql("CREATE TABLE test (key INTEGER PRIMARY KEY, value_1 VARCHAR, value_2 INTEGER)")
+    for i in range(11):
+        OUTPUT.run_sql("INSERT INTO test VALUES (%s, %s, %s)", (i + 1, chr(ord("a") + i), i * 2))
+    head = OUTPUT.commit(chunk_size=5, workers=3)
+
+    objects = head.get_table("test").objects
+    assert objects == [
+        "oab9901c63e816f8e3d47366740a76323f168fbe5d5b25eed6b8f4755c37e10",
+        "o899fa68202a31c0e10c98c446d9ffef8812d7bdce76ef9da92545172fbb47b",
+        "oe1841cba2d9d9598f2cd3226bb60bb77dc77b98a05808e7976ed112bade86f",
+    ]
+    object_meta = OUTPUT.objects.get_object_meta(objects)
+    assert [object_meta[o].rows_inserted for o in objects] == [5, 5, 1]
+    assert object_meta[objects[1]].object_index["range"]["key"] == [6, 10]
+
+    # Check the staging table has been cleaned up.
+    assert not [
+        t
+        for t in local_engine_empty.get_all_tables(SPLITGRAPH_META_SCHEMA)
+        if t.startswith("sg_tmp_")
+    ]
+
+    OUTPUT.uncheckout()
+    head.checkout()
+    assert OUTPUT.run_sql(
+        "SELECT key FROM test ORDER BY key", return_shape=ResultShape.MANY_ONE
+    ) == list(range(1, 12))
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_commit_chunking_keyset(local_engine_empty, workers):
+    # Check that chunking a table by walking its primary key produces the same objects
+    # as partitioning it (use a composite PK to test the row comparisons).
+    OUTPUT.init()
+    OUTPUT.run_sql(
+        "CREATE TABLE test (key_1 INTEGER, key_2 VARCHAR, value INTEGER, "
+        "PRIMARY KEY (key_1, key_2))"
+    )
+    for i in range(11):
+        OUTPUT.run_sql("INSERT INTO test VALUES (%s, %s, %s)", (i // 3, chr(ord("z") - i), i * 2))
+    head = OUTPUT.commit(chunk_size=5)
+
+    with patch.dict("splitgraph.config.CONFIG", {"SG_COMMIT_CHUNKING": "keyset"}):
+        new_head = OUTPUT.commit(chunk_size=5, snap_only=True, workers=workers)
+
+    objects = new_head.get_table("test").objects
+    assert objects == head.get_table("test").objects
+    object_meta = OUTPUT.objects.get_object_meta(objects)
+    assert [object_meta[o].rows_inserted for o in objects] == [5, 5, 1]
+    assert object_meta[objects[1]].object_index["range"]["$pk"] == [[1, "w"], [3, "p"]]
+
+    # No staging tables should have been created.
+    assert not [
+        t
+        for t in local_engine_empty.get_all_tables(SPLITGRAPH_META_SCHEMA)
+        if t.startswith("sg_tmp_")
+    ]
+
+
 def test_commit_diff_splitting(local_engine_empty):
     # Similar setup to the chunking test
     OUTPUT.init()
@@ -302,7 +369,11 @@ def test_commit_diff_splitting(local_engine_empty):
             "3cfbe8fa6fc546264936e29f402d7263510481c88a8d27190d82b3d5830cbcbf",
             # no deletions in this fragment
             "0000000000000000000000000000000000000000000000000000000000000000",
-            {"range": {"key": [0, 0], "value_1": ["zero", "zero"], "value_2": [-1, -1]}},
+            {
+                "range": {"key": [0, 0], "value_1": ["zero", "zero"], "value_2": [-1, -1]},
+                "null_count": {"key": 0, "value_1": 0, "value_2": 0},
+                "sum": {"key": 0, "value_2": -1},
+            },
             1,
             0,
         ),
@@ -316,7 +387,13 @@ def test_commit_diff_splitting(local_engine_empty):
             "e3eb6db305d889d3a69e3d8efa0931853c00fca75c0aeddd8f2fa2d6fd2443d6",
             # for value_1 we have old values for k=4,5 ('d', 'e') and new value
             # for k=5 ('UPDATED') included here; same for value_2.
-            {"range": {"key": [4, 5], "value_1": ["UPDATED", "e"], "value_2": [6, 8]}},
+            {
+                "range": {"key": [4, 5], "value_1": ["UPDATED", "e"], "value_2": [6, 8]},
+                # The deleted row is stored with NULLs in non-PK columns
+                "null_count": {"key": 0, "value_1": 1, "value_2": 1},
+                # Sums only include the rows that the fragment inserts
+                "sum": {"key": 5, "value_2": 8},
+            },
             # 1 row inserted, 2 deleted (deletion and old pre-upsert value counts)
             1,
             2,
@@ -331,7 +408,11 @@ def test_commit_diff_splitting(local_engine_empty):
             "0000000000000000000000000000000000000000000000000000000000000000",
             "d7df15e62c1c8799ef3a3677e3eb7661cedf898d73449a80251b93c501b5bdeb",
             # Turned into one deletion, old values included here
-            {"range": {"key": [6, 6], "value_1": ["f", "f"], "value_2": [10, 10]}},
+            {
+                "range": {"key": [6, 6], "value_1": ["f", "f"], "value_2": [10, 10]},
+                "null_count": {"key": 0, "value_1": 1, "value_2": 1},
+                "sum": {"key": None, "value_2": None},
+            },
             # 0 rows inserted, 1 deleted
             0,
             1,
@@ -344,7 +425,11 @@ def test_commit_diff_splitting(local_engine_empty):
             dt(2019, 1, 1),
             "96f0a7394f3839b048b492b789f7d57cf976345b04938a69d82b3512f72c3e9e",
             "0000000000000000000000000000000000000000000000000000000000000000",
-            {"range": {"key": [12, 12], "value_1": ["l", "l"], "value_2": [22, 22]}},
+            {
+                "range": {"key": [12, 12], "value_1": ["l", "l"], "value_2": [22, 22]},
+                "null_count": {"key": 0, "value_1": 0, "value_2": 0},
+                "sum": {"key": 12, "value_2": 22},
+            },
             # Single insert
             1,
             0,
@@ -456,7 +541,9 @@ def test_commit_diff_splitting_composite(local_engine_empty):
                     # 'value' spans the old value (was '5'), the inserted value ('4') and the new updated value ('UPD').
                     "key_2": [2, 4],
                     "value": ["4", "UPD"],
-                }
+                },
+                "null_count": {"key_1": 0, "key_2": 0, "value": 0},
+                "sum": {"key_2": 6},
             },
             2,
             1,
@@ -480,7 +567,9 @@ def test_commit_diff_splitting_composite(local_engine_empty):
                     "key_1": ["2019-01-04 00:00:00", "2019-01-04 00:00:00"],
                     "key_2": [2, 2],
                     "value": ["NEW", "NEW"],
-                }
+                },
+                "null_count": {"key_1": 0, "key_2": 0, "value": 0},
+                "sum": {"key_2": 2},
             },
             1,
             0,
@@ -830,7 +919,18 @@ def test_various_types(local_engine_empty):
             "j": ["0testtesttesttesttesttesttes", "testtesttesttesttesttesttest"],
             "l": ["2013-11-02 17:30:52", "2016-01-01 01:01:05"],
             "m": ["2011-11-11", "2013-02-04"],
-        }
+        },
+        "null_count": {c: 0 for c in "abcdefghijklmnopqrs"},
+        # SUM(bigint) and SUM(numeric) are numerics, stored as strings
+        "sum": {
+            "a": 3,
+            "b": 16,
+            "c": 24,
+            "d": "4",
+            "e": "2.310",
+            "f": pytest.approx(886.4441, rel=1e-6),
+            "g": pytest.approx(1.46),
+        },
     }
 
     assert object_index == expected
@@ -887,7 +987,19 @@ def test_various_types_with_deletion_index(local_engine_empty):
             "l": ["2013-11-02 17:30:52", "2016-02-01 01:01:05.123456"],
             # 2013 (U, old value), 2016 (D), 2012 (I), 2019 (U, new value)
             "m": ["2011-11-11", "2019-01-01"],
-        }
+        },
+        # The deleted row is stored with NULLs in non-PK columns
+        "null_count": {c: 0 if c in "bcd" else 1 for c in "abcdefghijklmnopqrs"},
+        # Only the updated and the inserted rows count towards the sums
+        "sum": {
+            "a": mock.ANY,  # depends on the sequence
+            "b": 17,
+            "c": 25,
+            "d": "5",
+            "e": "11.430",
+            "f": pytest.approx(886.573, rel=1e-6),
+            "g": pytest.approx(10.68),
+        },
     }
 
     assert object_index == expected
@@ -68,6 +68,11 @@ class TestLayeredQuerying:
                 "SELECT number, number, name FROM fruits WHERE fruit_id = number + 1 ",
                 [(1, 1, "guitar")],
             ),
+            # ORDER BY pushdown (fragments get merged by the FDW)
+            (
+                "SELECT fruit_id, name FROM fruits ORDER BY fruit_id DESC LIMIT 1",
+                [(3, "mayonnaise")],
+            ),
         ],
     )
     def test_layered_querying(self, lq_test_repo, test_case):
@@ -102,6 +107,22 @@ class TestLayeredQuerying:
         with lq_test_repo.head.query_schema() as s:
             assert sorted(lq_test_repo.engine.run_sql_in(s, query)) == sorted(expected)
 
+    def test_layered_querying_aggregate(self, lq_test_repo):
+        assert lq_test_repo.run_sql(
+            "SELECT splitgraph_api.lq_aggregate('fruits', ARRAY['count(*)', 'max(fruit_id)'])",
+            return_shape=ResultShape.ONE_ONE,
+        ) == [2, 3]
+        lq_test_repo.engine.rollback()
+
+    def test_layered_querying_aggregate_spi(self, lq_test_repo):
+        # Query the metadata through SPI instead of connecting back to the engine
+        lq_test_repo.run_sql("ALTER FOREIGN TABLE fruits OPTIONS (ADD use_spi 'true')")
+        assert lq_test_repo.run_sql(
+            "SELECT splitgraph_api.lq_aggregate('fruits', ARRAY['count(*)', 'max(fruit_id)'])",
+            return_shape=ResultShape.ONE_ONE,
+        ) == [2, 3]
+        lq_test_repo.engine.rollback()
+
     def test_layered_querying_mount_comments(self, lq_test_repo):
         with lq_test_repo.head.query_schema() as s:
             assert (
@@ -143,11 +164,51 @@ class TestLayeredQuerying:
         actual = table.query(columns=["name", "timestamp"], quals=quals)
         _assert_dict_list_equal(actual, expected)
 
+    @pytest.mark.parametrize("workers", [1, 3])
+    def test_direct_table_lq_parallel_ordered(self, lq_test_repo, workers):
+        table = lq_test_repo.head.get_table("fruits")
+
+        expected = table.query(columns=["fruit_id", "name"], quals=[])
+        assert table.query(columns=["fruit_id", "name"], quals=[], workers=workers) == expected
+        # Fetch rows from the server-side cursors one by one
+        assert (
+            table.query(columns=["fruit_id", "name"], quals=[], workers=workers, fetch_size=1)
+            == expected
+        )
+
+        # Results are ordered by the PK even if it's not in the requested columns.
+        assert table.query(columns=["name"], quals=[], workers=workers, order_by_pk=True) == [
+            {"name": r["name"]} for r in sorted(expected, key=lambda r: r["fruit_id"])
+        ]
+
+        # Orderings that aren't on the PK merge all fragments.
+        assert table.query(columns=["fruit_id", "name"], quals=[], order_by=["name"]) == sorted(
+            expected, key=lambda r: r["name"]
+        )
+        assert table.query(
+            columns=["name"], quals=[], workers=workers, order_by=["fruit_id"], descending=True
+        ) == [{"name": r["name"]} for r in sorted(expected, key=lambda r: -r["fruit_id"])]
+
+    def test_direct_table_lq_columns(self, lq_test_repo):
+        table = lq_test_repo.head.get_table("fruits")
+
+        expected = table.query(columns=["fruit_id", "name"], quals=[[("fruit_id", ">", "1")]])
+        result = table.query_columns(columns=["fruit_id", "name"], quals=[[("fruit_id", ">", "1")]])
+
+        assert list(result.keys()) == ["fruit_id", "name"]
+        _assert_dict_list_equal(
+            [{"fruit_id": f, "name": n} for f, n in zip(result["fruit_id"], result["name"])],
+            expected,
+        )
+
     def test_direct_table_lq_query_plan_cache(self, lq_test_repo):
         table = lq_test_repo.head.get_table("fruits")
 
         quals, expected = ([[("fruit_id", "=", "2")]], [{"name": "guitar", "timestamp": _DT}])
 
+        # Drop plans persisted by previous queries so that we only test the in-memory cache.
+        table.repository.objects.invalidate_query_plans(table.objects)
+
         # Check "query plan" is reused and the table doesn't run qual filtering again
         with mock.patch.object(
             ObjectManager, "filter_fragments", wraps=table.repository.objects.filter_fragments
@@ -162,6 +223,108 @@ class TestLayeredQuerying:
         assert len(query_plan.required_objects) == 4
         assert len(query_plan.filtered_objects) == 2
 
+    def test_direct_table_lq_persistent_plan_cache(self, lq_test_repo):
+        object_manager = lq_test_repo.objects
+        table = lq_test_repo.head.get_table("fruits")
+        object_manager.invalidate_query_plans(table.objects)
+
+        quals = [[("fruit_id", "=", "2"), ("name", "=", "guitar")]]
+
+        with mock.patch.object(
+            ObjectManager, "filter_fragments", wraps=object_manager.filter_fragments
+        ) as fo:
+            table.query(columns=["name"], quals=quals)
+            assert fo.call_count == 1
+
+            # A new Table object (e.g. in a different FDW session) picks up the plan from the
+            # engine, even if the query requests different columns or has the quals reordered.
+            other_table = lq_test_repo.head.get_table("fruits")
+            plan = other_table.get_query_plan(
+                quals=[[("name", "=", "guitar"), ("fruit_id", "=", "2")]], columns=["timestamp"]
+            )
+            assert fo.call_count == 1
+            assert len(plan.filtered_objects) == 2
+            assert plan.estimated_rows == 2
+
+            # Re-registering the objects (e.g. when they get reindexed) invalidates the plan.
+            object_manager.register_objects(
+                list(object_manager.get_object_meta(table.objects).values())
+            )
+            lq_test_repo.head.get_table("fruits").get_query_plan(quals=quals, columns=["name"])
+            assert fo.call_count == 2
+
+            # Plans stored in a different format are recomputed.
+            with mock.patch.object(
+                object_manager,
+                "get_cached_query_plan",
+                return_value={"filtered_objects": [], "non_singletons": []},
+            ):
+                plan = lq_test_repo.head.get_table("fruits").get_query_plan(
+                    quals=quals, columns=["name"]
+                )
+            assert fo.call_count == 3
+            assert len(plan.filtered_objects) == 2
+
+    def test_direct_table_lq_plan_cache_read_only(self, lq_test_repo):
+        object_manager = lq_test_repo.objects
+        engine = object_manager.object_engine
+        table = lq_test_repo.head.get_table("fruits")
+        object_manager.invalidate_query_plans(table.objects)
+        engine.commit()
+        quals = [[("fruit_id", "=", "2")]]
+
+        # Building query plans doesn't commit the caller's transaction. Plans that can't be
+        # stored on the engine (here, because the transaction is read-only) aren't cached.
+        engine.run_sql("SET TRANSACTION READ ONLY")
+        with mock.patch.object(engine, "commit", wraps=engine.commit) as commit:
+            plan = table.get_query_plan(quals=quals, columns=["name"], use_cache=False)
+            assert len(plan.filtered_objects) == 2
+            assert commit.call_count == 0
+        engine.rollback()
+
+        with mock.patch.object(
+            ObjectManager, "filter_fragments", wraps=object_manager.filter_fragments
+        ) as fo:
+            table.get_query_plan(quals=quals, columns=["name"], use_cache=False)
+            assert fo.call_count == 1
+            engine.commit()
+
+            # Cached plans can be read in read-only transactions.
+            engine.run_sql("SET TRANSACTION READ ONLY")
+            plan = table.get_query_plan(quals=quals, columns=["name"], use_cache=False)
+            assert fo.call_count == 1
+            assert len(plan.filtered_objects) == 2
+            engine.rollback()
+
+    def test_direct_table_lq_precomputed_chunk_groups(self, lq_test_repo):
+        object_manager = lq_test_repo.objects
+        table = lq_test_repo.head.get_table("fruits")
+        object_manager.invalidate_query_plans(table.objects)
+
+        # Fragment groups were calculated and stored when the table was committed.
+        assert (
+            lq_test_repo.engine.run_sql(
+                "SELECT object_ids FROM splitgraph_meta.table_chunk_groups "
+                "WHERE namespace = %s AND repository = %s AND image_hash = %s "
+                "AND table_name = 'fruits'",
+                (lq_test_repo.namespace, lq_test_repo.repository, table.image.image_hash),
+                return_shape=ResultShape.ONE_ONE,
+            )
+            == table.objects
+        )
+        min_max = object_manager.get_min_max_pks(table.objects, [("fruit_id", "integer")])
+        assert object_manager.get_table_chunk_groups(table) == get_chunk_groups(
+            [(o, mm[0], mm[1]) for o, mm in zip(table.objects, min_max)]
+        )
+
+        # Query plans use them instead of looking up fragment boundaries.
+        with mock.patch.object(
+            ObjectManager, "get_min_max_pks", wraps=object_manager.get_min_max_pks
+        ) as gmm:
+            plan = table.get_query_plan(quals=[[("fruit_id", "=", "2")]], columns=["name"])
+            assert gmm.call_count == 0
+        assert sorted(plan.singletons + plan.non_singletons) == sorted(plan.filtered_objects)
+
 
 def test_layered_querying_against_single_fragment(pg_repo_local):
     # Test the case where the query is satisfied by a single fragment.
@@ -306,8 +469,9 @@ def _prepare_fully_remote_repo(local_engine_empty, pg_repo_remote_registry):
             [(2, "guitar", 1, _DT)],
             (True, False, False, True, False),
         ),
-        # Test NULLs don't break anything (even though we still look at all objects)
-        ("SELECT * FROM fruits WHERE name IS NULL", [], (True, True, True, True, True)),
+        # Only the chunk that deletes 'apple' has NULLs in it (deleted rows are stored
+        # with NULLs in non-PK columns), so it's the only one that gets fetched.
+        ("SELECT * FROM fruits WHERE name IS NULL", [], (False, False, True, False, False)),
         # Same but also add a filter on the string column to exclude 'guitar'.
         # Make sure the chunk that updates 'orange' into 'guitar' is still fetched
         # since it overwrites the old value (even though the updated value doesn't match the qual any more)
@@ -411,7 +575,7 @@ def test_multiengine_flow(
 
     # Test the local engine doesn't actually have any metadata stored on it.
     for table in META_TABLES:
-        if table not in ("object_cache_status", "object_cache_occupancy", "version"):
+        if table not in ("object_cache_status", "object_cache_occupancy", "query_plans", "version"):
             assert (
                 local_engine_empty.run_sql(
                     "SELECT COUNT(1) FROM splitgraph_meta." + table,
@@ -532,6 +696,9 @@ def test_disjoint_table_lq_two_singletons(pg_repo_local):
                     ["fruit_id", "name"],
                     mock.ANY,
                     ("3",),
+                    order_by=[],
+                    descending=False,
+                    text_columns=[],
                 ),
                 call(
                     mock.ANY,
@@ -539,6 +706,9 @@ def test_disjoint_table_lq_two_singletons(pg_repo_local):
                     ["fruit_id", "name"],
                     mock.ANY,
                     ("3",),
+                    order_by=[],
+                    descending=False,
+                    text_columns=[],
                 ),
             ]
 
@@ -597,6 +767,11 @@ def test_disjoint_table_lq_two_singletons_one_overwritten(pg_repo_local):
                 extra_quals=mock.ANY,
                 schema_spec=mock.ANY,
             )
+            # The staging table only has the queried columns (number and timestamp aren't copied)
+            assert [c.name for c in apply_fragments.call_args[1]["schema_spec"]] == [
+                "fruit_id",
+                "name",
+            ]
 
             # Two calls to _generate_select_queries -- one to directly query the pk=3 chunk...
             assert _gsc.call_args_list == [
@@ -607,9 +782,21 @@ def test_disjoint_table_lq_two_singletons_one_overwritten(pg_repo_local):
                     ["fruit_id", "name"],
                     mock.ANY,
                     ("3",),
+                    order_by=[],
+                    descending=False,
+                    text_columns=[],
                 ),
                 # ...and one to query the applied fragments in the second group.
-                mock.call(pg_repo_local.engine, mock.ANY, ["fruit_id", "name"], mock.ANY, ("3",),),
+                mock.call(
+                    pg_repo_local.engine,
+                    mock.ANY,
+                    ["fruit_id", "name"],
+                    mock.ANY,
+                    ("3",),
+                    order_by=[],
+                    descending=False,
+                    text_columns=[],
+                ),
             ]
 
             # Check the temporary table has been deleted since we've exhausted the query
@@ -645,6 +832,9 @@ def test_disjoint_table_lq_two_singletons_one_overwritten(pg_repo_local):
                     ["fruit_id", "name"],
                     mock.ANY,
                     ("3", "4"),
+                    order_by=[],
+                    descending=False,
+                    text_columns=[],
                 ),
                 call(
                     mock.ANY,
@@ -653,6 +843,9 @@ def test_disjoint_table_lq_two_singletons_one_overwritten(pg_repo_local):
                     ["fruit_id", "name"],
                     mock.ANY,
                     ("3", "4"),
+                    order_by=[],
+                    descending=False,
+                    text_columns=[],
                 ),
             ]
 
@@ -710,6 +903,55 @@ def test_disjoint_table_lq_two_singletons_one_overwritten_indirect(pg_repo_local
     assert not pg_repo_local.engine.table_exists(SPLITGRAPH_META_SCHEMA, tmp_table)
 
 
+def test_disjoint_table_lq_incremental_indirect(pg_repo_local):
+    # Test the mode where each group of overlapping fragments is applied to its own
+    # staging table that gets deleted as soon as the caller moves on to the next group.
+    prepare_lq_repo(pg_repo_local, commit_after_every=True, include_pk=True)
+    pg_repo_local.run_sql("INSERT INTO fruits VALUES (4, 'fruit_4'), (5, 'fruit_5')")
+    pg_repo_local.commit()
+    pg_repo_local.run_sql("UPDATE fruits SET name = 'fruit_4_upd' WHERE fruit_id = 4")
+    fruits = pg_repo_local.commit().get_table("fruits")
+
+    plan = fruits.get_query_plan(quals=None, columns=["fruit_id", "name"])
+    assert len(plan.singletons) == 1
+    assert len(plan.non_singleton_groups) == 2
+
+    tables, callback, _ = fruits.query_indirect(
+        columns=["fruit_id", "name"], quals=None, incremental=True
+    )
+    staging_tables = []
+    with mock.patch.object(
+        PostgresEngine, "apply_fragments", wraps=pg_repo_local.engine.apply_fragments
+    ) as apply_fragments:
+        next(tables)
+        assert apply_fragments.call_count == 0
+
+        for i, group in enumerate(plan.non_singleton_groups):
+            next(tables)
+            assert apply_fragments.call_count == i + 1
+            args, _ = apply_fragments.call_args_list[i]
+            assert [o for _, o in args[0]] == group
+            staging_tables.append(args[2])
+            assert pg_repo_local.engine.table_exists(SPLITGRAPH_META_SCHEMA, staging_tables[i])
+            if i > 0:
+                assert not pg_repo_local.engine.table_exists(
+                    SPLITGRAPH_META_SCHEMA, staging_tables[i - 1]
+                )
+
+    with pytest.raises(StopIteration):
+        next(tables)
+    assert not pg_repo_local.engine.table_exists(SPLITGRAPH_META_SCHEMA, staging_tables[-1])
+    callback()
+
+    expected = fruits.query(columns=["fruit_id", "name"], quals=None)
+    _assert_dict_list_equal(
+        fruits.query(columns=["fruit_id", "name"], quals=None, incremental=True), expected
+    )
+    assert fruits.query(
+        columns=["fruit_id", "name"], quals=None, incremental=True, order_by_pk=True
+    ) == sorted(expected, key=lambda r: r["fruit_id"])
+
+
 def test_disjoint_table_lq_temp_table_deletion_doesnt_lock_up(pg_repo_local):
     # When Multicorn reads from the temporary table, it does that in the context of the
     # transaction that it's been called from. It hence can hold a read lock on the
@@ -754,7 +996,27 @@ def test_disjoint_table_lq_temp_table_deletion_doesnt_lock_up(pg_repo_local):
         engine.run_sql(query)
 
 
-def test_get_chunk_groups():
+def test_direct_table_lq_order_by_text(local_engine_empty):
+    OUTPUT.init()
+    OUTPUT.run_sql("CREATE TABLE test (key INTEGER PRIMARY KEY, name VARCHAR)")
+    names = ["b", "B", "a", "A", "\u00e9", "e", "Z", "_z", "10", "9"]
+    for i, name in enumerate(names):
+        OUTPUT.run_sql("INSERT INTO test VALUES (%s, %s)", (i, name))
+    table = OUTPUT.commit(chunk_size=3).get_table("test")
+    assert len(table.objects) == 4
+
+    # Fragments are merged in Python, so they have to be sorted by code point on the engine
+    # too, whatever the database's collation is.
+    engine = OUTPUT.object_engine
+    with mock.patch.object(engine, "run_sql_streaming", wraps=engine.run_sql_streaming) as rss:
+        result = table.query(columns=["name"], quals=[], order_by=["name"], fetch_size=10)
+    assert [r["name"] for r in result] == sorted(names)
+
+    # All fragments are read at the same time, sharing the fetch size.
+    assert [c[1]["fetch_size"] for c in rss.call_args_list] == [2] * 4
+
+
+
     # Two non-overlapping chunks
     assert get_chunk_groups([("chunk_1", 1, 2), ("chunk_2", 3, 4)]) == [
         [("chunk_1", 1, 2)],
@@ -788,3 +1050,46 @@ def test_get_chunk_groups():
     assert get_chunk_groups([("one", 1, 3), ("two", 6, 8), ("three", 3, 6), ("four", 8, 10)]) == [
         [("one", 1, 3), ("two", 6, 8), ("three", 3, 6), ("four", 8, 10)]
     ]
+
+
+def test_lq_fdw_engine_reuse():
+    from splitgraph.core import fdw_checkout
+
+    engine_1 = mock.Mock()
+    engine_1.name = "LOCAL"
+    engine_2 = mock.Mock()
+    engine_2.name = "remote_engine"
+
+    with mock.patch.object(fdw_checkout, "_IDLE_ENGINES", fdw_checkout.OrderedDict()), mock.patch(
+        "splitgraph.core.fdw_checkout.RECONNECTIONS_AVOIDED", 0
+    ), mock.patch.dict(
+        CONFIG, {"SG_LQ_IDLE_TIMEOUT": "60", "SG_LQ_MAX_IDLE_CONNECTIONS": "1"}
+    ), mock.patch(
+        "splitgraph.core.fdw_checkout.time.time", return_value=1000
+    ) as now:
+        # First scan: nothing to reuse. The transaction is rolled back
+        # at the end of the scan, but the connection is kept open.
+        fdw_checkout._acquire_engine(engine_1)
+        fdw_checkout._release_engine(engine_1)
+        engine_1.rollback.assert_called_once_with()
+        engine_1.close.assert_not_called()
+        assert fdw_checkout.RECONNECTIONS_AVOIDED == 0
+
+        # Rescan within the timeout reuses the connection
+        now.return_value = 1030
+        fdw_checkout._acquire_engine(engine_1)
+        assert fdw_checkout.RECONNECTIONS_AVOIDED == 1
+        fdw_checkout._release_engine(engine_1)
+
+        # Only one idle connection is kept: the least recently used one gets closed.
+        fdw_checkout._acquire_engine(engine_2)
+        fdw_checkout._release_engine(engine_2)
+        engine_1.close.assert_called_once_with()
+        assert list(fdw_checkout._IDLE_ENGINES) == ["remote_engine"]
+
+        # Idle connections get closed after the timeout
+        now.return_value = 1100
+        fdw_checkout._acquire_engine(engine_1)
+        engine_2.close.assert_called_once_with()
+        assert fdw_checkout.RECONNECTIONS_AVOIDED == 1
+        assert not fdw_checkout._IDLE_ENGINES
@@ -0,0 +1,80 @@
+import pytest
+from test.splitgraph.conftest import OUTPUT
+
+from splitgraph.core.indexing.ngram import _prepare_ngram_quals, filter_ngram_index
+from splitgraph.core.indexing.range import split_like_pattern
+
+
+@pytest.mark.parametrize(
+    "pattern,expected",
+    [
+        ("ABC%", ["ABC", ""]),
+        ("%abc%", ["", "abc", ""]),
+        ("a_c", ["a", "c"]),
+        ("abc", ["abc"]),
+        # Escaped wildcards are literals
+        ("%a\\%b_c", ["", "a%b", "c"]),
+        ("a\\\\b%", ["a\\b", ""]),
+    ],
+)
+def test_split_like_pattern(pattern, expected):
+    assert split_like_pattern(pattern) == expected
+
+
+@pytest.mark.parametrize(
+    "test_case",
+    [
+        # LIKE gets converted into the literal parts of the pattern
+        ([[("a", "~~", "%abc%de")]], [[("a", ("abc", "de"))]]),
+        # LIKE OR equality: equality might be true, so this collapses into nothing
+        ([[("a", "~~", "%abc%"), ("b", "=", 6)]], []),
+        ([[("a", "~~", "%abc%")], [("b", "=", 6)]], [[("a", ("abc",))]]),
+    ],
+)
+def test_ngram_qual_preprocessing(test_case):
+    quals, expected = test_case
+    assert _prepare_ngram_quals(quals) == expected
+
+
+def test_ngram_index_querying(local_engine_empty):
+    OUTPUT.init()
+    OUTPUT.run_sql("CREATE TABLE test (key INTEGER PRIMARY KEY, value_1 VARCHAR)")
+    for i, value in enumerate(
+        ["apple", "banana", "cherry", "grape", "kiwi", "lemon", "mango", "orange", "peach"]
+    ):
+        OUTPUT.run_sql("INSERT INTO test VALUES (%s, %s)", (i, value))
+    head = OUTPUT.commit(
+        chunk_size=3, extra_indexes={"test": {"ngram": {"value_1": {"probability": 0.001}}}}
+    )
+
+    table = head.get_table("test")
+    objects = table.objects
+    assert len(objects) == 3
+
+    object_meta = OUTPUT.objects.get_object_meta(objects)
+    assert object_meta[objects[0]].object_index["ngram"]["value_1"][0] == 3
+    # Indexes built while hashing the table are the same as ones built by scanning the object.
+    assert OUTPUT.objects.generate_object_index(
+        objects[0],
+        table.table_schema,
+        extra_indexes={"ngram": {"value_1": {"probability": 0.001}}},
+    )["ngram"]["value_1"] == tuple(object_meta[objects[0]].object_index["ngram"]["value_1"])
+
+    def test_filter(quals, result):
+        assert filter_ngram_index(OUTPUT.engine, objects, quals) == result
+        assert OUTPUT.objects.filter_fragments(objects, table, quals) == result
+
+    test_filter([[("value_1", "~~", "%nan%")]], [objects[0]])
+    test_filter([[("value_1", "~~", "%emo%")]], [objects[1]])
+    test_filter([[("value_1", "~~", "%ang%")]], [objects[2]])
+    test_filter([[("value_1", "~~", "%xyz%")]], [])
+    test_filter(
+        [[("value_1", "~~", "%pple"), ("value_1", "~~", "%each")]], [objects[0], objects[2]]
+    )
+    # Patterns without long enough literal parts can't be pruned.
+    test_filter([[("value_1", "~~", "%a%")]], objects)
+
+    # LIKE with a prefix is also checked against the range index.
+    assert OUTPUT.objects.filter_fragments(objects, table, [[("value_1", "~~", "k%")]]) == [
+        objects[1]
+    ]
@@ -33,5 +33,7 @@ def test_range_index_ordering_collation(local_engine_empty):
             "key_2": ["ONE", "two"],
             "value_1": ["CUCUMBER", "banana"],
             "value_2": [1, 4],
-        }
+        },
+        "null_count": {"key_1": 0, "key_2": 0, "value_1": 0, "value_2": 0},
+        "sum": {"key_1": 6, "value_2": 10},
     }
@@ -0,0 +1,142 @@
+from datetime import datetime as dt, timedelta
+from unittest import mock
+
+import pytest
+from test.splitgraph.conftest import OUTPUT
+
+from splitgraph.core.indexing.valueset import (
+    _prepare_valueset_quals,
+    describe,
+    filter_valueset_index,
+)
+
+
+@pytest.mark.parametrize(
+    "test_case",
+    [
+        # Equality gets converted to text
+        ([[("a", "=", 5)]], [[("a", "5")]]),
+        # NULLs are stored as the string 'NULL'
+        ([[("a", "=", None)]], [[("a", "NULL")]]),
+        # a = 5 or b > 6: b > 6 might be true, so this collapses into nothing
+        ([[("a", "=", 5), ("b", ">", 6)]], []),
+        # a = 5 and b > 6: only a = 5 is kept
+        ([[("a", "=", 5)], [("b", ">", 6)]], [[("a", "5")]]),
+        # IS NULL looks for NULLs in the value set
+        ([[("a", "IS NULL", None)]], [[("a", "NULL")]]),
+        ([[("a", "IS NOT NULL", None)]], []),
+        # IN (ORs of equalities) are kept
+        ([[("a", "=", 5), ("a", "=", 6)]], [[("a", "5"), ("a", "6")]]),
+    ],
+)
+def test_valueset_qual_preprocessing(test_case):
+    quals, expected = test_case
+    assert _prepare_valueset_quals(quals) == expected
+
+
+def test_valueset_describe():
+    assert describe(["a", "b"]) == "2 value(s): a, b"
+    assert describe([str(i) for i in range(10)]) == "10 value(s): 0, 1, 2, 3, 4, ..."
+
+
+def _make_test_table():
+    OUTPUT.init()
+    OUTPUT.run_sql("CREATE TABLE test (key INTEGER PRIMARY KEY, value_1 VARCHAR, value_2 INTEGER)")
+    # value_1 has 3 distinct values in each chunk of 9 rows, value_2 has 9
+    for i in range(27):
+        OUTPUT.run_sql(
+            "INSERT INTO test VALUES (%s, %s, %s)", (i + 1, chr(ord("a") + i // 3), i * 2)
+        )
+
+
+def test_valueset_index_structure(local_engine_empty):
+    _make_test_table()
+    head = OUTPUT.commit(
+        chunk_size=9,
+        extra_indexes={
+            "test": {"valueset": {"value_1": {}, "value_2": {"max_values": 5, "probability": 0.1}}}
+        },
+    )
+
+    objects = head.get_table("test").objects
+    object_meta = OUTPUT.objects.get_object_meta(objects)
+
+    index = object_meta[objects[0]].object_index
+    assert index["valueset"] == {"value_1": ["a", "b", "c"]}
+    # value_2 has too many distinct values, so it gets a bloom filter instead
+    assert list(index["bloom"].keys()) == ["value_2"]
+
+    assert object_meta[objects[2]].object_index["valueset"] == {"value_1": ["g", "h", "i"]}
+
+    # Check the values that are calculated when hashing the table are the same as when
+    # the index is generated on an existing object.
+    assert (
+        OUTPUT.objects.generate_object_index(
+            objects[0],
+            head.get_table("test").table_schema,
+            extra_indexes={"valueset": {"value_1": {}, "value_2": {"max_values": 5}}},
+        )["valueset"]
+        == index["valueset"]
+    )
+
+
+def test_valueset_index_querying(local_engine_empty):
+    _make_test_table()
+    OUTPUT.run_sql("UPDATE test SET value_1 = NULL WHERE key = 27")
+    head = OUTPUT.commit(chunk_size=9, extra_indexes={"test": {"valueset": {"value_1": {}}}})
+
+    table = head.get_table("test")
+    objects = table.objects
+    assert len(objects) == 3
+
+    def test_filter(quals, result):
+        assert filter_valueset_index(OUTPUT.engine, objects, quals) == result
+        # Check filtering through the fragment manager (including the in-memory index) agrees.
+        assert OUTPUT.objects.filter_fragments(objects, table, quals) == result
+        with mock.patch.object(OUTPUT.objects, "in_memory_index", True):
+            assert OUTPUT.objects.filter_fragments(objects, table, quals) == result
+
+    test_filter([[("value_1", "=", "a")]], [objects[0]])
+    test_filter([[("value_1", "=", "f")]], [objects[1]])
+    # "ab" is between the minimum and the maximum of the first chunk, but isn't in it.
+    test_filter([[("value_1", "=", "ab")]], [])
+    assert filter_valueset_index(OUTPUT.engine, objects, [[("value_1", "=", None)]]) == [objects[2]]
+
+    # IN
+    test_filter([[("value_1", "=", "b"), ("value_1", "=", "h")]], [objects[0], objects[2]])
+
+    # Unsupported operator in an OR-clause: all fragments might match.
+    test_filter([[("value_1", "=", "b"), ("value_2", ">", 0)]], objects)
+
+    # AND
+    test_filter([[("value_1", "=", "b")], [("value_1", "=", "h")]], [])
+
+
+def test_valueset_index_post_factum(local_engine_empty):
+    OUTPUT.init()
+    OUTPUT.run_sql("CREATE TABLE test (key INTEGER PRIMARY KEY, value_1 TIMESTAMP)")
+    for i in range(50):
+        OUTPUT.run_sql(
+            "INSERT INTO test VALUES (%s, %s)", (i + 1, dt(2015, 1, 1) + timedelta(days=i % 5))
+        )
+    head = OUTPUT.commit()
+
+    head.get_table("test").reindex(extra_indexes={"valueset": {"value_1": {}}})
+
+    objects = head.get_table("test").objects
+    object_index = OUTPUT.objects.get_object_meta(objects)[objects[0]].object_index
+    assert len(object_index["valueset"]["value_1"]) == 5
+
+    for i in range(5):
+        assert (
+            filter_valueset_index(
+                OUTPUT.engine, objects, [[("value_1", "=", dt(2015, 1, 1) + timedelta(days=i))]]
+            )
+            == objects
+        )
+    assert (
+        filter_valueset_index(
+            OUTPUT.engine, objects, [[("value_1", "=", dt(2015, 1, 1) + timedelta(days=5))]]
+        )
+        == []
+    )
@@ -0,0 +1,147 @@
+from unittest import mock
+
+import pytest
+from test.splitgraph.conftest import OUTPUT
+
+from splitgraph.core.indexing.bloom import _prepare_bloom_quals, filter_bloom_index
+from splitgraph.core.indexing.fragment_index import _XorColumn
+from splitgraph.core.indexing.xor import (
+    _NUMPY_SUPPORTED,
+    _build_filter,
+    _build_filter_numpy,
+    _get_bits,
+    _match,
+    decode_xor_index,
+    describe,
+    generate_xor_index,
+    hash_to_key,
+)
+
+
+def _key(value):
+    return hash_to_key(_prepare_bloom_quals([[("a", "=", value)]])[0][0][1])
+
+
+def _make_filter(values, **kwargs):
+    # Doesn't touch the engine since the values are passed in
+    index = generate_xor_index(None, "object", None, "a", values=values, **kwargs)
+    return index, decode_xor_index({"a": index})["a"]
+
+
+@pytest.mark.parametrize("bits", [8, 16])
+@pytest.mark.parametrize("items", [0, 1, 10, 5000])
+def test_xor_filter(bits, items):
+    values = [str(i) for i in range(items)]
+    index, xor_filter = _make_filter(values, fingerprint_bits=bits)
+    assert index[1] == bits
+
+    # No false negatives
+    assert all(_match(_key(v), xor_filter) for v in values)
+
+    # False positives happen with the probability of 2 ** -bits
+    false_positives = sum(_match(_key("missing_%d" % i), xor_filter) for i in range(10000))
+    assert false_positives < 10000 * 2 ** -bits * 2 + 10
+
+    # The in-memory index gives the same results
+    column = _XorColumn([xor_filter, None])
+    for value in values[:100] + ["missing_%d" % i for i in range(1000)]:
+        assert list(column.match(_key(value))) == [_match(_key(value), xor_filter), True]
+
+
+@pytest.mark.skipif(not _NUMPY_SUPPORTED, reason="NumPy not installed")
+@pytest.mark.parametrize("bits", [8, 16])
+@pytest.mark.parametrize("items", [0, 1, 10, 5000])
+def test_xor_numpy_builder(bits, items):
+    # The NumPy builder has to produce the same filters as the pure Python one.
+    keys = sorted({_key(str(i)) for i in range(items)})
+    assert _build_filter_numpy(keys, bits) == _build_filter(keys, bits)
+
+
+def test_xor_filter_size():
+    values = [str(i) for i in range(10000)]
+    _, xor_filter = _make_filter(values)
+    # About 1.23 bytes per item with 8-bit fingerprints
+    assert len(xor_filter[2]) < 10000 * 1.25
+
+    # The filter is deterministic.
+    assert _make_filter(list(reversed(values)))[1] == xor_filter
+
+
+def test_xor_fingerprint_bits():
+    assert _get_bits(None, None) == 8
+    assert _get_bits(0.01, None) == 8
+    assert _get_bits(0.001, None) == 16
+    assert _get_bits(None, 16) == 16
+
+    with pytest.raises(ValueError):
+        _get_bits(0.01, 8)
+    with pytest.raises(ValueError):
+        _get_bits(None, 32)
+    with pytest.raises(ValueError):
+        _get_bits(1e-6, None)
+
+
+def test_xor_describe():
+    index, _ = _make_filter([str(i) for i in range(100)])
+    assert (
+        describe(index) == "8-bit fingerprints, size 208.00 B, "
+        "approx. 100 item(s), false positive probability 0.391%"
+    )
+
+
+def test_xor_in_memory_mixed_sizes():
+    filters = [_make_filter(["a", "b"], fingerprint_bits=8)[1], None]
+    filters.append(_make_filter([str(i) for i in range(100)], fingerprint_bits=16)[1])
+    column = _XorColumn(filters)
+
+    assert list(column.match(_key("a"))) == [True, True, _match(_key("a"), filters[2])]
+    assert list(column.match(_key("50"))) == [_match(_key("50"), filters[0]), True, True]
+
+
+def test_xor_index_querying(local_engine_empty):
+    OUTPUT.init()
+    OUTPUT.run_sql("CREATE TABLE test (key INTEGER PRIMARY KEY, value_1 VARCHAR, value_2 INTEGER)")
+    for i in range(30):
+        OUTPUT.run_sql("INSERT INTO test VALUES (%s, %s, %s)", (i, "val_%d" % (i * 7 % 30), i * 2))
+    OUTPUT.run_sql("UPDATE test SET value_1 = NULL WHERE key = 25")
+    head = OUTPUT.commit(
+        chunk_size=10,
+        extra_indexes={
+            "test": {
+                "xor": {"value_1": {"fingerprint_bits": 16}},
+                "bloom": {"value_2": {"probability": 0.001}},
+            }
+        },
+    )
+
+    table = head.get_table("test")
+    objects = table.objects
+    assert len(objects) == 3
+
+    # The filters built while hashing the table are the same as ones built on an existing object.
+    index = OUTPUT.objects.get_object_meta(objects)[objects[0]].object_index
+    assert list(index["xor"]["value_1"]) == list(
+        OUTPUT.objects.generate_object_index(
+            objects[0],
+            table.table_schema,
+            extra_indexes={"xor": {"value_1": {"fingerprint_bits": 16}}},
+        )["xor"]["value_1"]
+    )
+
+    def test_filter(quals, result):
+        assert filter_bloom_index(OUTPUT.engine, objects, quals) == result
+        assert OUTPUT.objects.filter_fragments(objects, table, quals) == result
+        with mock.patch.object(OUTPUT.objects, "in_memory_index", True):
+            assert OUTPUT.objects.filter_fragments(objects, table, quals) == result
+
+    # val_7 is in row 1 and val_13 is in row 19
+    test_filter([[("value_1", "=", "val_7")]], [objects[0]])
+    test_filter([[("value_1", "=", "val_13")]], [objects[1]])
+    test_filter([[("value_1", "=", "missing")]], [])
+    test_filter([[("value_1", "IS NULL", None)]], [objects[2]])
+    test_filter([[("value_1", "=", "val_7"), ("value_1", "=", "val_13")]], [objects[0], objects[1]])
+
+    # Xor and bloom filters on different columns
+    test_filter([[("value_1", "=", "val_7")], [("value_2", "=", 2)]], [objects[0]])
+    test_filter([[("value_1", "=", "val_7")], [("value_2", "=", 22)]], [])
+    test_filter([[("value_1", "=", "val_7"), ("value_2", "=", 22)]], [objects[0], objects[1]])
@@ -207,6 +207,26 @@ def test_pandas_read_basic(ingestion_test_repo):
     assert_frame_equal(base_df, output)
 
 
+def test_pandas_read_columnar(ingestion_test_repo):
+    df_to_table(base_df, ingestion_test_repo, "test_table", if_exists="patch")
+    image = ingestion_test_repo.commit()
+
+    output = sql_to_df(
+        "SELECT * FROM test_table",
+        repository=ingestion_test_repo,
+        index_col="fruit_id",
+        columnar=True,
+    )
+    assert_frame_equal(base_df, output)
+
+    # Check LQ works too
+    ingestion_test_repo.uncheckout()
+    output = sql_to_df(
+        "SELECT * FROM test_table", image=image, use_lq=True, index_col="fruit_id", columnar=True,
+    )
+    assert_frame_equal(base_df, output)
+
+
 def test_pandas_read_other_checkout(ingestion_test_repo):
     df_to_table(base_df, ingestion_test_repo, "test_table", if_exists="patch")
     old = ingestion_test_repo.commit()
@@ -1,8 +1,11 @@
+import struct
+from datetime import datetime as dt
 from io import StringIO
 from unittest import mock
 from unittest.mock import Mock, MagicMock, call
 
 import docker
+import numpy as np
 import psycopg2
 import pytest
 from packaging.version import Version
@@ -15,6 +18,7 @@ from splitgraph.core.engine import get_current_repositories, lookup_repository,
 from splitgraph.core.object_manager import ObjectManager
 from splitgraph.core.repository import Repository
 from splitgraph.engine import _prepare_engine_config, ResultShape
+from splitgraph.engine.postgres.copy_binary import decode_copy_binary
 from splitgraph.engine.postgres.engine import (
     PostgresEngine,
     _API_VERSION,
@@ -122,6 +126,64 @@ def test_run_sql_namedtuple(local_engine_empty):
     assert one_many_result[1] == 2
 
 
+def test_run_sql_streaming(local_engine_empty):
+    batches = list(
+        local_engine_empty.run_sql_streaming(
+            "SELECT i, i * 2 FROM generate_series(1, %s) i", (5,), fetch_size=2
+        )
+    )
+    assert batches == [[(1, 2), (2, 4)], [(3, 6), (4, 8)], [(5, 10)]]
+
+    # Check holdable cursors get used in autocommit mode
+    conn_params = _prepare_engine_config(CONFIG)
+    engine = PostgresEngine(conn_params=conn_params, name="test_engine", autocommit=True)
+    try:
+        assert [r for b in engine.run_sql_streaming("SELECT 1", fetch_size=10) for r in b] == [(1,)]
+    finally:
+        engine.close()
+
+
+def test_run_sql_columnar(local_engine_empty):
+    result = local_engine_empty.run_sql_columnar(
+        "SELECT i AS id, i::float / 2 AS half, CASE WHEN i > 1 THEN 'val_' || i END AS val, "
+        "'2020-01-01'::timestamp + i * INTERVAL '1 day' AS ts, i::numeric AS num "
+        "FROM generate_series(1, %s) i",
+        (3,),
+    )
+
+    assert list(result.keys()) == ["id", "half", "val", "ts", "num"]
+    assert result["id"].dtype == np.int32
+    assert result["id"].tolist() == [1, 2, 3]
+    assert result["half"].tolist() == [0.5, 1.0, 1.5]
+    assert result["val"].tolist() == [None, "val_2", "val_3"]
+    assert result["ts"].tolist() == [dt(2020, 1, 2), dt(2020, 1, 3), dt(2020, 1, 4)]
+    # Numerics can't be decoded from binary COPY and are returned as text
+    assert result["num"].tolist() == ["1", "2", "3"]
+
+
+def test_decode_copy_binary_nulls():
+    def _field(value):
+        return struct.pack(">i", -1) if value is None else struct.pack(">i", len(value)) + value
+
+    data = (
+        b"PGCOPY\n\377\r\n\0"
+        + struct.pack(">ii", 0, 0)
+        + b"".join(
+            struct.pack(">h", 3) + _field(i) + _field(b) + _field(d)
+            for i, b, d in [
+                (struct.pack(">q", 1), None, struct.pack(">i", 1)),
+                (None, b"\x01", None),
+            ]
+        )
+        + struct.pack(">h", -1)
+    )
+
+    ints, bools, dates = decode_copy_binary(data, [20, 16, 1082])
+    assert ints[0] == 1.0 and np.isnan(ints[1])
+    assert bools.tolist() == [None, True]
+    assert dates[0] == np.datetime64("2000-01-02") and np.isnat(dates[1])
+
+
 def test_uninitialized_engine_error(local_engine_empty):
     # Test things like the audit triggers/splitgraph meta schema missing raise
     # uninitialized engine errors rather than generic SQL errors.
@@ -205,6 +205,59 @@ def test_metadata_constraints_table_objects(local_engine_empty):
         assert "Some objects in the object_ids array aren''t registered!" in str(e)
 
 
+def test_object_meta_cache(local_engine_empty):
+    R = Repository("some", "repo")
+    objects = [
+        Object(
+            object_id="o%062d" % i,
+            format="FRAG",
+            namespace="",
+            size=42,
+            created=dt(2020, 1, 1),
+            insertion_hash="0" * 64,
+            deletion_hash="0" * 64,
+            object_index={},
+            rows_inserted=10,
+            rows_deleted=2,
+        )
+        for i in range(3)
+    ]
+    object_ids = [o.object_id for o in objects]
+    om = R.objects
+    om.object_meta_cache_size = 2
+    om.register_objects(objects)
+
+    with patch.object(
+        om.metadata_engine, "run_chunked_sql", wraps=om.metadata_engine.run_chunked_sql
+    ) as rcs:
+        assert om.get_object_meta(object_ids[:2]) == {o.object_id: o for o in objects[:2]}
+        assert rcs.call_count == 1
+        assert (om.object_meta_cache_hits, om.object_meta_cache_misses) == (0, 2)
+
+        # Repeated lookups don't hit the engine.
+        assert om.get_object_meta(object_ids[:1]) == {object_ids[0]: objects[0]}
+        assert rcs.call_count == 1
+        assert (om.object_meta_cache_hits, om.object_meta_cache_misses) == (1, 2)
+
+        # Only the missing object is fetched and the least recently used one gets evicted.
+        assert len(om.get_object_meta(object_ids)) == 3
+        assert rcs.call_count == 2
+        assert (om.object_meta_cache_hits, om.object_meta_cache_misses) == (3, 3)
+        om.get_object_meta(object_ids[2:])
+        assert rcs.call_count == 2
+        om.get_object_meta(object_ids[:1])
+        assert rcs.call_count == 3
+
+    # Reregistering objects (e.g. when they get reindexed) invalidates them.
+    om.register_objects([objects[1]._replace(object_index={"range": {"key": [1, 2]}})])
+    assert om.get_object_meta(object_ids[1:2])[object_ids[1]].object_index == {
+        "range": {"key": [1, 2]}
+    }
+
+    om.delete_object_meta(object_ids)
+    assert om.get_object_meta(object_ids) == {}
+
+
 @pytest.mark.registry
 def test_large_api_calls(unprivileged_pg_repo):
     # Test query chunking for API calls that exceed length/vararg limits
@@ -12,6 +12,7 @@ from test.splitgraph.conftest import (
 )
 
 from splitgraph.config import SPLITGRAPH_META_SCHEMA
+from splitgraph.core.fragment_manager import _NUMPY_SUPPORTED
 from splitgraph.core.indexing.range import _quals_to_clause
 from splitgraph.core.repository import clone
 from splitgraph.core.sql import select
@@ -483,7 +484,7 @@ def test_object_cache_make_external(pg_repo_local, clean_minio):
 
 
 def test_object_manager_index_clause_generation(pg_repo_local):
-    column_types = {"a": "int", "b": "int"}
+    column_types = {"a": "int", "b": "int", "c": "text"}
 
     def _assert_ic_result(quals, expected_clause, expected_args):
         qual, args = _quals_to_clause(quals, column_types)
@@ -514,6 +515,15 @@ def test_object_manager_index_clause_generation(pg_repo_local):
         ("a", 3),
     )
 
+    # LIKE with a prefix becomes a range check, LIKE without one can't be pruned
+    _assert_ic_result(
+        [[("c", "~~", "ab%"), ("c", "~~", "%ab")]],
+        "((NOT (index -> 'range') ? %s "
+        'OR ((index #>> \'{range,"c",1}\') COLLATE "C" >= %s '
+        'AND left(index #>> \'{range,"c",0}\', %s) COLLATE "C" <= %s)) OR (TRUE))',
+        ("c", "ab", 2, "ab"),
+    )
+
 
 def _prepare_object_filtering_dataset(include_bloom=False):
     OUTPUT.init()
@@ -646,8 +656,12 @@ def test_object_manager_object_filtering(local_engine_empty, include_bloom):
     _assert_filter_result([[("col4", "<=", "2016-01-01 00:00:00")]], [obj_1, obj_2, obj_4])
 
     # Test text column
+    # LIKE with a prefix is evaluated against the range index
+    _assert_filter_result([[("col3", "~~", "eee%")]], [obj_4])
+    _assert_filter_result([[("col3", "~~", "ab_b")]], [obj_1, obj_2])
+    _assert_filter_result([[("col3", "~~", "dddd")]], [obj_3])
     # Unknown operator (that can't be pruned with the index) returns everything
-    _assert_filter_result([[("col3", "~~", "eee%")]], [obj_1, obj_2, obj_3, obj_4])
+    _assert_filter_result([[("col3", "~~", "%eee%")]], [obj_1, obj_2, obj_3, obj_4])
     _assert_filter_result([[("col3", "=", "aaaa")]], [obj_1])
 
     if include_bloom:
@@ -660,12 +674,12 @@ def test_object_manager_object_filtering(local_engine_empty, include_bloom):
 
     # (can't be pruned) OR (can be pruned) returns all since we don't know what will match the first clause
     _assert_filter_result(
-        [[("col3", "~~", "eee%"), ("col1", "=", 3)]], [obj_1, obj_2, obj_3, obj_4]
+        [[("col3", "~~", "%eee%"), ("col1", "=", 3)]], [obj_1, obj_2, obj_3, obj_4]
     )
 
     # (can't be pruned) AND (can be pruned) returns the same result as the second clause since if something definitely
     # doesn't match the second clause, it won't match the AND.
-    _assert_filter_result([[("col3", "~~", "eee%")], [("col1", "=", 3)]], [obj_1])
+    _assert_filter_result([[("col3", "~~", "%eee%")], [("col1", "=", 3)]], [obj_1])
 
     # (col1 > 5 AND col1 < 2)
     _assert_filter_result([[("col1", ">", 5)], [("col1", "<", 2)]], [])
@@ -702,6 +716,138 @@ def test_object_manager_object_filtering(local_engine_empty, include_bloom):
     )
 
 
+def test_object_manager_range_index_typed(local_engine_empty):
+    objects = _prepare_object_filtering_dataset(include_bloom=False)
+    obj_1, obj_2, obj_3, obj_4 = objects
+    om = OUTPUT.objects
+    table = OUTPUT.head.get_table("test")
+
+    # The range index is copied into typed columns when the object is registered.
+    assert om.metadata_engine.run_sql(
+        select(
+            "object_ranges",
+            "column_name, min_numeric, max_numeric, min_text, max_text, min_timestamp",
+            "object_id = %s ORDER BY column_name",
+        ),
+        (obj_2,),
+    ) == [
+        ("col1", 6, 10, "6", "10", None),
+        ("col2", 1, 4, "1", "4", None),
+        ("col3", None, None, "abbb", "cccc", None),
+        ("col4", None, None, "2015-12-30 00:00:00", "2015-12-30 00:00:00", dt(2015, 12, 30)),
+    ]
+
+    # Filtering using the typed index gives the same results as using the JSON index
+    # (what registries do).
+    _assert_typed_index_filtering(om, objects, table)
+
+    # Objects without an index or with bounds that can't be cast have to be scanned.
+    om.register_objects(
+        [om.get_object_meta([obj_1])[obj_1]._replace(object_index={"range": {"col1": ["a", "b"]}})]
+    )
+    assert om.filter_fragments(objects, table, [[("col1", "=", 3)], [("col2", "=", 10)]]) == [obj_1]
+
+
+def _assert_typed_index_filtering(om, objects, table):
+    for quals in [
+        [[("col1", "=", 3)]],
+        [[("col1", "<=", 11)]],
+        [[("col4", ">", dt(2015, 12, 31))]],
+        [[("col3", "=", "accc")]],
+        [[("col3", "~~", "eee%"), ("col1", "=", 3)]],
+        [[("col1", ">", 10), ("col4", "=", "2016-01-02 00:00:00")], [("col3", "=", "dddd")]],
+    ]:
+        with mock.patch.object(om.metadata_engine, "registry", True):
+            expected = om.filter_fragments(objects, table, quals)
+        assert om.filter_fragments(objects, table, quals) == expected
+
+
+@pytest.mark.skipif(not _NUMPY_SUPPORTED, reason="NumPy not installed")
+@pytest.mark.parametrize("include_bloom", [True, False])
+def test_object_manager_object_filtering_in_memory(local_engine_empty, include_bloom):
+    objects = _prepare_object_filtering_dataset(include_bloom=include_bloom)
+    om = OUTPUT.objects
+    table = OUTPUT.head.get_table("test")
+
+    # The in-memory index is opt-in: by default, quals are evaluated on the engine.
+    assert not om.in_memory_index
+    with mock.patch.object(om, "get_fragment_index") as get_fragment_index:
+        om.filter_fragments(objects, table, [[("col1", "=", 3)]])
+    get_fragment_index.assert_not_called()
+
+    fragment_index = om.get_fragment_index(objects, table)
+    assert om.get_fragment_index(objects, table) is fragment_index
+
+    # Evaluating quals on the index loaded into memory gives the same results as running
+    # them against the index on the engine.
+    for quals in [
+        [[("col1", "=", 3)]],
+        [[("col1", "<>", 3)]],
+        [[("col1", "<=", 11)]],
+        [[("col4", ">", dt(2015, 12, 31))]],
+        [[("col4", "<=", "2016-01-01 00:00:00")]],
+        [[("col3", "=", "accc")]],
+        [[("col3", "~~", "eee%"), ("col1", "=", 3)]],
+        [[("col3", "~~", "ab_b")]],
+        [[("col3", "~~", "%eee%")]],
+        [[("col1", ">", 5)], [("col1", "<", 2)]],
+        [[("col1", ">", 10), ("col4", "=", "2016-01-02 00:00:00")], [("col3", "=", "dddd")]],
+        [[("col4", "=", "2016-01-02 00:00:00")]],
+    ]:
+        expected = om.filter_fragments(objects, table, quals)
+        assert fragment_index.filter(objects, quals) == expected
+        with mock.patch.object(om, "in_memory_index", True):
+            assert om.filter_fragments(objects, table, quals) == expected
+
+    # Quals that can't be evaluated in memory are run on the engine instead.
+    assert fragment_index.filter(objects, [[("col1", "=", "not a number")]]) is None
+
+    # Changing object metadata (e.g. reindexing) drops the index from memory.
+    om.register_objects(list(om.get_object_meta(objects[:1]).values()))
+    assert om.get_fragment_index(objects, table) is not fragment_index
+
+
+def test_object_manager_object_filtering_nulls(local_engine_empty):
+    OUTPUT.init()
+    OUTPUT.run_sql("CREATE TABLE test (key INTEGER PRIMARY KEY, value_1 VARCHAR, value_2 JSON)")
+    # value_1 has no NULLs in the first chunk, one in the second one and only has NULLs
+    # in the third one. value_2 isn't range-indexed and has NULLs in every chunk.
+    for i in range(9):
+        OUTPUT.run_sql(
+            "INSERT INTO test VALUES (%s, %s, %s)",
+            (i, str(i) if i < 6 and i != 4 else None, '{"a": 1}' if i % 2 else None),
+        )
+    head = OUTPUT.commit(chunk_size=3)
+    table = head.get_table("test")
+    objects = table.objects
+    assert len(objects) == 3
+
+    om = OUTPUT.objects
+    object_meta = om.get_object_meta(objects)
+    assert [object_meta[o].object_index["null_count"] for o in objects] == [
+        {"key": 0, "value_1": 0, "value_2": 2},
+        {"key": 0, "value_1": 1, "value_2": 1},
+        {"key": 0, "value_1": 3, "value_2": 2},
+    ]
+
+    for quals, expected in [
+        ([[("value_1", "IS NULL", None)]], objects[1:]),
+        ([[("value_1", "IS NOT NULL", None)]], objects[:2]),
+        ([[("value_2", "IS NULL", None)]], objects),
+        ([[("value_2", "IS NOT NULL", None)]], objects),
+        ([[("value_1", "IS NULL", None), ("key", "=", 0)]], objects),
+        ([[("value_1", "IS NULL", None)], [("key", "<", 5)]], objects[1:2]),
+        ([[("value_1", "IS NOT NULL", None)], [("key", ">", 5)]], []),
+    ]:
+        assert om.filter_fragments(objects, table, quals) == expected
+        with mock.patch.object(om, "in_memory_index", True):
+            assert om.filter_fragments(objects, table, quals) == expected
+
+    assert sorted(
+        r["key"] for r in table.query(columns=["key"], quals=[[("value_1", "IS NULL", None)]])
+    ) == [4, 6, 7, 8]
+
+
 def test_object_manager_object_filtering_end_to_end(local_engine_empty):
     objects = _prepare_object_filtering_dataset()
     obj_1, obj_2, obj_3, obj_4 = objects
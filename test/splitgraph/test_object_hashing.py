@@ -1,13 +1,15 @@
 import operator
 from functools import reduce
 from hashlib import sha256
+from unittest import mock
 
 import pytest
 from test.splitgraph.conftest import OUTPUT, PG_DATA, load_splitfile
 
 from splitgraph.config import SPLITGRAPH_META_SCHEMA
-from splitgraph.core.fragment_manager import Digest
+from splitgraph.core.fragment_manager import Digest, _NUMPY_SUPPORTED
 from splitgraph.core.repository import Repository
+from splitgraph.engine import ResultShape
 from splitgraph.splitfile import execute_commands
 
 TEST_ROWS = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine"]
@@ -42,6 +44,29 @@ def test_digest_sum():
     ).hex() == HASH_SUM
 
 
+@pytest.mark.parametrize(
+    "use_numpy",
+    [
+        pytest.param(
+            True, marks=pytest.mark.skipif(not _NUMPY_SUPPORTED, reason="NumPy not installed")
+        ),
+        False,
+    ],
+)
+def test_digest_sum_batched(use_numpy):
+    with mock.patch("splitgraph.core.fragment_manager._NUMPY_SUPPORTED", use_numpy), mock.patch(
+        "splitgraph.core.fragment_manager._DIGEST_BATCH_SIZE", 3
+    ):
+        assert Digest.sum(TEST_ROW_HASHES_BYTES).hex() == HASH_SUM
+        assert Digest.sum(map(memoryview, TEST_ROW_HASHES_BYTES)).hex() == HASH_SUM
+        # Check the wraparound: 0xFFFF * 10 doesn't fit into a short.
+        assert (
+            Digest.sum([b"\xff" * 32] * 10).hex()
+            == _sum_digests([Digest.from_hex("f" * 64)] * 10).hex()
+        )
+        assert Digest.sum([]).hex() == Digest.empty().hex()
+
+
 def test_digest_subtraction():
     sub_sum = _sum_digests(map(Digest.from_hex, TEST_ROW_HASHES[:5] + TEST_ROW_HASHES[6:]))
     assert (Digest.from_hex(HASH_SUM) - Digest.from_hex(TEST_ROW_HASHES[5])).hex() == sub_sum.hex()
@@ -85,6 +110,33 @@ def test_base_fragment_hashing(pg_repo_local):
     assert om.calculate_content_hash(pg_repo_local.to_schema(), "fruits") == (insertion_hash, 2)
 
 
+def test_lthash_aggregate(pg_repo_local):
+    engine = pg_repo_local.object_engine
+    assert (
+        engine.run_sql(
+            "SELECT splitgraph_api.lthash(digest(r, 'sha256')) FROM unnest(%s::text[]) r",
+            (TEST_ROWS,),
+            return_shape=ResultShape.ONE_ONE,
+        )
+        == HASH_SUM
+    )
+    assert (
+        engine.run_sql(
+            "SELECT splitgraph_api.lthash(digest(r, 'sha256')) FROM unnest(%s::text[]) r",
+            ([],),
+            return_shape=ResultShape.ONE_ONE,
+        )
+        == Digest.empty().hex()
+    )
+
+    # Check hashing on the engine gives the same results as fetching the row digests
+    # (used by engines without the aggregate).
+    om = pg_repo_local.objects
+    server_hash = om.calculate_content_hash(pg_repo_local.to_schema(), "fruits")
+    om._lthash_installed = False
+    assert om.calculate_content_hash(pg_repo_local.to_schema(), "fruits") == server_hash
+
+
 def test_base_fragment_reused(pg_repo_local):
     fruits = pg_repo_local.head.get_table("fruits")
 